@@ -0,0 +1,114 @@
+import argparse
+import logging
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+COUNTRIES = [
+    "United Kingdom", "Germany", "France", "EIRE", "Spain", "Netherlands",
+    "Belgium", "Switzerland", "Portugal", "Australia", "Norway", "Italy",
+]
+WORDS = [
+    "WHITE", "RED", "HANGING", "HEART", "T-LIGHT", "HOLDER", "LANTERN", "METAL",
+    "VINTAGE", "JUMBO", "BAG", "RETROSPOT", "CAKE", "CASES", "GLASS", "STAR",
+]
+FIRST_INVOICE = 536365  # the first invoice of the real export, dated 12/1/2010 8:00
+
+
+def generate_chunk(
+    rng: np.random.Generator, n_rows: int, start_invoice: int, first_invoice: int = FIRST_INVOICE
+) -> pd.DataFrame:
+    """
+    Generate rows shaped like the UCI Online Retail export. Most rows pass
+    load_and_clean_data; the rest mirror the real export's problems (missing
+    CustomerID, non-numeric StockCode, missing or letter-free Description,
+    cancellations, non-positive prices, extreme quantities, duplicates).
+    Dates count from first_invoice, so chunks of one file continue each other.
+    """
+    # Invoices hold ~20 lines each and increase through the file, like the real export
+    invoices = start_invoice + np.sort(rng.integers(0, max(n_rows // 20, 1), n_rows))
+    cancelled = rng.random(n_rows) < 0.02
+    invoice_no = np.where(cancelled, "C", "") + invoices.astype(str)
+
+    stock_code = rng.integers(10000, 90000, n_rows).astype(str).astype(object)
+    suffixed = rng.random(n_rows) < 0.1
+    stock_code[suffixed] = stock_code[suffixed] + "A"
+
+    description = (
+        np.array(WORDS, dtype=object)[rng.integers(0, len(WORDS), n_rows)] + " "
+        + np.array(WORDS, dtype=object)[rng.integers(0, len(WORDS), n_rows)]
+    )
+    description[rng.random(n_rows) < 0.003] = None
+    description[rng.random(n_rows) < 0.001] = "?"
+
+    quantity = rng.geometric(0.15, n_rows).astype("int64")
+    quantity = np.where(cancelled, -quantity, quantity)
+    quantity[rng.random(n_rows) < 0.0001] = 80000
+
+    unit_price = np.round(rng.lognormal(1.0, 0.8, n_rows), 2)
+    unit_price[rng.random(n_rows) < 0.0005] = 0.0
+    unit_price[rng.random(n_rows) < 0.0001] = 4000.0
+
+    customer_id = rng.integers(12346, 18288, n_rows).astype("float64")
+    customer_id[rng.random(n_rows) < 0.25] = np.nan
+
+    # Dates follow the invoice order, formatted like the raw export ("12/1/2010 8:26")
+    minutes = (invoices - first_invoice) * 3
+    invoice_date = pd.Timestamp("2010-12-01 08:00") + pd.to_timedelta(minutes, unit="min")
+    invoice_date = (
+        invoice_date.month.astype(str) + "/" + invoice_date.day.astype(str) + "/"
+        + invoice_date.year.astype(str) + " " + invoice_date.hour.astype(str) + ":"
+        + invoice_date.strftime("%M")
+    )
+
+    df = pd.DataFrame({
+        "InvoiceNo": invoice_no,
+        "StockCode": stock_code,
+        "Description": description,
+        "Quantity": quantity,
+        "InvoiceDate": np.asarray(invoice_date),
+        "UnitPrice": unit_price,
+        "CustomerID": customer_id,
+        "Country": np.array(COUNTRIES)[rng.integers(0, len(COUNTRIES), n_rows)],
+    })
+
+    # ~1% exact duplicates, as in the real export: rows that repeat the row
+    # before them, so the chunk keeps n_rows rows in invoice order
+    rows = np.arange(n_rows)
+    repeated = rng.choice(rows[1:], size=n_rows // 100, replace=False)
+    rows[repeated] = repeated - 1
+    return df.take(rows).reset_index(drop=True)
+
+
+def generate_raw_data(n_rows: int, path: Path, seed: int = 42, chunk_rows: int = 1_000_000) -> Path:
+    """Write n_rows of synthetic raw data to a CSV file, chunk by chunk to bound memory."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    written, invoice = 0, FIRST_INVOICE
+    while written < n_rows:
+        rows = min(chunk_rows, n_rows - written)
+        chunk = generate_chunk(rng, rows, invoice)
+        chunk.to_csv(path, mode="w" if written == 0 else "a", header=written == 0, index=False)
+        invoice += rows // 20 + 1
+        written += rows
+
+    logging.info(f"Generated {written:,} synthetic rows → {path}")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic Online Retail-shaped raw data.")
+    parser.add_argument("rows", type=int, help="Number of rows to generate")
+    parser.add_argument("output", type=Path, help="Output CSV path")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    generate_raw_data(args.rows, args.output, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+import psutil
+
+# Allow running as a script from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.generate_data import generate_raw_data  # noqa: E402
+from etl import aggregate, database, load, query, transform, validate, warehouse  # noqa: E402
+from etl.schema import read_raw_csv  # noqa: E402
+
+
+SIZES = {"100k": 100_000, "1M": 1_000_000, "10M": 10_000_000, "50M": 50_000_000}
+DEFAULT_RESULTS = Path(__file__).resolve().parent / "results.json"
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+
+class PeakRSS:
+    """Sample the process RSS in a background thread and keep the peak."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.process = psutil.Process(os.getpid())
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+
+def measure(results: list, size: str, stage: str, rows_in: int, func, *args, **kwargs):
+    """Run one stage function, record wall time, peak RSS and throughput, and return its result."""
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        wall = time.perf_counter() - start
+
+    record = {
+        "size": size,
+        "stage": stage,
+        "rows_in": rows_in,
+        "wall_s": round(wall, 4),
+        "peak_rss_mb": round(rss.peak / 2**20, 1),
+        "rows_per_s": round(rows_in / wall) if wall > 0 else None,
+    }
+    results.append(record)
+    print(f"{size:>5} {stage:<42} {wall:9.3f}s {record['peak_rss_mb']:9.1f} MB {record['rows_per_s'] or 0:>12,} rows/s")
+    return result
+
+
+def run_size(size: str, n_rows: int, data_dir: Path, thresholds: dict, results: list):
+    """Generate (or reuse) the synthetic raw file for one size and benchmark each stage on it."""
+    raw_path = data_dir / f"raw_{size}.csv"
+    if not raw_path.exists():
+        generate_raw_data(n_rows, raw_path)
+
+    # --- Transform ---
+    cleaned = measure(results, size, "transform.load_and_clean_data", n_rows, transform.load_and_clean_data, raw_path)
+    priced = measure(results, size, "transform.filter_invalid_prices", len(cleaned), transform.filter_invalid_prices, cleaned)
+    transactions, cancellations = measure(
+        results, size, "transform.split_transactions", len(priced), transform.split_transactions, priced
+    )
+    transactions = measure(
+        results, size, "transform.filter_invalid_quantities", len(transactions),
+        transform.filter_invalid_quantities, transactions,
+    )
+    transactions, outliers = measure(
+        results, size, "transform.detect_outliers", len(transactions), transform.detect_outliers,
+        transactions, thresholds["quantity"], thresholds["unit_price"],
+    )
+    del cleaned, priced
+
+    raw = read_raw_csv(raw_path)
+    workers = os.cpu_count()
+    measure(
+        results, size, f"transform.transform_in_parallel[{workers} workers]", n_rows,
+        transform.transform_in_parallel, raw, thresholds, workers,
+    )
+    del raw
+
+    # --- Validate ---
+    datasets = {"transactions": transactions, "cancellations": cancellations, "outliers": outliers}
+    for name, df in datasets.items():
+        measure(results, size, f"validate.validate_table[{name}]", len(df), validate.validate_table, df, name)
+
+    # --- Load ---
+    fact = measure(
+        results, size, "load.prepare_fact_table", len(transactions) + len(cancellations),
+        load.prepare_fact_table, transactions, cancellations,
+    )
+    quarantined = load.prepare_outliers_table(outliers)
+    dims = measure(results, size, "load.build_dimensions", len(fact), load.build_dimensions, fact, quarantined)
+    fact = measure(results, size, "load.apply_dimension_keys", len(fact), load.apply_dimension_keys, fact, dims)
+    quarantined = load.apply_dimension_keys(quarantined, dims)
+    with tempfile.TemporaryDirectory() as warehouse_dir:
+        measure(
+            results, size, "load.save_parquet[fact_sales]", len(fact),
+            load.save_parquet, fact, Path(warehouse_dir), "fact_sales.parquet",
+        )
+        measure(
+            results, size, "database.load_database[sqlite]", len(fact) + len(quarantined),
+            database.load_database, Path(warehouse_dir) / "warehouse.sqlite", dims, fact, quarantined,
+        )
+
+        # --- Query service: first query loads the rollups, repeats hit the cache ---
+        for name, dim in dims.items():
+            load.save_parquet(dim, Path(warehouse_dir), f"{name}.parquet")
+        for name, rollup in aggregate.build_rollups(fact, dims["dim_customers"]).items():
+            load.save_parquet(rollup, Path(warehouse_dir) / "rollups", f"{name}.parquet")
+        warehouse.publish(Path(warehouse_dir), list(dims))
+        queries = query.WarehouseQueries(warehouse_dir, {name: f"{name}.parquet" for name in dims})
+        measure(results, size, "query.top_customers[cold]", len(fact), queries.top_customers, 10)
+        measure(results, size, "query.top_customers[cached]", len(fact), queries.top_customers, 10)
+
+
+def compare_with_baseline(results: list, baseline: list, tolerance: float, min_seconds: float) -> list:
+    """Return stages whose wall time or peak RSS grew by more than tolerance versus the baseline."""
+    previous = {(r["size"], r["stage"]): r for r in baseline}
+    regressions = []
+    for record in results:
+        base = previous.get((record["size"], record["stage"]))
+        if base is None:
+            continue
+        slower = record["wall_s"] > max(base["wall_s"], min_seconds) * (1 + tolerance)
+        bigger = record["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance)
+        if slower or bigger:
+            regressions.append({
+                "size": record["size"],
+                "stage": record["stage"],
+                "wall_s": [base["wall_s"], record["wall_s"]],
+                "peak_rss_mb": [base["peak_rss_mb"], record["peak_rss_mb"]],
+            })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ETL stage functions on synthetic data.")
+    parser.add_argument("--sizes", default=",".join(SIZES), help=f"Comma-separated sizes from {list(SIZES)}")
+    parser.add_argument("--data-dir", type=Path, default=Path(tempfile.gettempdir()) / "foil_benchmarks",
+                        help="Where synthetic raw files are generated and reused")
+    parser.add_argument("--output", type=Path, default=DEFAULT_RESULTS, help="Results JSON file")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown/growth before failing")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="Ignore slowdowns of stages faster than this in the baseline")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(message)s")
+    thresholds = transform.load_config()["outlier_thresholds"]
+
+    results = []
+    for size in args.sizes.split(","):
+        run_size(size, SIZES[size], args.data_dir, thresholds, results)
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    args.output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if not args.baseline.exists():
+        print("No baseline to compare against (run with --save-baseline to create one)")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text())["results"]
+    regressions = compare_with_baseline(results, baseline, args.tolerance, args.min_seconds)
+    for r in regressions:
+        print(f"REGRESSION {r['size']} {r['stage']}: wall {r['wall_s'][0]}s → {r['wall_s'][1]}s, "
+              f"peak RSS {r['peak_rss_mb'][0]} → {r['peak_rss_mb'][1]} MB")
+    if not regressions:
+        print("No regressions against baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,20 +1,30 @@
--- Dimension: Customers
+-- Dimension: Customers (Type 2: one row per version of a customer's attributes,
+-- valid from valid_from until valid_to, exclusive; the current version has no valid_to)
 CREATE TABLE dim_customers (
     customer_key SERIAL PRIMARY KEY,
-    customer_id VARCHAR(10) UNIQUE NOT NULL,
-    country VARCHAR(100)
+    customer_id VARCHAR(10) NOT NULL,
+    country VARCHAR(100),
+    valid_from TIMESTAMP NOT NULL,
+    valid_to TIMESTAMP,
+    is_current BOOLEAN NOT NULL DEFAULT TRUE,
+    UNIQUE (customer_id, valid_from)
 );
 
--- Dimension: Products
+-- Dimension: Products (Type 2, like dim_customers)
 CREATE TABLE dim_products (
     product_key SERIAL PRIMARY KEY,
-    stock_code VARCHAR(10) UNIQUE NOT NULL,
-    description TEXT
+    stock_code VARCHAR(10) NOT NULL,
+    description TEXT,
+    valid_from TIMESTAMP NOT NULL,
+    valid_to TIMESTAMP,
+    is_current BOOLEAN NOT NULL DEFAULT TRUE,
+    UNIQUE (stock_code, valid_from)
 );
 
--- Dimension: Time
+-- Dimension: Time (date_key is the date as an integer, YYYYMMDD)
 CREATE TABLE dim_time (
-    date_key DATE PRIMARY KEY,
+    date_key INT PRIMARY KEY,
+    date DATE NOT NULL,
     year INT,
     month INT,
     day INT,
@@ -27,13 +37,16 @@ CREATE TABLE fact_sales (
     invoice_no VARCHAR(10) NOT NULL,
     customer_key INT REFERENCES dim_customers(customer_key),
     product_key INT REFERENCES dim_products(product_key),
-    date_key DATE REFERENCES dim_time(date_key),
+    date_key INT REFERENCES dim_time(date_key),
     transaction_datetime TIMESTAMP NOT NULL,
     quantity INT NOT NULL,
     unit_price DECIMAL(10,2) NOT NULL,
     sign SMALLINT,
     total_amount DECIMAL(12,2) GENERATED ALWAYS AS (quantity * unit_price * sign) STORED,
-    transaction_type VARCHAR(10)
+    transaction_type VARCHAR(10),
+    net_quantity INT NOT NULL,
+    matched_invoice_no VARCHAR(10),
+    is_orphan BOOLEAN NOT NULL DEFAULT FALSE
 );
 
 -- Quarantine table Outliers (includes both transactions and cancellations)
@@ -42,11 +55,14 @@ CREATE TABLE outliers (
     invoice_no VARCHAR(10) NOT NULL,
     customer_key INT REFERENCES dim_customers(customer_key),
     product_key INT REFERENCES dim_products(product_key),
-    date_key DATE REFERENCES dim_time(date_key),
+    date_key INT REFERENCES dim_time(date_key),
     transaction_datetime TIMESTAMP NOT NULL,
     quantity INT NOT NULL,
     unit_price DECIMAL(10,2) NOT NULL,
     sign SMALLINT,
     total_amount DECIMAL(12,2) GENERATED ALWAYS AS (quantity * unit_price * sign) STORED,
-    transaction_type VARCHAR(10)
+    transaction_type VARCHAR(10),
+    net_quantity INT NOT NULL,
+    matched_invoice_no VARCHAR(10),
+    is_orphan BOOLEAN NOT NULL DEFAULT FALSE
 );
\ No newline at end of file
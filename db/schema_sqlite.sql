@@ -0,0 +1,77 @@
+-- SQLite version of schema.sql, used by etl/database.py.
+-- SERIAL keys become INTEGER PRIMARY KEY (rowid aliases); the other types are
+-- kept for documentation and map to SQLite's INTEGER/REAL/TEXT affinities.
+-- DATE and TIMESTAMP values are stored as ISO-8601 text.
+
+-- Dimension: Customers (Type 2: one row per version of a customer's attributes,
+-- valid from valid_from until valid_to, exclusive; the current version has no valid_to)
+CREATE TABLE IF NOT EXISTS dim_customers (
+    customer_key INTEGER PRIMARY KEY,
+    customer_id VARCHAR(10) NOT NULL,
+    country VARCHAR(100),
+    valid_from TIMESTAMP NOT NULL,
+    valid_to TIMESTAMP,
+    is_current BOOLEAN NOT NULL DEFAULT TRUE,
+    UNIQUE (customer_id, valid_from)
+);
+
+-- Dimension: Products (Type 2, like dim_customers)
+CREATE TABLE IF NOT EXISTS dim_products (
+    product_key INTEGER PRIMARY KEY,
+    stock_code VARCHAR(10) NOT NULL,
+    description TEXT,
+    valid_from TIMESTAMP NOT NULL,
+    valid_to TIMESTAMP,
+    is_current BOOLEAN NOT NULL DEFAULT TRUE,
+    UNIQUE (stock_code, valid_from)
+);
+
+-- Dimension: Time (date_key is the date as an integer, YYYYMMDD)
+CREATE TABLE IF NOT EXISTS dim_time (
+    date_key INT PRIMARY KEY,
+    date DATE NOT NULL,
+    year INT,
+    month INT,
+    day INT,
+    weekday VARCHAR(10)
+);
+
+-- Fact: Sales (includes both transactions and cancellations)
+CREATE TABLE IF NOT EXISTS fact_sales (
+    transaction_key INTEGER PRIMARY KEY,
+    invoice_no VARCHAR(10) NOT NULL,
+    customer_key INT REFERENCES dim_customers(customer_key),
+    product_key INT REFERENCES dim_products(product_key),
+    date_key INT REFERENCES dim_time(date_key),
+    transaction_datetime TIMESTAMP NOT NULL,
+    quantity INT NOT NULL,
+    unit_price DECIMAL(10,2) NOT NULL,
+    sign SMALLINT,
+    total_amount DECIMAL(12,2) GENERATED ALWAYS AS (quantity * unit_price * sign) STORED,
+    transaction_type VARCHAR(10),
+    net_quantity INT NOT NULL,
+    matched_invoice_no VARCHAR(10),
+    is_orphan BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+-- Quarantine table Outliers (includes both transactions and cancellations)
+CREATE TABLE IF NOT EXISTS outliers (
+    transaction_key INTEGER PRIMARY KEY,
+    invoice_no VARCHAR(10) NOT NULL,
+    customer_key INT REFERENCES dim_customers(customer_key),
+    product_key INT REFERENCES dim_products(product_key),
+    date_key INT REFERENCES dim_time(date_key),
+    transaction_datetime TIMESTAMP NOT NULL,
+    quantity INT NOT NULL,
+    unit_price DECIMAL(10,2) NOT NULL,
+    sign SMALLINT,
+    total_amount DECIMAL(12,2) GENERATED ALWAYS AS (quantity * unit_price * sign) STORED,
+    transaction_type VARCHAR(10),
+    net_quantity INT NOT NULL,
+    matched_invoice_no VARCHAR(10),
+    is_orphan BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+-- Indexes for date and customer lookups (created after bulk loads)
+CREATE INDEX IF NOT EXISTS idx_fact_sales_date_key ON fact_sales(date_key);
+CREATE INDEX IF NOT EXISTS idx_fact_sales_customer_key ON fact_sales(customer_key);
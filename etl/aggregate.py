@@ -0,0 +1,80 @@
+from pathlib import Path
+import logging
+import pandas as pd
+
+
+# --- Pre-aggregated rollups of fact_sales ---
+# Each rollup sums signed revenue (quantity * unit_price * sign, the
+# total_amount of db/schema.sql) and signed quantity, and counts sale and
+# cancellation invoices, per value of its keys. All measures are additive
+# across load batches: an invoice's lines share one InvoiceDate and number,
+# so every invoice arrives in a single batch.
+
+ROLLUPS = {
+    "daily_sales": ["date_key"],
+    "monthly_sales": ["year", "month"],
+    "country_sales": ["country"],
+    "product_sales": ["product_key"],
+    "customer_sales": ["customer_key"],
+}
+MEASURES = ["revenue", "quantity", "invoices", "cancelled_invoices"]
+
+
+def build_rollups(fact_sales: pd.DataFrame, dim_customers: pd.DataFrame) -> dict:
+    """Aggregate keyed fact_sales rows into every rollup; country comes from dim_customers."""
+    try:
+        customer_pos = pd.Index(dim_customers["customer_key"]).get_indexer(fact_sales["customer_key"])
+        sign = fact_sales["sign"].to_numpy(dtype="int64")
+        rows = pd.DataFrame({
+            "date_key": fact_sales["date_key"].to_numpy(),
+            "year": (fact_sales["date_key"].to_numpy() // 10000).astype("int16"),
+            "month": (fact_sales["date_key"].to_numpy() // 100 % 100).astype("int8"),
+            "country": dim_customers["country"].to_numpy()[customer_pos],
+            "product_key": fact_sales["product_key"].to_numpy(),
+            "customer_key": fact_sales["customer_key"].to_numpy(),
+            "invoice_no": fact_sales["invoice_no"].to_numpy(),
+            "is_cancel": sign < 0,
+            "revenue": fact_sales["quantity"].to_numpy(dtype="int64") * fact_sales["unit_price"].to_numpy() * sign,
+            "quantity": fact_sales["quantity"].to_numpy(dtype="int64") * sign,
+        })
+
+        rollups = {name: _aggregate(rows, keys) for name, keys in ROLLUPS.items()}
+        logging.info(
+            "Built rollups: " + ", ".join(f"{name} ({len(df):,} rows)" for name, df in rollups.items())
+        )
+        return rollups
+    except Exception as e:
+        logging.error(f"Error building rollups: {e}")
+        raise
+
+
+def _aggregate(rows: pd.DataFrame, keys: list) -> pd.DataFrame:
+    sums = rows.groupby(keys, sort=True)[["revenue", "quantity"]].sum()
+    invoices = rows.drop_duplicates(keys + ["invoice_no"]).groupby(keys + ["is_cancel"]).size().unstack()
+    invoices = invoices.reindex(columns=[False, True], fill_value=0).fillna(0).astype("int64")
+    sums["invoices"] = invoices[False].reindex(sums.index, fill_value=0).to_numpy()
+    sums["cancelled_invoices"] = invoices[True].reindex(sums.index, fill_value=0).to_numpy()
+    return sums.reset_index()
+
+
+def merge_rollups(existing: dict, batch: dict) -> dict:
+    """Add a new batch's rollups to the stored ones (rollups missing on either side are taken as is)."""
+    merged = {}
+    for name, keys in ROLLUPS.items():
+        frames = [r[name] for r in (existing, batch) if name in r]
+        if len(frames) == 1:
+            merged[name] = frames[0]
+            continue
+        combined = pd.concat(frames, ignore_index=True)
+        merged[name] = combined.groupby(keys, sort=True)[MEASURES].sum().reset_index()
+    return merged
+
+
+def read_rollups(rollup_dir: Path) -> dict:
+    """Load the rollups stored under rollup_dir (missing ones are skipped)."""
+    rollups = {}
+    for name in ROLLUPS:
+        path = Path(rollup_dir) / f"{name}.parquet"
+        if path.exists():
+            rollups[name] = pd.read_parquet(path)
+    return rollups
@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+
+
+# --- Stage checkpoints as Arrow IPC files ---
+# A checkpoint is a directory with one uncompressed Arrow IPC file per output
+# DataFrame and a _manifest.json written last, so a directory without a
+# manifest is an incomplete checkpoint. Files are opened memory-mapped: the
+# Arrow buffers are read straight from the page cache without copying.
+
+MANIFEST = "_manifest.json"
+# string[pyarrow] columns are stored as large_string; map them back without a copy
+_TYPES = {pa.large_string(): pd.StringDtype("pyarrow")}
+
+
+def is_checkpointable(output) -> bool:
+    """Outputs that can be checkpointed: None, a DataFrame or a dict of DataFrames."""
+    if output is None or isinstance(output, pd.DataFrame):
+        return True
+    return isinstance(output, dict) and all(isinstance(v, pd.DataFrame) for v in output.values())
+
+
+def write_checkpoint(checkpoint_dir: Path, output, metadata: dict = None):
+    """Write a stage output and then its manifest, replacing any previous checkpoint."""
+    checkpoint_dir = Path(checkpoint_dir)
+    remove_checkpoint(checkpoint_dir)
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+
+    frames = {"output": output} if isinstance(output, pd.DataFrame) else (output or {})
+    datasets = {}
+    for name, df in frames.items():
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        path = checkpoint_dir / f"{name}.arrow"
+        with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        datasets[name] = {"file": path.name, "rows": table.num_rows}
+
+    manifest = {
+        **(metadata or {}),
+        "kind": "none" if output is None else "frame" if isinstance(output, pd.DataFrame) else "frames",
+        "datasets": datasets,
+        "completed_at": datetime.now(timezone.utc).isoformat(),
+    }
+    tmp_path = checkpoint_dir / (MANIFEST + ".tmp")
+    with open(tmp_path, "w") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(tmp_path, checkpoint_dir / MANIFEST)
+    logging.info(f"Checkpoint written → {checkpoint_dir} ({sum(d['rows'] for d in datasets.values()):,} rows)")
+
+
+def read_manifest(checkpoint_dir: Path):
+    """The manifest of a complete checkpoint, or None."""
+    path = Path(checkpoint_dir) / MANIFEST
+    if not path.exists():
+        return None
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def open_checkpoint_table(checkpoint_dir: Path, name: str) -> pa.Table:
+    """Open one checkpointed dataset as a memory-mapped Arrow table."""
+    source = pa.memory_map(str(Path(checkpoint_dir) / f"{name}.arrow"), "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def read_checkpoint(checkpoint_dir: Path):
+    """Rebuild the checkpointed stage output (None, a DataFrame or a dict of DataFrames)."""
+    manifest = read_manifest(checkpoint_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No complete checkpoint in {checkpoint_dir}")
+    frames = {
+        name: open_checkpoint_table(checkpoint_dir, name).to_pandas(split_blocks=True, types_mapper=_TYPES.get)
+        for name in manifest["datasets"]
+    }
+    if manifest["kind"] == "none":
+        return None
+    if manifest["kind"] == "frame":
+        return frames["output"]
+    return frames
+
+
+def remove_checkpoint(checkpoint_dir: Path):
+    if Path(checkpoint_dir).exists():
+        shutil.rmtree(checkpoint_dir)
@@ -0,0 +1,166 @@
+from pathlib import Path
+import logging
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+from src.helpers.metrics import instrumented, record_bytes_written
+
+
+# --- Local SQL warehouse (SQLite) ---
+# Implements db/schema.sql in an embedded SQLite database. Frames are written
+# with executemany in batches inside one transaction per load; full loads
+# drop the fact indexes first and rebuild them once the rows are in.
+
+SCHEMA_PATH = Path(__file__).resolve().parents[1] / "db" / "schema_sqlite.sql"
+DIMENSIONS = ["dim_customers", "dim_products", "dim_time"]
+FACT_TABLES = ["fact_sales", "outliers"]
+
+
+def connect(db_path: Path) -> sqlite3.Connection:
+    """Open the warehouse database, creating the file and schema if needed."""
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    drop_outdated_dimensions(conn)
+    create_schema(conn)
+    return conn
+
+
+def create_schema(conn: sqlite3.Connection, schema_path: Path = SCHEMA_PATH):
+    """Create any missing tables and indexes from the SQLite schema file."""
+    conn.executescript(Path(schema_path).read_text())
+
+
+def drop_outdated_dimensions(conn: sqlite3.Connection, schema_path: Path = SCHEMA_PATH):
+    """
+    Drop dimension tables whose columns differ from the schema file, so they
+    are recreated. Dimensions are rewritten in full on every load, so no rows are lost.
+    """
+    expected = sqlite3.connect(":memory:")
+    create_schema(expected, schema_path)
+    for name in DIMENSIONS:
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({name})")]
+        if columns and columns != [row[1] for row in expected.execute(f"PRAGMA table_info({name})")]:
+            logging.info(f"Recreating {name} with the current schema")
+            conn.execute(f"DROP TABLE {name}")
+    expected.close()
+
+
+def create_indexes(conn: sqlite3.Connection, schema_path: Path = SCHEMA_PATH):
+    """Run only the CREATE INDEX statements of the schema file (safe inside a transaction)."""
+    for statement in Path(schema_path).read_text().split(";"):
+        statement = "\n".join(line for line in statement.splitlines() if not line.startswith("--")).strip()
+        if statement.upper().startswith("CREATE INDEX"):
+            conn.execute(statement)
+
+
+def insert_frame(conn: sqlite3.Connection, table: str, df: pd.DataFrame, batch_size: int = 50000) -> int:
+    """Insert a DataFrame's columns into table with executemany, batch_size rows at a time."""
+    columns = list(df.columns)
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    for start in range(0, len(df), batch_size):
+        batch = df.iloc[start:start + batch_size]
+        conn.executemany(sql, zip(*(_column_values(batch[col]) for col in columns)))
+    return len(df)
+
+
+def _column_values(series: pd.Series) -> list:
+    """Column values as Python objects SQLite accepts (ISO text for dates, None for missing)."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        text = np.datetime_as_string(series.to_numpy(dtype="datetime64[s]"), unit="s")
+        return [None if value == "NaT" else value for value in text.tolist()]
+    if pd.api.types.is_bool_dtype(series):
+        return series.astype(int).tolist()
+    if series.dtype == object or isinstance(series.dtype, (pd.StringDtype, pd.CategoricalDtype)):
+        values = series.astype(object).where(series.notna(), None).tolist()
+        return [v.isoformat() if hasattr(v, "isoformat") else v for v in values]
+    return series.tolist()
+
+
+def _drop_indexes(conn: sqlite3.Connection, tables: list):
+    rows = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+        f"AND tbl_name IN ({', '.join('?' * len(tables))})",
+        tables,
+    ).fetchall()
+    for (name,) in rows:
+        conn.execute(f"DROP INDEX {name}")
+
+
+def delete_after_watermark(conn: sqlite3.Connection, table: str, watermark: dict) -> int:
+    """Delete fact rows after a watermark (invoice numbers compared without their C prefix)."""
+    mark_date = np.datetime_as_string(np.datetime64(pd.Timestamp(watermark["InvoiceDate"]), "s"), unit="s")
+    mark_number = int(str(watermark["InvoiceNo"]).removeprefix("C"))
+    deleted = conn.execute(
+        f"DELETE FROM {table} WHERE transaction_datetime > ? "
+        "OR (transaction_datetime = ? AND CAST(LTRIM(invoice_no, 'C') AS INTEGER) > ?)",
+        (mark_date, mark_date, mark_number),
+    ).rowcount
+    if deleted:
+        logging.info(f"Deleted {deleted:,} uncommitted rows from {table}")
+    return deleted
+
+
+def restate_net_quantity(conn: sqlite3.Connection, restated: pd.DataFrame) -> int:
+    """Set net_quantity of earlier sale lines (the last one per invoice, product and time) to what remains."""
+    conn.executemany(
+        "UPDATE fact_sales SET net_quantity = ? WHERE transaction_key = ("
+        "SELECT MAX(transaction_key) FROM fact_sales "
+        "WHERE invoice_no = ? AND product_key = ? AND transaction_datetime = ? AND sign = 1)",
+        zip(*(
+            _column_values(restated[col]) for col in ["remaining", "invoice_no", "product_key", "transaction_datetime"]
+        )),
+    )
+    logging.info(f"Restated net_quantity of {len(restated):,} earlier sale lines")
+    return len(restated)
+
+
+@instrumented()
+def load_database(
+    db_path: Path, dims: dict, fact_sales: pd.DataFrame, outliers: pd.DataFrame,
+    append: bool = False, batch_size: int = 50000, watermark: dict = None, restated: pd.DataFrame = None,
+):
+    """
+    Load the warehouse frames into the SQLite database. Dimensions are always
+    replaced with the given (already upserted) frames. With append, fact rows
+    are added to the existing ones; otherwise the fact tables are replaced.
+    Appending first deletes rows after watermark (the last committed one), so
+    a batch whose load failed later on is replaced rather than duplicated.
+    restated holds sale lines of earlier batches with their new net_quantity.
+    """
+    db_path = Path(db_path)
+    size_before = db_path.stat().st_size if db_path.exists() else 0
+    conn = connect(db_path)
+    try:
+        conn.execute("BEGIN")
+        if not append:
+            _drop_indexes(conn, FACT_TABLES)
+        for name in DIMENSIONS:
+            conn.execute(f"DELETE FROM {name}")
+            insert_frame(conn, name, dims[name], batch_size)
+        for name, df in zip(FACT_TABLES, [fact_sales, outliers]):
+            if not append:
+                conn.execute(f"DELETE FROM {name}")
+            elif watermark:
+                delete_after_watermark(conn, name, watermark)
+            start = time.perf_counter()
+            rows = insert_frame(conn, name, df, batch_size)
+            elapsed = time.perf_counter() - start
+            logging.info(f"Inserted {rows:,} rows into {name} ({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+        if restated is not None and len(restated):
+            restate_net_quantity(conn, restated)
+        create_indexes(conn)
+        conn.execute("COMMIT")
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        logging.error(f"Failed to load the SQLite warehouse {db_path}: {e}")
+        raise
+    finally:
+        conn.close()
+
+    record_bytes_written(max(db_path.stat().st_size - size_before, 0))
+    logging.info(f"SQLite warehouse loaded → {db_path}")
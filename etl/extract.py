@@ -1,82 +1,219 @@
+import hashlib
+import json
 import os
 import pandas as pd
-import yaml
 import logging
-from ucimlrepo import fetch_ucirepo
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from etl.profiling import profile_frames, profile_report
+from etl.schema import conform_raw
+from etl.sources import iter_source_frames
+from src.helpers.config import DEFAULT_CONFIG_PATH, load_config
+from src.helpers.metrics import instrumented, record_bytes_written
 
 
-def load_config(config_path: Path = Path(__file__).resolve().parents[1] / "config.yaml") -> dict:
-    """Load pipeline configuration from YAML file."""
-    with open(config_path, "r") as f:
-        config = yaml.safe_load(f)
-    return config
+@instrumented()
+def generate_profiling_report(df: pd.DataFrame, report_path: Path, options: dict = None):
+    """
+    Generate a data profiling report and save to CSV. The frame is profiled
+    in chunks of options["chunksize"] rows; see etl/profiling.py.
+    """
+    options = options or {}
+    chunksize = options.get("chunksize", 1_000_000)
+    chunks = (df.iloc[start:start + chunksize] for start in range(0, len(df), chunksize))
+    profiles = profile_frames(chunks, options.get("approximate", False), options.get("sample_size", 10000))
+    write_profiling_report(profiles, report_path)
 
 
-def generate_profiling_report(df: pd.DataFrame, report_path: Path):
-    """Generate a simple data profiling report and save to CSV."""
-    report = pd.DataFrame({
-        "column": df.columns,
-        "dtype": [str(dt) for dt in df.dtypes],
-        "num_missing": df.isna().sum(),
-        "num_unique": df.nunique(),
-        "sample_values": [df[col].dropna().unique()[:5].tolist() for col in df.columns]
-    })
+def write_profiling_report(profiles: dict, report_path: Path):
+    """Save column profiles from etl.profiling as the profiling report CSV."""
     report_path.parent.mkdir(parents=True, exist_ok=True)
-    report.to_csv(report_path, index=False)
+    profile_report(profiles).to_csv(report_path, index=False)
     logging.info(f"Data profiling report saved to {report_path}")
 
 
-def download_dataset(dataset_id=352, config_path: Path = None):
+def check_raw_dataset(df: pd.DataFrame):
+    """Early data quality checks on a raw extract: required columns, numeric types, critical nulls."""
+    required_columns = [
+        "InvoiceNo", "StockCode", "Description", "Quantity",
+        "InvoiceDate", "UnitPrice", "CustomerID", "Country"
+    ]
+    missing_cols = [col for col in required_columns if col not in df.columns]
+    if missing_cols:
+        logging.error(f"Missing required columns in raw dataset: {missing_cols}")
+        raise ValueError(f"Raw dataset is missing columns: {missing_cols}")
+
+    # Check types for numeric columns
+    numeric_cols = ["Quantity", "UnitPrice", "CustomerID"]
+    for col in numeric_cols:
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            logging.warning(f"Column '{col}' is not numeric")
+
+    # Critical columns for downstream processing
+    critical_cols = ["InvoiceNo", "CustomerID", "InvoiceDate", "StockCode"]
+    for col in critical_cols:
+        missing_count = df[col].isna().sum()
+        if missing_count > 0:
+            logging.warning(f"{missing_count} missing values in critical column '{col}'")
+
+
+# --- Raw snapshot cache ---
+# Snapshots are stored as <content hash>.parquet in the cache directory;
+# manifest.json records, per dataset, the current snapshot, when it was
+# fetched and the raw CSV that was written from it.
+
+def content_hash(df: pd.DataFrame) -> str:
+    """SHA-256 of the column names, dtypes and row values of a DataFrame."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[col, str(dt)] for col, dt in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def read_cache_manifest(cache_dir: Path) -> dict:
+    manifest_path = Path(cache_dir) / "manifest.json"
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def write_cache_manifest(cache_dir: Path, manifest: dict):
+    """Write the manifest atomically so an interrupted run keeps the previous one."""
+    manifest_path = Path(cache_dir) / "manifest.json"
+    tmp_path = manifest_path.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def cache_snapshot(df: pd.DataFrame, cache_dir: Path, dataset_id) -> dict:
+    """Store a raw snapshot in the cache (if its content is new) and make it current."""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    digest = content_hash(df)
+    snapshot_path = cache_dir / f"{digest}.parquet"
+    if not snapshot_path.exists():
+        df.to_parquet(snapshot_path, index=False)
+        logging.info(f"Cached raw snapshot {digest[:12]} ({len(df):,} rows)")
+
+    manifest = read_cache_manifest(cache_dir)
+    entry = manifest.get(str(dataset_id), {})
+    if entry.get("content_hash") != digest:
+        entry = {"content_hash": digest, "rows": len(df), "columns": list(df.columns)}
+    entry["snapshot"] = snapshot_path.name
+    entry["fetched_at"] = datetime.now(timezone.utc).isoformat()
+    manifest[str(dataset_id)] = entry
+    write_cache_manifest(cache_dir, manifest)
+    return entry
+
+
+def fetch_dataset(dataset_id) -> pd.DataFrame:
+    """Fetch a dataset from the UCI repository, with object columns normalised to strings."""
+    from ucimlrepo import fetch_ucirepo
+
+    logging.info(f"Downloading dataset ID {dataset_id} from UCI repository...")
+    df = fetch_ucirepo(id=dataset_id).data.original
+    # Object columns can mix ints and strings (e.g. StockCode); strings keep
+    # the CSV text identical and make the snapshot storable as Parquet
+    object_cols = df.select_dtypes(include="object").columns
+    return df.astype({col: "string" for col in object_cols})
+
+
+def is_fresh(entry: dict, max_age_hours: float) -> bool:
+    """Whether a cache entry was fetched less than max_age_hours ago."""
+    if not entry or max_age_hours is None:
+        return False
+    fetched_at = datetime.fromisoformat(entry["fetched_at"])
+    return datetime.now(timezone.utc) - fetched_at < timedelta(hours=max_age_hours)
+
+
+def raw_csv_is_current(save_path: Path, entry: dict) -> bool:
+    """Whether the raw CSV on disk is the one written from the entry's snapshot and is unchanged."""
+    written = entry.get("raw_csv")
+    if not written or not save_path.exists():
+        return False
+    stat = save_path.stat()
+    return (
+        written["path"] == str(save_path)
+        and written["content_hash"] == entry["content_hash"]
+        and written["size"] == stat.st_size
+        and written["mtime_ns"] == stat.st_mtime_ns
+    )
+
+
+@instrumented()
+def download_dataset(dataset_id=352, config_path: Path = None, config: dict = None):
     """
     Download the Online Retail dataset from UCI and save locally
     using path from config.yaml if provided. Performs basic early
     data quality checks and generates a profiling report.
+
+    Raw snapshots are cached by content hash: the download is skipped while
+    the cached snapshot is younger than extract.max_age_hours, and the CSV
+    and profiling report are only rewritten when the content changed.
+    With extract.offline the cache is the only source.
     """
-    if config_path is None:
-        config_path = Path(__file__).resolve().parents[1] / "config.yaml"
-    config = load_config(config_path)
+    if config is None:
+        config = load_config(config_path or DEFAULT_CONFIG_PATH)
+    extract_config = config.get("extract", {})
 
     save_path = Path(config["paths"]["raw_data"])
     save_dir = save_path.parent
     os.makedirs(save_dir, exist_ok=True)
 
     try:
-        logging.info(f"Downloading dataset ID {dataset_id} from UCI repository...")
-        dataset = fetch_ucirepo(id=dataset_id)
-        df = dataset.data.original
+        cache_dir = Path(extract_config.get("cache_dir", save_dir / "cache"))
+        entry = read_cache_manifest(cache_dir).get(str(dataset_id), {})
+        df = None
+
+        if extract_config.get("offline", False):
+            if not entry:
+                raise FileNotFoundError(f"Offline mode: no cached snapshot of dataset {dataset_id} in {cache_dir}")
+            logging.info(f"Offline mode: using cached snapshot {entry['content_hash'][:12]}")
+        elif is_fresh(entry, extract_config.get("max_age_hours")):
+            logging.info(f"Cached snapshot {entry['content_hash'][:12]} is current, skipping download")
+        else:
+            try:
+                df = fetch_dataset(dataset_id)
+            except Exception as e:
+                if not entry:
+                    raise
+                logging.warning(f"Download failed ({e}), using cached snapshot {entry['content_hash'][:12]}")
+            else:
+                entry = cache_snapshot(df, cache_dir, dataset_id)
+
+        if raw_csv_is_current(save_path, entry):
+            logging.info(f"Raw CSV unchanged since last extract: {save_path}")
+            return save_path
+
+        if df is None:
+            df = pd.read_parquet(cache_dir / entry["snapshot"])
 
         # --- Early data quality checks ---
-        required_columns = [
-            "InvoiceNo", "StockCode", "Description", "Quantity",
-            "InvoiceDate", "UnitPrice", "CustomerID", "Country"
-        ]
-        missing_cols = [col for col in required_columns if col not in df.columns]
-        if missing_cols:
-            logging.error(f"Missing required columns in raw dataset: {missing_cols}")
-            raise ValueError(f"Raw dataset is missing columns: {missing_cols}")
-
-        # Check types for numeric columns
-        numeric_cols = ["Quantity", "UnitPrice", "CustomerID"]
-        for col in numeric_cols:
-            if not pd.api.types.is_numeric_dtype(df[col]):
-                logging.warning(f"Column '{col}' is not numeric")
-
-        # Critical columns for downstream processing
-        critical_cols = ["InvoiceNo", "CustomerID", "InvoiceDate", "StockCode"]
-        for col in critical_cols:
-            missing_count = df[col].isna().sum()
-            if missing_count > 0:
-                logging.warning(f"{missing_count} missing values in critical column '{col}'")
+        check_raw_dataset(df)
 
         # --- Save CSV ---
         df.to_csv(save_path, index=False)
+        record_bytes_written(save_path.stat().st_size)
         logging.info(f"Dataset saved to: {save_path}")
         logging.info(f"Shape: {df.shape[0]:,} rows x {df.shape[1]} columns")
 
         # --- Generate profiling report ---
         report_path = Path(config["paths"]["profiling_report"])
-        generate_profiling_report(df, report_path)
+        generate_profiling_report(df, report_path, config.get("profiling"))
+
+        # Remember which snapshot the CSV was written from
+        stat = save_path.stat()
+        entry["raw_csv"] = {
+            "path": str(save_path),
+            "content_hash": entry["content_hash"],
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        }
+        manifest = read_cache_manifest(cache_dir)
+        manifest[str(dataset_id)] = entry
+        write_cache_manifest(cache_dir, manifest)
 
         return save_path
 
@@ -85,9 +222,65 @@ def download_dataset(dataset_id=352, config_path: Path = None):
         raise
 
 
-def main():
-    download_dataset()
+def iter_local_files(config: dict):
+    """
+    Yield the local source files one DataFrame at a time, each passed through
+    the early checks. The files are profiled as they pass and the profiling
+    report is written once the last file has been read.
+    """
+    source = config["source"]
+    options = config.get("profiling") or {}
+    profiles = {}
+    for df in iter_source_frames(source["path"], source.get("max_workers", 8)):
+        check_raw_dataset(df)
+        profiles = profile_frames(
+            [df], options.get("approximate", False), options.get("sample_size", 10000), profiles=profiles
+        )
+        yield df
+    write_profiling_report(profiles, Path(config["paths"]["profiling_report"]))
+
+
+@instrumented()
+def ingest_local_files(config: dict, save_raw: bool = True) -> pd.DataFrame:
+    """
+    Read all local source files concurrently into one raw DataFrame and,
+    if save_raw, write it to the raw CSV path for standalone transform runs.
+    """
+    try:
+        df = pd.concat(list(iter_local_files(config)), ignore_index=True)
+        df = conform_raw(df)  # re-unify categories across files
+        logging.info(f"Ingested {len(df):,} rows from {config['source']['path']}")
+
+        if save_raw:
+            save_path = Path(config["paths"]["raw_data"])
+            save_path.parent.mkdir(parents=True, exist_ok=True)
+            df.to_csv(save_path, index=False)
+            record_bytes_written(save_path.stat().st_size)
+            logging.info(f"Dataset saved to: {save_path}")
+        return df
+    except Exception as e:
+        logging.error(f"Failed to ingest local source files: {e}")
+        raise
+
+
+def main(save_raw: bool = True, stream: bool = False, config: dict = None):
+    """
+    Extract raw data from the configured source. The UCI source writes the raw
+    CSV and returns None. The files source returns the raw data for the
+    transform stage: one DataFrame, or with stream an iterator yielding one
+    DataFrame per file. config.yaml is read unless config is given.
+    """
+    config = load_config() if config is None else config
+    source = config.get("source", {"type": "uci"})
+
+    if source.get("type", "uci") == "files":
+        if stream:
+            return iter_local_files(config)
+        return ingest_local_files(config, save_raw=save_raw)
+
+    download_dataset(config=config)
+    return None
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
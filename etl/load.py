@@ -1,28 +1,31 @@
 
 from pathlib import Path
+import shutil
+import numpy as np
 import pandas as pd
-import yaml
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 import logging
+from etl.aggregate import ROLLUPS, build_rollups, merge_rollups, read_rollups
+from etl.database import load_database
+from etl.scd import apply_versions, attribute_hash, build_versions, hash_index, version_keys
+from etl.schema import read_processed_csv
+from etl.warehouse import (
+    apply_pending, pending_dir, publish, read_publish_marker, remove_uncommitted_parts, write_pending_manifest,
+)
+from etl.watermark import after_watermark, compute_watermark, read_incremental_watermark, watermark_id, write_watermark
+from src.helpers.config import load_config
+from src.helpers.metrics import instrumented, record_bytes_written
 
 
-def load_config(config_path: Path = Path(__file__).resolve().parents[1] / "config.yaml") -> dict:
-    """Load pipeline configuration from YAML file."""
-    try:
-        with open(config_path, "r") as file:
-            config = yaml.safe_load(file)
-        logging.info(f"Configuration loaded from {config_path}")
-        return config
-    except Exception as e:
-        logging.error(f"Failed to load config file: {e}")
-        raise
-
-
+@instrumented()
 def load_transform_outputs(paths: dict):
     """Load outputs from transform.py"""
     try:
-        transactions = pd.read_csv(paths["transactions"], dtype={"InvoiceNo": str, "CustomerID": str})
-        cancellations = pd.read_csv(paths["cancellations"], dtype={"InvoiceNo": str, "CustomerID": str})
-        outliers = pd.read_csv(paths["outliers"], dtype={"InvoiceNo": str, "CustomerID": str})
+        transactions = read_processed_csv(paths["transactions"])
+        cancellations = read_processed_csv(paths["cancellations"])
+        outliers = read_processed_csv(paths["outliers"])
         logging.info("Transform outputs loaded successfully")
         return transactions, cancellations, outliers
     except Exception as e:
@@ -30,7 +33,10 @@ def load_transform_outputs(paths: dict):
         raise
 
 
-def prepare_fact_table(transactions: pd.DataFrame, cancellations: pd.DataFrame) -> pd.DataFrame:
+@instrumented()
+def prepare_fact_table(
+    transactions: pd.DataFrame, cancellations: pd.DataFrame, open_sales: pd.DataFrame = None
+) -> pd.DataFrame:
     """Merge transactions and cancellations into fact_sales table"""
     try:
         transactions = transactions.copy()
@@ -41,9 +47,12 @@ def prepare_fact_table(transactions: pd.DataFrame, cancellations: pd.DataFrame)
 
         cancellations["transaction_type"] = "CANCEL"
         cancellations["sign"] = -1
+        # Cancellations arrive with negative quantities; the sign carries the direction
+        cancellations["Quantity"] = cancellations["Quantity"].abs()
 
         fact_table = pd.concat([transactions, cancellations], ignore_index=True)
         fact_table.rename(columns={"InvoiceDate": "transaction_datetime"}, inplace=True)
+        fact_table = match_cancellations(fact_table, open_sales)
 
         logging.info(f"Fact table prepared with {len(fact_table):,} rows")
         return fact_table
@@ -52,35 +61,585 @@ def prepare_fact_table(transactions: pd.DataFrame, cancellations: pd.DataFrame)
         raise
 
 
-def save_parquet(df: pd.DataFrame, output_dir: Path, filename: str):
+# Latest sale line of every (customer, product) pair loaded so far and its
+# quantity not yet cancelled, so incremental runs can match cancellations
+# to sales of earlier batches. batch is the run id of the sale's part files.
+OPEN_SALES_COLUMNS = [
+    "customer_id", "stock_code", "invoice_no", "transaction_datetime", "product_key", "remaining", "batch",
+]
+
+
+def match_cancellations(fact: pd.DataFrame, open_sales: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Attach each cancellation to the sale line it reverses: the latest sale of
+    the same product to the same customer at or before the cancellation
+    (an as-of join on transaction_datetime by CustomerID and StockCode),
+    looked up in the batch and in open_sales (sales of earlier batches).
+    Adds matched_invoice_no and is_orphan (cancellations without such a sale),
+    and net_quantity: sales keep their quantity minus the quantity cancelled
+    against them, never below 0; cancellations the part of their quantity no
+    sale was left to absorb, negated (orphans -quantity), so net_quantity
+    sums to the signed quantity of the table and its earlier sales.
+    """
+    fact = fact.reset_index(drop=True)
+    open_sales = open_sales if open_sales is not None else pd.DataFrame(columns=OPEN_SALES_COLUMNS)
+    n_open = len(open_sales)
+    is_cancel = np.concatenate([np.zeros(n_open, dtype=bool), (fact["transaction_type"] == "CANCEL").to_numpy()])
+
+    # Integer key per (customer, product) pair shared by sales and cancellations;
+    # earlier sales come first, so a batch sale at the same time wins the match
+    customers = pd.concat([open_sales["customer_id"].astype(str), fact["CustomerID"].astype(str)], ignore_index=True)
+    products = pd.concat([open_sales["stock_code"].astype(str), fact["StockCode"].astype(str)], ignore_index=True)
+    pair = customers.groupby([customers, products], sort=False).ngroup().to_numpy()
+    rows = pd.DataFrame({
+        "row": np.arange(len(pair)),
+        "pair": pair,
+        "transaction_datetime": np.concatenate([
+            pd.to_datetime(open_sales["transaction_datetime"]).to_numpy(dtype="datetime64[ns]"),
+            pd.to_datetime(fact["transaction_datetime"]).to_numpy(dtype="datetime64[ns]"),
+        ]),
+    })
+    sales = rows[~is_cancel].sort_values("transaction_datetime", kind="stable")
+    cancels = rows[is_cancel].sort_values("transaction_datetime", kind="stable")
+    matches = pd.merge_asof(
+        cancels, sales.rename(columns={"row": "sale_row"}),
+        on="transaction_datetime", by="pair", direction="backward",
+    )
+
+    sale_row = matches["sale_row"].to_numpy()
+    cancel_row = matches["row"].to_numpy()
+    matched = ~np.isnan(sale_row)
+    sale_row, cancel_row = sale_row[matched].astype("int64"), cancel_row[matched]
+
+    # Cancellations take from their sale in time order until nothing is left
+    quantity = np.concatenate([
+        open_sales["remaining"].to_numpy(dtype="int64"), fact["Quantity"].to_numpy(dtype="int64")
+    ])
+    cancel_quantity = quantity[cancel_row]
+    taken_before = pd.Series(cancel_quantity).groupby(sale_row).cumsum().to_numpy() - cancel_quantity
+    applied = np.clip(quantity[sale_row] - taken_before, 0, cancel_quantity)
+    cancelled = np.bincount(sale_row, weights=applied, minlength=len(quantity)).astype("int64")
+    net_quantity = np.where(is_cancel, -quantity, quantity - cancelled)
+    net_quantity[cancel_row] = applied - cancel_quantity
+
+    invoices = np.concatenate([open_sales["invoice_no"].to_numpy(dtype=object), fact["InvoiceNo"].to_numpy()])
+    matched_invoice_no = pd.Series(pd.NA, index=np.arange(len(quantity)), dtype="string[pyarrow]")
+    matched_invoice_no.iloc[cancel_row] = invoices[sale_row]
+    is_orphan = is_cancel.copy()
+    is_orphan[cancel_row] = False
+
+    logging.info(
+        f"Matched {len(cancel_row):,} of {int(is_cancel.sum()):,} cancellations to sales "
+        f"({int((sale_row < n_open).sum()):,} of earlier batches), {int(is_orphan.sum()):,} orphaned"
+    )
+    return fact.assign(
+        net_quantity=net_quantity[n_open:].astype("int32"),
+        matched_invoice_no=matched_invoice_no.iloc[n_open:].set_axis(fact.index),
+        is_orphan=is_orphan[n_open:],
+    )
+
+
+def update_open_sales(open_sales: pd.DataFrame, fact: pd.DataFrame, product_keys, batch: str):
+    """
+    Open sale lines after a batch (fact from prepare_fact_table, product_keys
+    of its rows) and the lines of earlier batches whose remaining quantity
+    cancellations in the batch reduced, whose fact rows are to be restated.
+    """
+    open_sales = open_sales if open_sales is not None else pd.DataFrame(columns=OPEN_SALES_COLUMNS)
+    open_sales = open_sales.astype({"customer_id": str, "stock_code": str, "invoice_no": str})
+
+    # A cancellation matched to an earlier batch names that pair's open line
+    cancels = fact[fact["transaction_type"] == "CANCEL"]
+    taken = pd.DataFrame({
+        "customer_id": cancels["CustomerID"].astype(str).to_numpy(),
+        "stock_code": cancels["StockCode"].astype(str).to_numpy(),
+        "invoice_no": cancels["matched_invoice_no"].astype(object).to_numpy(),
+        "taken": (cancels["Quantity"] + cancels["net_quantity"]).to_numpy(dtype="int64"),
+    }).dropna(subset=["invoice_no"]).groupby(["customer_id", "stock_code", "invoice_no"], as_index=False)["taken"].sum()
+    open_sales = open_sales.merge(taken, on=["customer_id", "stock_code", "invoice_no"], how="left")
+    reduced = open_sales["taken"].fillna(0).to_numpy() > 0
+    open_sales["remaining"] = (open_sales["remaining"] - open_sales["taken"].fillna(0)).astype("int32")
+    open_sales = open_sales.drop(columns="taken")
+
+    is_sale = (fact["transaction_type"] == "SALE").to_numpy()
+    sales = pd.DataFrame({
+        "customer_id": fact["CustomerID"].astype(str).to_numpy()[is_sale],
+        "stock_code": fact["StockCode"].astype(str).to_numpy()[is_sale],
+        "invoice_no": fact["InvoiceNo"].astype(str).to_numpy()[is_sale],
+        "transaction_datetime": pd.to_datetime(fact["transaction_datetime"]).to_numpy()[is_sale],
+        "product_key": np.asarray(product_keys, dtype="int32")[is_sale],
+        "remaining": fact["net_quantity"].to_numpy(dtype="int32")[is_sale],
+        "batch": batch,
+    })
+    latest = pd.concat([open_sales, sales], ignore_index=True) if len(open_sales) else sales
+    latest = latest.sort_values("transaction_datetime", kind="stable")
+    latest = latest.drop_duplicates(["customer_id", "stock_code"], keep="last")
+    latest = latest.astype({"product_key": "int32", "remaining": "int32"})
+    return latest[OPEN_SALES_COLUMNS].reset_index(drop=True), open_sales[reduced].reset_index(drop=True)
+
+
+def restate_sales(warehouse_dir: Path, filename: str, restated: pd.DataFrame, output_dir: Path, options: dict = None):
+    """
+    Rewrite the part files of fact_sales holding the restated sale lines with
+    their new net_quantity (the last matching line of a file, as in
+    match_cancellations) under output_dir. Returns their paths relative to it.
+    """
+    try:
+        warehouse_dir = Path(warehouse_dir)
+        dataset_dir = warehouse_dir / Path(filename).stem
+        written = []
+        for batch, lines in restated.groupby("batch"):
+            lines = lines.assign(
+                transaction_datetime=pd.to_datetime(lines["transaction_datetime"]).astype("datetime64[ns]")
+            )
+            for path in sorted(dataset_dir.rglob(f"part-{batch}*.parquet")):
+                table = pq.read_table(path)
+                rows = table.select(["invoice_no", "product_key", "transaction_datetime", "sign"]).to_pandas()
+                rows = rows.assign(
+                    position=np.arange(len(rows)),
+                    transaction_datetime=rows["transaction_datetime"].astype("datetime64[ns]"),
+                )
+                found = rows[rows["sign"] == 1].merge(
+                    lines, on=["invoice_no", "product_key", "transaction_datetime"]
+                ).drop_duplicates(["invoice_no", "product_key", "transaction_datetime"], keep="last")
+                if found.empty:
+                    continue
+                net_quantity = table.column("net_quantity").to_numpy().copy()
+                net_quantity[found["position"].to_numpy()] = found["remaining"].to_numpy()
+                table = table.set_column(
+                    table.schema.get_field_index("net_quantity"), "net_quantity", pa.array(net_quantity, pa.int32())
+                )
+                relative_path = path.relative_to(warehouse_dir)
+                (output_dir / relative_path).parent.mkdir(parents=True, exist_ok=True)
+                pq.write_table(table, output_dir / relative_path, **parquet_write_options(options))
+                record_bytes_written((output_dir / relative_path).stat().st_size)
+                written.append(relative_path)
+        logging.info(f"Restated {len(restated):,} sale lines of earlier batches in {len(written)} part files")
+        return written
+    except Exception as e:
+        logging.error(f"Failed to restate sale lines in {filename}: {e}")
+        raise
+
+
+def read_open_sales(path: Path) -> pd.DataFrame:
+    """Load the stored open sale lines (None if there are none yet)"""
+    path = Path(path)
+    return pd.read_parquet(path) if path.exists() else None
+
+
+def prepare_outliers_table(outliers: pd.DataFrame) -> pd.DataFrame:
+    """Shape quarantined outliers like fact_sales (outliers are always sales)"""
+    outliers = outliers.copy()
+    outliers["transaction_type"] = "SALE"
+    outliers["sign"] = 1
+    outliers["net_quantity"] = outliers["Quantity"].astype("int32")
+    outliers["matched_invoice_no"] = pd.Series(pd.NA, index=outliers.index, dtype="string[pyarrow]")
+    outliers["is_orphan"] = False
+    return outliers.rename(columns={"InvoiceDate": "transaction_datetime"})
+
+
+# Type-2 dimensions: surrogate key, natural key and the source column of each
+SCD_DIMENSIONS = {
+    "dim_customers": ("customer_key", "customer_id", "CustomerID", {"country": "Country"}),
+    "dim_products": ("product_key", "stock_code", "StockCode", {"description": "Description"}),
+}
+
+
+@instrumented()
+def build_dimensions(*tables: pd.DataFrame) -> dict:
+    """
+    Build dim_customers, dim_products and dim_time from fact-shaped tables.
+    Customers and products are Type-2 dimensions (see etl/scd.py): a new
+    version starts whenever a key's attributes change between transactions,
+    and versions get 1-based int32 surrogate keys in order of natural key and
+    valid_from. Dates are keyed by an int32 YYYYMMDD key.
+    """
+    try:
+        rows = pd.concat(
+            [t[["CustomerID", "Country", "StockCode", "Description", "transaction_datetime"]] for t in tables],
+            ignore_index=True,
+        )
+
+        dims = {}
+        for name, (key, natural_key, source, attributes) in SCD_DIMENSIONS.items():
+            source_rows = rows[[source, *attributes.values(), "transaction_datetime"]].rename(
+                columns={source: natural_key, **{src: col for col, src in attributes.items()}}
+            )
+            versions = build_versions(source_rows, natural_key, list(attributes), "transaction_datetime")
+            versions.insert(0, key, np.arange(1, len(versions) + 1, dtype="int32"))
+            dims[name] = versions.drop(columns="attr_hash")
+
+        dates = pd.DatetimeIndex(rows["transaction_datetime"].dt.normalize().unique()).sort_values()
+        dims["dim_time"] = pd.DataFrame({
+            "date_key": date_keys(dates),
+            "date": dates.date,
+            "year": dates.year.astype("int16"),
+            "month": dates.month.astype("int8"),
+            "day": dates.day.astype("int8"),
+            "weekday": dates.day_name(),
+        })
+
+        logging.info(
+            f"Dimensions built: {len(dims['dim_customers']):,} customer versions, "
+            f"{len(dims['dim_products']):,} product versions, {len(dims['dim_time']):,} dates"
+        )
+        return dims
+    except Exception as e:
+        logging.error(f"Error building dimension tables: {e}")
+        raise
+
+
+def date_keys(dates) -> np.ndarray:
+    """Convert datetimes to int32 YYYYMMDD keys"""
+    dates = pd.DatetimeIndex(dates)
+    return (dates.year * 10000 + dates.month * 100 + dates.day).to_numpy(dtype="int32")
+
+
+@instrumented()
+def apply_dimension_keys(df: pd.DataFrame, dims: dict) -> pd.DataFrame:
+    """
+    Replace natural keys and attributes with surrogate keys, using db/schema.sql
+    column names. Each row gets the customer and product versions valid at
+    its transaction_datetime.
+    """
+    try:
+        keys = {
+            key: version_keys(df[source], df["transaction_datetime"], dims[name], key, natural_key)
+            for name, (key, natural_key, source, _) in SCD_DIMENSIONS.items()
+        }
+
+        return pd.DataFrame({
+            "invoice_no": df["InvoiceNo"].to_numpy(),
+            "customer_key": keys["customer_key"],
+            "product_key": keys["product_key"],
+            "date_key": date_keys(df["transaction_datetime"]),
+            "transaction_datetime": df["transaction_datetime"].to_numpy(),
+            "quantity": df["Quantity"].to_numpy(dtype="int32"),
+            "unit_price": df["UnitPrice"].to_numpy(),
+            "sign": df["sign"].to_numpy(dtype="int16"),
+            "transaction_type": df["transaction_type"].to_numpy(),
+            "net_quantity": df["net_quantity"].to_numpy(dtype="int32"),
+            "matched_invoice_no": df["matched_invoice_no"].astype("string[pyarrow]").array,
+            "is_orphan": df["is_orphan"].to_numpy(dtype=bool),
+        })
+    except Exception as e:
+        logging.error(f"Error applying dimension keys: {e}")
+        raise
+
+
+def load_existing_dimensions(warehouse_dir: Path, paths: dict) -> dict:
+    """Load dimension tables already in the warehouse (missing ones are skipped)"""
+    existing = {}
+    for name in ["dim_customers", "dim_products", "dim_time"]:
+        path = warehouse_dir / paths[name]
+        if path.exists():
+            existing[name] = pd.read_parquet(path)
+    return existing
+
+
+def build_hash_indexes(dims: dict) -> dict:
+    """Hash indexes of the current versions of the Type-2 dimensions."""
+    return {
+        name: hash_index(dims[name], key, natural_key, list(attributes))
+        for name, (key, natural_key, _, attributes) in SCD_DIMENSIONS.items()
+    }
+
+
+def read_hash_indexes(index_dir: Path) -> dict:
+    """Load the stored hash indexes (missing ones are skipped)"""
+    indexes = {}
+    for name in SCD_DIMENSIONS:
+        path = Path(index_dir) / f"{name}.parquet"
+        if path.exists():
+            indexes[name] = pd.read_parquet(path)
+    return indexes
+
+
+def upsert_dimensions(existing: dict, batch: dict, indexes: dict = None):
+    """
+    Merge dimensions built from a new batch into the existing ones and return
+    (dimensions, hash indexes). Customers and products whose attributes are
+    unchanged keep their current version; changed ones get a new version and
+    the old one is closed, new ones get their first version. Change detection
+    only reads the batch and the hash indexes, which are rebuilt from the
+    existing dimensions when missing.
+    """
+    try:
+        indexes = dict(indexes or {})
+        merged = {}
+        for name, (key, natural_key, _, attributes) in SCD_DIMENSIONS.items():
+            attributes = list(attributes)
+            batch_versions = batch[name].drop(columns=key)
+            batch_versions["attr_hash"] = attribute_hash(batch_versions, attributes)
+            if name not in existing:
+                merged[name] = batch[name]
+                indexes[name] = hash_index(batch[name], key, natural_key, attributes)
+                continue
+            if "is_current" not in existing[name].columns:
+                raise ValueError(f"{name} in the warehouse has no version history; reload the full history first")
+
+            index = indexes.get(name)
+            if index is None:
+                index = hash_index(existing[name], key, natural_key, attributes)
+            merged[name], indexes[name] = apply_versions(
+                existing[name], index, batch_versions, key, natural_key, attributes
+            )
+
+        dim_time = batch["dim_time"]
+        if "dim_time" in existing:
+            dim_time = pd.concat([existing["dim_time"], dim_time]).drop_duplicates("date_key")
+        merged["dim_time"] = dim_time.sort_values("date_key").reset_index(drop=True)
+        return merged, indexes
+    except Exception as e:
+        logging.error(f"Error upserting dimension tables: {e}")
+        raise
+
+
+@instrumented()
+def save_parquet(df: pd.DataFrame, output_dir: Path, filename: str, options: dict = None):
     """Save DataFrame to Parquet format"""
     try:
         output_dir.mkdir(parents=True, exist_ok=True)
         output_path = output_dir / filename
-        df.to_parquet(output_path, index=False)
+        df.to_parquet(output_path, index=False, **parquet_write_options(options))
+        record_bytes_written(output_path.stat().st_size)
         logging.info(f"Saved {filename} with {len(df):,} rows → {output_path}")
     except Exception as e:
         logging.error(f"Failed to save {filename} to Parquet: {e}")
         raise
 
 
-def main():
+def append_parquet(df: pd.DataFrame, output_dir: Path, filename: str, run_id: str, options: dict = None):
+    """Append DataFrame as a new part file in a dataset directory named after filename"""
+    save_parquet(df, output_dir / Path(filename).stem, f"part-{run_id}.parquet", options)
+
+
+@instrumented()
+def save_partitioned_parquet(
+    df: pd.DataFrame, output_dir: Path, filename: str, options: dict = None, run_id: str = None
+):
+    """
+    Save fact-shaped rows as a Hive-partitioned dataset (year=/month=, and
+    transaction_type= if configured) in a directory named after filename.
+    Without run_id the dataset is replaced; with run_id new files are added.
+    """
+    try:
+        options = options or {}
+        dataset_dir = output_dir / Path(filename).stem
+        partition_cols = ["year", "month"]
+        if options.get("partition_by_transaction_type", False):
+            partition_cols.append("transaction_type")
+
+        if run_id is None and dataset_dir.exists():
+            shutil.rmtree(dataset_dir)
+
+        table = pa.Table.from_pandas(
+            df.assign(
+                year=df["transaction_datetime"].dt.year.astype("int16"),
+                month=df["transaction_datetime"].dt.month.astype("int8"),
+            ),
+            preserve_index=False,
+        )
+        file_format = ds.ParquetFileFormat()
+        row_group_size = options.get("row_group_size")
+        ds.write_dataset(
+            table,
+            dataset_dir,
+            format=file_format,
+            file_options=file_format.make_write_options(**{
+                k: v for k, v in parquet_write_options(options).items() if k != "row_group_size"
+            }),
+            partitioning=ds.partitioning(table.select(partition_cols).schema, flavor="hive"),
+            basename_template=f"part-{run_id or 'full'}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            min_rows_per_group=min(row_group_size, 65536) if row_group_size else 0,
+            max_rows_per_group=row_group_size or 1024 * 1024,
+            file_visitor=lambda written: record_bytes_written(written.size),
+        )
+        logging.info(f"Saved {filename} with {len(df):,} rows → {dataset_dir} (partitioned by {partition_cols})")
+    except Exception as e:
+        logging.error(f"Failed to save partitioned {filename}: {e}")
+        raise
+
+
+def parquet_write_options(options: dict = None) -> dict:
+    """pyarrow Parquet writer arguments from the parquet section of config.yaml"""
+    options = options or {}
+    write_options = {
+        "compression": options.get("compression", "snappy"),
+        "use_dictionary": options.get("use_dictionary", True),
+        "write_statistics": True,
+    }
+    if options.get("row_group_size"):
+        write_options["row_group_size"] = options["row_group_size"]
+    return write_options
+
+
+def remove_table(output_dir: Path, filename: str):
+    """Remove a table stored either as a single file or as a dataset directory"""
+    single_file = output_dir / filename
+    dataset_dir = output_dir / Path(filename).stem
+    if single_file.is_file():
+        single_file.unlink()
+    if dataset_dir.is_dir():
+        shutil.rmtree(dataset_dir)
+
+
+def save_fact_sales(fact_sales: pd.DataFrame, output_dir: Path, filename: str, options: dict, run_id: str = None):
+    """
+    Write fact_sales in the configured layout. Full writes (no run_id) replace
+    any previous copy of the table, whichever layout it was written in.
+    """
+    if run_id is None:
+        remove_table(output_dir, filename)
+
+    if options.get("partition_fact_sales", False):
+        save_partitioned_parquet(fact_sales, output_dir, filename, options, run_id)
+    elif run_id:
+        append_parquet(fact_sales, output_dir, filename, run_id, options)
+    else:
+        save_parquet(fact_sales, output_dir, filename, options)
+
+
+def save_tables(tables: dict, output_dir: Path, options: dict = None):
+    """Save DataFrames keyed by their path relative to output_dir (e.g. rollups/daily_sales.parquet)"""
+    for relative_path, df in tables.items():
+        relative_path = Path(relative_path)
+        save_parquet(df, output_dir / relative_path.parent, relative_path.name, options)
+
+
+def main(datasets: dict = None, config: dict = None):
+    """
+    Build warehouse tables. Uses the DataFrames handed over by the transform
+    stage when given, otherwise reads the CSV outputs from disk.
+    config.yaml is read unless config is given.
+
+    In incremental mode the batch is appended as new files under
+    fact_sales/ and outliers/, dimensions are upserted and the batch's
+    rollups are added to the stored ones. Storing the new watermark commits
+    the batch, so the load can be repeated after a failure at any step:
+    rows at or before the stored watermark are skipped, part files are named
+    after the batch watermark and uncommitted ones are removed, and the
+    rewritten tables are staged under _pending/ until the commit.
+    """
     try:
-        config = load_config()
+        config = load_config() if config is None else config
         paths = config["paths"]
+        incremental = config.get("pipeline", {}).get("incremental", False)
+        parquet_options = config.get("parquet", {})
 
         # Load outputs of transform.py
-        transactions, cancellations, outliers = load_transform_outputs(paths)
-
-        # Prepare fact_sales table
-        fact_sales = prepare_fact_table(transactions, cancellations)
+        if datasets is None:
+            transactions, cancellations, outliers = load_transform_outputs(paths)
+        else:
+            transactions = datasets["transactions"]
+            cancellations = datasets["cancellations"]
+            outliers = datasets["outliers"]
 
         warehouse_dir = Path(paths["warehouse"])
+        db_config = config.get("warehouse_db", {})
+        state_path = Path(paths["state"]) if incremental else None
+        previous = read_incremental_watermark(paths) if incremental else None
+        published_tables = ["dim_customers", "dim_products", "dim_time", "fact_sales", "outliers", *ROLLUPS]
+
+        if incremental:
+            # Finish or discard what a failed load staged, and skip rows it already committed
+            apply_pending(warehouse_dir, previous)
+            transactions, cancellations, outliers = [
+                df[after_watermark(df["InvoiceDate"], df["InvoiceNo"], previous)]
+                for df in (transactions, cancellations, outliers)
+            ]
+        else:
+            shutil.rmtree(pending_dir(warehouse_dir), ignore_errors=True)
+
+        # Prepare fact_sales table, matching cancellations to sales of earlier batches too
+        open_name = paths.get("open_sales", "open_sales.parquet")
+        open_sales = read_open_sales(warehouse_dir / open_name) if previous is not None else None
+        fact_sales = prepare_fact_table(transactions, cancellations, open_sales)
+        outliers = prepare_outliers_table(outliers)
+
+        if incremental and fact_sales.empty and outliers.empty:
+            logging.info("No new rows since the last watermark, nothing to load")
+            if (read_publish_marker(warehouse_dir) or {}).get("watermark") != previous:
+                publish(warehouse_dir, published_tables, previous)  # the last load failed after its commit
+            return
+
+        # Build dimensions (outliers included so quarantined rows keep valid keys)
+        dims = build_dimensions(fact_sales, outliers)
+        index_name = paths.get("scd_index", "scd_index")
+        if previous is not None:
+            dims, hash_indexes = upsert_dimensions(
+                load_existing_dimensions(warehouse_dir, paths), dims, read_hash_indexes(warehouse_dir / index_name)
+            )
+        else:
+            hash_indexes = build_hash_indexes(dims)
+        sale_lines = fact_sales
+        fact_sales = apply_dimension_keys(fact_sales, dims)
+        outliers = apply_dimension_keys(outliers, dims)
+
+        # Pre-aggregated rollups of fact_sales for dashboards
+        rollups = build_rollups(fact_sales, dims["dim_customers"])
+        rollup_name = paths.get("rollups", "rollups")
+        if previous is not None:
+            rollups = merge_rollups(read_rollups(warehouse_dir / rollup_name), rollups)
+
+        # Dimensions, hash indexes and rollups, rewritten in full on every load
+        tables = {
+            **{paths[name]: dim for name, dim in dims.items()},
+            **{f"{index_name}/{name}.parquet": index for name, index in hash_indexes.items()},
+            **{f"{rollup_name}/{name}.parquet": rollup for name, rollup in rollups.items()},
+        }
+
+        # Save the tables, fact_sales and outliers to warehouse
+        restated = None
+        if incremental:
+            if previous is None:
+                # First incremental run: start the tables from scratch
+                remove_table(warehouse_dir, paths["fact_sales"])
+                remove_table(warehouse_dir, paths["outliers_parquet"])
+            else:
+                for filename in [paths["fact_sales"], paths["outliers_parquet"]]:
+                    remove_uncommitted_parts(warehouse_dir / Path(filename).stem, watermark_id(previous))
+
+            loaded = pd.concat([fact_sales, outliers], ignore_index=True)
+            watermark = compute_watermark(loaded["transaction_datetime"], loaded["invoice_no"], previous=previous)
+            run_id = f"batch-{watermark_id(watermark)}"  # a repeated batch overwrites its own part files
+            save_fact_sales(fact_sales, warehouse_dir, paths["fact_sales"], parquet_options, run_id)
+            append_parquet(outliers, warehouse_dir, paths["outliers_parquet"], run_id, parquet_options)
+
+            # Sales of earlier batches that cancellations reduced are restated in their part files
+            tables[open_name], restated = update_open_sales(open_sales, sale_lines, fact_sales["product_key"], run_id)
+            restated_parts = restate_sales(
+                warehouse_dir, paths["fact_sales"], restated, pending_dir(warehouse_dir), parquet_options
+            )
+            save_tables(tables, pending_dir(warehouse_dir), parquet_options)
+            write_pending_manifest(warehouse_dir, watermark, list(tables) + restated_parts)
+        else:
+            save_tables(tables, warehouse_dir, parquet_options)
+            save_fact_sales(fact_sales, warehouse_dir, paths["fact_sales"], parquet_options)
+            remove_table(warehouse_dir, paths["outliers_parquet"])
+            save_parquet(outliers, warehouse_dir, paths["outliers_parquet"], parquet_options)
+            # A full rebuild replaces incremental output, so the next incremental run starts over
+            if paths.get("state"):
+                Path(paths["state"]).unlink(missing_ok=True)
+
+        # Optional queryable copy of the star schema in SQLite
+        if db_config.get("enabled", False):
+            load_database(
+                db_config["path"], dims, fact_sales, outliers,
+                append=incremental and previous is not None,
+                batch_size=db_config.get("batch_size", 50000),
+                watermark=previous,
+                restated=restated,
+            )
 
-        # Save fact_sales and outliers to warehouse
-        save_parquet(fact_sales, warehouse_dir, paths["fact_sales"])
-        save_parquet(outliers, warehouse_dir, paths["outliers_parquet"])
+        if incremental:
+            # Commit the batch, then move the staged tables into place
+            write_watermark(state_path, watermark)
+            apply_pending(warehouse_dir, watermark)
 
+        # Tell query services that the warehouse changed
+        publish(warehouse_dir, published_tables, watermark if incremental else None)
         logging.info("Load stage completed successfully")
     except Exception as e:
         logging.error(f"Load stage failed: {e}")
@@ -0,0 +1,225 @@
+import contextvars
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+from etl.checkpoint import is_checkpointable, read_checkpoint, read_manifest, remove_checkpoint, write_checkpoint
+from src.helpers.metrics import count_rows, track
+
+
+# --- Stage DAG with fingerprints and checkpoints ---
+# A stage's fingerprint hashes its config slice, the source of the modules it
+# runs, its upstream fingerprints and any extra inputs (e.g. the watermark).
+# Each completed stage leaves an Arrow IPC checkpoint of its output whose
+# manifest records the fingerprint and run id (etl/checkpoint.py). A stage is
+# skipped when its checkpoint has the same fingerprint and its other output
+# files still exist; its output is then read from the checkpoint lazily, only
+# if a downstream stage has to run. Stages whose dependencies are done run
+# concurrently.
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    run: Callable                        # run(inputs: {dep name: output}) -> output
+    deps: tuple = ()
+    config_keys: tuple = ()              # config.yaml sections the stage reads, or "section.key" entries
+    code: tuple = ()                     # module names whose source is part of the fingerprint
+    inputs: Callable = None              # inputs() -> JSON-able value hashed before running
+    outputs: Callable = None             # outputs() -> files besides the checkpoint needed to reuse a run
+    cacheable: bool = True               # False: always run, fingerprint its outputs afterwards
+
+
+def file_fingerprint(paths) -> list:
+    """Name, size and modification time of files (missing files are marked)."""
+    entries = []
+    for path in sorted(Path(p) for p in paths):
+        if path.is_dir():
+            files = sorted(p for p in path.rglob("*") if p.is_file())
+        else:
+            files = [path]
+        for f in files:
+            stat = f.stat() if f.exists() else None
+            entries.append([str(f), stat.st_size if stat else None, stat.st_mtime_ns if stat else None])
+    return entries
+
+
+def code_fingerprint(modules) -> str:
+    """Hash the source of modules given by name, without importing them."""
+    digest = hashlib.sha256()
+    for module in modules:
+        digest.update(Path(importlib.util.find_spec(module).origin).read_bytes())
+    return digest.hexdigest()
+
+
+def config_value(config: dict, key: str):
+    """A config.yaml section, or one entry of it for keys like "paths.raw_data"."""
+    section, _, entry = key.partition(".")
+    value = config.get(section)
+    return (value or {}).get(entry) if entry else value
+
+
+def stage_fingerprint(stage: Stage, config: dict, upstream: dict, extra=None) -> str:
+    payload = {
+        "config": {key: config_value(config, key) for key in stage.config_keys},
+        "code": code_fingerprint(stage.code),
+        "upstream": {dep: upstream[dep] for dep in stage.deps},
+        "inputs": extra,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def read_state(state_path: Path) -> dict:
+    state_path = Path(state_path)
+    if not state_path.exists():
+        return {}
+    with open(state_path, "r") as file:
+        return json.load(file)
+
+
+def write_state(state_path: Path, state: dict):
+    """Persist the run state atomically."""
+    state_path = Path(state_path)
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path.with_suffix(state_path.suffix + ".tmp")
+    with open(tmp_path, "w") as file:
+        json.dump(state, file, indent=2)
+    os.replace(tmp_path, state_path)
+
+
+def select_stages(stages: list, start: str = None, stop: str = None) -> tuple:
+    """
+    The stages from start to stop (inclusive, following dependencies) and the
+    upstream stages whose checkpoints feed them; returns (stages, reused names).
+    Reused stages lose their own dependencies, since they are not run.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for name in (start, stop):
+        if name is not None and name not in by_name:
+            raise ValueError(f"Unknown stage {name!r}, expected one of {list(by_name)}")
+
+    def upstream(name):
+        names = {name}
+        for dep in by_name[name].deps:
+            names |= upstream(dep)
+        return names
+
+    selected = {stage.name for stage in stages}
+    if start is not None:
+        selected = {name for name in selected if start in upstream(name)}
+    if stop is not None:
+        selected &= upstream(stop)
+    reused = {dep for name in selected for dep in by_name[name].deps} - selected
+
+    chosen = []
+    for stage in stages:
+        if stage.name in selected:
+            chosen.append(stage)
+        elif stage.name in reused:
+            chosen.append(replace(stage, deps=()))
+    return chosen, reused
+
+
+def run_dag(
+    stages: list, config: dict, cache_dir: Path, force: bool = False, resume: bool = False,
+    start: str = None, stop: str = None, max_workers: int = 4,
+) -> dict:
+    """
+    Run stages in dependency order and return {stage name: "ran" | "skipped" |
+    "resumed" | "reused"}. Stage outputs are passed to dependents and
+    checkpointed under cache_dir/<stage>. Unchanged stages are skipped; with
+    resume, stages that completed in the previous (failed) run are reused
+    without any checks. start and stop limit the run to a range of stages;
+    the stages feeding start are read from their checkpoints.
+    """
+    cache_dir = Path(cache_dir)
+    stages, reused = select_stages(stages, start, stop)
+    run_state = read_state(cache_dir / "run.json")
+    if not (resume and run_state.get("run_id")):
+        run_state = {"run_id": datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")}
+        write_state(cache_dir / "run.json", run_state)
+    run_id = run_state["run_id"]
+    logging.info(f"Pipeline run {run_id}{' (resumed)' if resume else ''}")
+
+    fingerprints, outputs, status = {}, {}, {}
+    restore_lock = threading.Lock()
+
+    def resolve(name):
+        # Skipped stages are restored once, and only when a dependent runs
+        with restore_lock:
+            if isinstance(outputs[name], _Pending):
+                outputs[name] = read_checkpoint(outputs[name].checkpoint_dir)
+            return outputs[name]
+
+    def skip(stage, fingerprint, stage_status):
+        with track(stage.name) as metrics:
+            metrics["status"] = stage_status
+        return fingerprint, _Pending(cache_dir / stage.name), stage_status
+
+    def execute(stage):
+        checkpoint_dir = cache_dir / stage.name
+        manifest = read_manifest(checkpoint_dir) or {}
+        if stage.name in reused:
+            if not manifest:
+                raise FileNotFoundError(f"Stage {stage.name} has no checkpoint in {checkpoint_dir}; run it first")
+            logging.info(f"Reusing the {stage.name} checkpoint from {manifest['completed_at']}")
+            return skip(stage, manifest["fingerprint"], "reused")
+
+        if resume and manifest.get("run_id") == run_id:
+            logging.info(f"Stage {stage.name} completed in this run at {manifest['completed_at']}, resuming after it")
+            return skip(stage, manifest["fingerprint"], "resumed")
+
+        if stage.cacheable:
+            extra = stage.inputs() if stage.inputs else None
+            fingerprint = stage_fingerprint(stage, config, fingerprints, extra)
+            files = stage.outputs() if stage.outputs else []
+            if not force and manifest.get("fingerprint") == fingerprint and all(Path(f).exists() for f in files):
+                logging.info(f"Stage {stage.name} unchanged since {manifest['completed_at']}, skipping")
+                return skip(stage, fingerprint, "skipped")
+
+        logging.info(f"Running stage {stage.name}...")
+        inputs = {dep: resolve(dep) for dep in stage.deps}
+        counts = [count_rows(value) for value in inputs.values()]
+        with track(stage.name, rows_in=counts[0] if counts else None) as metrics:
+            output = stage.run(inputs)
+            metrics["rows_out"] = count_rows(output)
+            if not stage.cacheable:
+                fingerprint = stage_fingerprint(stage, config, fingerprints, file_fingerprint(stage.outputs()))
+            if is_checkpointable(output):
+                write_checkpoint(checkpoint_dir, output, {"stage": stage.name, "run_id": run_id, "fingerprint": fingerprint})
+            else:
+                remove_checkpoint(checkpoint_dir)  # e.g. a streamed iterator; the stage reruns on resume
+        return fingerprint, output, "ran"
+
+    remaining = list(stages)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while remaining:
+            ready = [s for s in remaining if all(dep in status for dep in s.deps)]
+            if not ready:
+                raise ValueError(f"Stage dependencies cannot be resolved: {[s.name for s in remaining]}")
+
+            futures = {s.name: pool.submit(contextvars.copy_context().run, execute, s) for s in ready}
+            errors = []
+            for name, future in futures.items():
+                try:
+                    fingerprints[name], outputs[name], status[name] = future.result()
+                except Exception as e:
+                    errors.append(e)
+            if errors:
+                raise errors[0]
+            remaining = [s for s in remaining if s.name not in status]
+
+    return status
+
+
+class _Pending:
+    """Output of a skipped stage, read from its checkpoint on first use."""
+
+    def __init__(self, checkpoint_dir: Path):
+        self.checkpoint_dir = checkpoint_dir
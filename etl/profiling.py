@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+
+# --- Single-pass column profiles ---
+# A profile is updated chunk by chunk and two profiles of the same column can
+# be merged, so large files are profiled in bounded memory. Distinct values
+# are counted exactly (set of 64-bit value hashes) or approximately with a
+# HyperLogLog sketch; numeric quantiles come from a bottom-k random sample,
+# which is exact while the column has no more values than the sample size.
+
+HLL_PRECISION = 14  # 2**14 registers, ~0.8% standard error
+SAMPLE_VALUES = 5
+
+
+class ColumnProfile:
+    def __init__(self, approximate: bool = False, sample_size: int = 10000, seed: int = 0):
+        self.approximate = approximate
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(seed)
+        self.dtype = None
+        self.count = 0
+        self.num_missing = 0
+        self.samples = []
+        self.hashes = set()
+        self.registers = np.zeros(2**HLL_PRECISION, dtype=np.uint8)
+        self.numeric = None
+        self.min = None
+        self.max = None
+        self.reservoir = np.empty(0)
+        self.reservoir_keys = np.empty(0)
+
+    def update(self, values: pd.Series):
+        """Add one chunk of the column."""
+        if self.dtype is None:
+            self.dtype = str(values.dtype)
+            self.numeric = pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values)
+
+        present = values.dropna()
+        self.count += len(values)
+        self.num_missing += len(values) - len(present)
+        if present.empty:
+            return self
+
+        if len(self.samples) < SAMPLE_VALUES:
+            self._add_samples(present.unique()[:SAMPLE_VALUES].tolist())
+
+        hashes = pd.util.hash_pandas_object(present, index=False).to_numpy()
+        if self.approximate:
+            _hll_add(self.registers, hashes)
+        else:
+            self.hashes.update(np.unique(hashes).tolist())
+
+        if self.numeric:
+            numbers = present.to_numpy(dtype="float64")
+            self.min = numbers.min() if self.min is None else min(self.min, numbers.min())
+            self.max = numbers.max() if self.max is None else max(self.max, numbers.max())
+            self._add_to_reservoir(numbers, self.rng.random(len(numbers)))
+        return self
+
+    def merge(self, other: "ColumnProfile"):
+        """Fold another profile of the same column into this one."""
+        self.dtype = self.dtype or other.dtype
+        self.numeric = self.numeric if self.numeric is not None else other.numeric
+        self.count += other.count
+        self.num_missing += other.num_missing
+        self._add_samples(other.samples)
+        self.hashes |= other.hashes
+        np.maximum(self.registers, other.registers, out=self.registers)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self._add_to_reservoir(other.reservoir, other.reservoir_keys)
+        return self
+
+    def num_unique(self) -> int:
+        if self.approximate:
+            return _hll_estimate(self.registers)
+        return len(self.hashes)
+
+    def quantiles(self, qs=(0.25, 0.5, 0.75)) -> list:
+        if not len(self.reservoir):
+            return [None] * len(qs)
+        return np.quantile(self.reservoir, qs).tolist()
+
+    def _add_samples(self, values: list):
+        for value in values:
+            if len(self.samples) >= SAMPLE_VALUES:
+                break
+            if value not in self.samples:
+                self.samples.append(value)
+
+    def _add_to_reservoir(self, values: np.ndarray, keys: np.ndarray):
+        """Keep the sample_size values with the smallest random keys (a uniform sample of all values seen)."""
+        values = np.concatenate([self.reservoir, values])
+        keys = np.concatenate([self.reservoir_keys, keys])
+        if len(keys) > self.sample_size:
+            keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+            values, keys = values[keep], keys[keep]
+        self.reservoir, self.reservoir_keys = values, keys
+
+
+def profile_frames(frames, approximate: bool = False, sample_size: int = 10000, profiles: dict = None) -> dict:
+    """
+    Profile every column over an iterable of DataFrame chunks; returns
+    {column: ColumnProfile}. Pass the result back as profiles to continue it.
+    """
+    profiles = {} if profiles is None else profiles
+    for chunk in frames:
+        for i, col in enumerate(chunk.columns):
+            if col not in profiles:
+                profiles[col] = ColumnProfile(approximate, sample_size, seed=i)
+            profiles[col].update(chunk[col])
+    return profiles
+
+
+def profile_report(profiles: dict) -> pd.DataFrame:
+    """One row per column, in the layout of the data profiling report."""
+    rows = []
+    for col, profile in profiles.items():
+        p25, p50, p75 = profile.quantiles()
+        rows.append({
+            "column": col,
+            "dtype": profile.dtype,
+            "num_missing": profile.num_missing,
+            "num_unique": profile.num_unique(),
+            "sample_values": profile.samples,
+            "min": profile.min,
+            "max": profile.max,
+            "p25": p25,
+            "p50": p50,
+            "p75": p75,
+        })
+    return pd.DataFrame(rows)
+
+
+def _hll_add(registers: np.ndarray, hashes: np.ndarray):
+    """Update HyperLogLog registers with 64-bit hashes."""
+    hashes = hashes.astype(np.uint64)
+    index = (hashes >> np.uint64(64 - HLL_PRECISION)).astype(np.intp)
+    rest = hashes & np.uint64((1 << (64 - HLL_PRECISION)) - 1)
+    # Position of the first set bit in the remaining 50 bits (exact in float64)
+    rank = np.full(len(rest), 64 - HLL_PRECISION + 1, dtype=np.uint8)
+    nonzero = rest > 0
+    rank[nonzero] = (64 - HLL_PRECISION) - np.floor(np.log2(rest[nonzero].astype(np.float64))).astype(np.uint8)
+    np.maximum.at(registers, index, rank)
+
+
+def _hll_estimate(registers: np.ndarray) -> int:
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)))
+    zeros = np.count_nonzero(registers == 0)
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * np.log(m / zeros)  # linear counting for small cardinalities
+    return int(round(estimate))
@@ -0,0 +1,270 @@
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+import json
+import logging
+import threading
+import time
+import pandas as pd
+from etl.aggregate import MEASURES, ROLLUPS, build_rollups, read_rollups
+from etl.warehouse import PUBLISH_MARKER, read_publish_marker, read_fact_sales, read_table
+from src.helpers.config import load_config
+
+
+# --- Query service over the warehouse rollups ---
+# The rollups and the customer/product dimensions are loaded once and kept in
+# memory; answers are cached in an LRU cache with a TTL. Every query stats the
+# publish marker that load.main writes last, and a new warehouse version drops
+# the loaded tables and the cache. serve() exposes the same queries over a
+# local HTTP endpoint for dashboards.
+
+PERIODS = {"day": "daily_sales", "month": "monthly_sales"}
+CANCELLATION_GROUPS = {"month": "monthly_sales", "country": "country_sales", "product": "product_sales"}
+
+
+class ResultCache:
+    """Thread-safe LRU cache whose entries expire ttl seconds after they are stored."""
+
+    def __init__(self, max_size: int = 256, ttl: float = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class WarehouseQueries:
+    """
+    Answers dashboard questions from the warehouse written by load.py.
+    Every query returns a DataFrame (a copy of the cached result).
+    """
+
+    def __init__(self, warehouse_dir: Path, paths: dict, cache_size: int = 256, ttl: float = 300):
+        self.warehouse_dir = Path(warehouse_dir)
+        self.paths = paths
+        self.cache = ResultCache(cache_size, ttl)
+        self.tables = None
+        self.version = None
+        self.marker_stat = None
+        self.lock = threading.Lock()
+
+    def revenue_by_period(self, period: str = "month", start: str = None, end: str = None) -> pd.DataFrame:
+        """Revenue, quantity and invoice counts per day or month, optionally between two dates (inclusive)."""
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period {period!r}, expected one of {sorted(PERIODS)}")
+        return self._cached("revenue_by_period", (period, start, end), self._revenue_by_period)
+
+    def revenue_by_country(self) -> pd.DataFrame:
+        return self._cached("revenue_by_country", (), self._revenue_by_country)
+
+    def revenue_by_product(self, limit: int = None) -> pd.DataFrame:
+        """Products by revenue, with their stock code and description."""
+        return self._cached("revenue_by_product", (limit,), self._revenue_by_product)
+
+    def top_customers(self, n: int = 10) -> pd.DataFrame:
+        """The n customers with the highest net revenue, with their customer id and country."""
+        return self._cached("top_customers", (n,), self._top_customers)
+
+    def cancellation_rate(self, by: str = None) -> pd.DataFrame:
+        """Share of invoices that are cancellations, overall or per month, country or product."""
+        if by is not None and by not in CANCELLATION_GROUPS:
+            raise ValueError(f"Unknown grouping {by!r}, expected one of {sorted(CANCELLATION_GROUPS)}")
+        return self._cached("cancellation_rate", (by,), self._cancellation_rate)
+
+    def _cached(self, name: str, args: tuple, compute) -> pd.DataFrame:
+        self._refresh()
+        key = (self.version, name, args)
+        result = self.cache.get(key)
+        if result is None:
+            start = time.perf_counter()
+            result = compute(*args)
+            self.cache.put(key, result)
+            logging.info(f"Query {name}{args} computed in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return result.copy()
+
+    def _refresh(self):
+        """Reload the tables and drop cached results when load has published a new version."""
+        marker_path = self.warehouse_dir / PUBLISH_MARKER
+        stat = marker_path.stat() if marker_path.exists() else None
+        marker_stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size) if stat else None
+        if self.tables is not None and marker_stat == self.marker_stat:
+            return
+        with self.lock:
+            if self.tables is not None and marker_stat == self.marker_stat:
+                return
+            marker = read_publish_marker(self.warehouse_dir)
+            self.tables = self._load_tables()
+            self.version = marker["version"] if marker else None
+            self.marker_stat = marker_stat
+            self.cache.clear()
+            logging.info(f"Query service loaded warehouse version {self.version}")
+
+    def _load_tables(self) -> dict:
+        dim_customers = read_table(self.warehouse_dir, self.paths["dim_customers"])
+        dim_products = read_table(self.warehouse_dir, self.paths["dim_products"])
+        rollups = read_rollups(self.warehouse_dir / self.paths.get("rollups", "rollups"))
+        if len(rollups) < len(ROLLUPS):
+            # Warehouses loaded before rollups existed: aggregate fact_sales once
+            fact_sales = read_fact_sales(
+                self.warehouse_dir, self.paths["fact_sales"],
+                columns=["date_key", "customer_key", "product_key", "invoice_no", "quantity", "unit_price", "sign"],
+            )
+            rollups = build_rollups(fact_sales, dim_customers)
+        return {**rollups, "dim_customers": dim_customers, "dim_products": dim_products}
+
+    def _revenue_by_country(self) -> pd.DataFrame:
+        return self.tables["country_sales"].sort_values("revenue", ascending=False, kind="stable").reset_index(drop=True)
+
+    def _revenue_by_period(self, period: str, start: str, end: str) -> pd.DataFrame:
+        rollup = self.tables[PERIODS[period]]
+        if period == "day":
+            keys = rollup["date_key"]
+            bounds = [_date_key(value, "%Y%m%d") for value in (start, end)]
+        else:
+            keys = rollup["year"].astype("int32") * 100 + rollup["month"]
+            bounds = [_date_key(value, "%Y%m") for value in (start, end)]
+        mask = pd.Series(True, index=rollup.index)
+        if bounds[0] is not None:
+            mask &= keys >= bounds[0]
+        if bounds[1] is not None:
+            mask &= keys <= bounds[1]
+        return rollup[mask].reset_index(drop=True)
+
+    def _revenue_by_product(self, limit: int) -> pd.DataFrame:
+        products = self._per_natural_key("product_sales", "dim_products", "product_key", "stock_code", "description")
+        return products.sort_values("revenue", ascending=False, kind="stable").reset_index(drop=True).head(limit)
+
+    def _top_customers(self, n: int) -> pd.DataFrame:
+        customers = self._per_natural_key("customer_sales", "dim_customers", "customer_key", "customer_id", "country")
+        return customers.nlargest(n, "revenue").reset_index(drop=True)
+
+    def _per_natural_key(self, rollup: str, dim: str, key: str, natural_key: str, attribute: str) -> pd.DataFrame:
+        """
+        Add up a rollup keyed by dimension versions per natural key, with the
+        attribute of the current version. An invoice's lines share one time and
+        so one version, which keeps the invoice counts exact.
+        """
+        rollup, dim = self.tables[rollup], self.tables[dim]
+        natural_keys = dim[natural_key].to_numpy()[pd.Index(dim[key]).get_indexer(rollup[key])]
+        totals = rollup[MEASURES].groupby(pd.Index(natural_keys, name=natural_key), sort=True).sum()
+        current = dim[dim["is_current"]] if "is_current" in dim.columns else dim
+        totals.insert(0, attribute, current.set_index(natural_key)[attribute].reindex(totals.index).to_numpy())
+        return totals.reset_index()
+
+    def _cancellation_rate(self, by: str) -> pd.DataFrame:
+        counts_columns = ["invoices", "cancelled_invoices"]
+        if by is None:
+            # Every invoice has one date, so the monthly counts add up to the totals
+            counts = self.tables["monthly_sales"][counts_columns].sum().to_frame().T
+        elif by == "product":
+            counts = self._per_natural_key("product_sales", "dim_products", "product_key", "stock_code", "description")
+        else:
+            counts = self.tables[CANCELLATION_GROUPS[by]]
+            counts = counts[ROLLUPS[CANCELLATION_GROUPS[by]] + counts_columns].copy()
+        total = counts["invoices"] + counts["cancelled_invoices"]
+        counts["cancellation_rate"] = (counts["cancelled_invoices"] / total.where(total > 0)).fillna(0.0)
+        return counts.reset_index(drop=True)
+
+
+def _date_key(value: str, fmt: str):
+    """'2011-05-01' → 20110501 (fmt %Y%m%d) or 201105 (fmt %Y%m); None stays None."""
+    return None if value is None else int(pd.Timestamp(value).strftime(fmt))
+
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+def make_handler(queries: WarehouseQueries):
+    """HTTP handler answering GET /<query>?<args> with JSON records."""
+    routes = {
+        "/revenue": lambda q: queries.revenue_by_period(q.get("period", "month"), q.get("start"), q.get("end")),
+        "/revenue/country": lambda q: queries.revenue_by_country(),
+        "/revenue/product": lambda q: queries.revenue_by_product(int(q["limit"]) if "limit" in q else None),
+        "/customers/top": lambda q: queries.top_customers(int(q.get("n", 10))),
+        "/cancellation-rate": lambda q: queries.cancellation_rate(q.get("by")),
+    }
+
+    class QueryHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            if url.path not in routes:
+                return self._send(404, {"error": f"Unknown query {url.path}", "queries": sorted(routes)})
+            try:
+                result = routes[url.path](params)
+            except (ValueError, KeyError) as e:
+                return self._send(400, {"error": str(e)})
+            except Exception as e:
+                logging.error(f"Query {self.path} failed: {e}")
+                return self._send(500, {"error": str(e)})
+            self._send(200, result.to_dict(orient="records"))
+
+        def _send(self, status: int, payload):
+            body = json.dumps(payload, default=_json_default).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.info(f"Query service: {format % args}")
+
+    return QueryHandler
+
+
+def serve(queries: WarehouseQueries, host: str = "127.0.0.1", port: int = 8050) -> ThreadingHTTPServer:
+    """Create the local HTTP endpoint; call serve_forever() on the result to start answering."""
+    server = ThreadingHTTPServer((host, port), make_handler(queries))
+    logging.info(f"Query service listening on http://{host}:{server.server_port}")
+    return server
+
+
+def from_config(config: dict) -> WarehouseQueries:
+    options = config.get("query_service", {})
+    return WarehouseQueries(
+        config["paths"]["warehouse"], config["paths"],
+        cache_size=options.get("cache_size", 256), ttl=options.get("ttl_seconds", 300),
+    )
+
+
+def main(config: dict = None, host: str = None, port: int = None):
+    """Serve the query endpoint until interrupted (host and port default to query_service)."""
+    config = load_config() if config is None else config
+    options = config.get("query_service", {})
+    server = serve(from_config(config), host or options.get("host", "127.0.0.1"), port or options.get("port", 8050))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+import logging
+import numpy as np
+import pandas as pd
+
+
+# --- Type-2 slowly-changing dimensions ---
+# A version is a run of a natural key's rows with the same attributes, valid
+# from its first transaction until the next version starts (valid_to is
+# exclusive and empty for the current version). Changes are found by
+# comparing a per-row hash of the attribute columns: within a batch between
+# consecutive rows of a key, and across batches against a hash index that
+# holds only the current version of every key.
+
+
+def attribute_hash(df: pd.DataFrame, attributes: list) -> np.ndarray:
+    """One uint64 hash per row over the attribute columns, compared as their string form."""
+    hashes = np.zeros(len(df), dtype=np.uint64)
+    for col in attributes:
+        codes, text = _factorize_text(df[col])
+        hashes = hashes * np.uint64(1000003) ^ pd.util.hash_array(text)[codes]
+    return hashes
+
+
+def _factorize_text(values: pd.Series) -> tuple:
+    """Integer codes and the distinct values as strings (missing values included), without per-row conversion."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return codes, np.asarray(pd.Index(uniques).astype(str), dtype=object)
+
+
+def build_versions(rows: pd.DataFrame, natural_key: str, attributes: list, time_column: str) -> pd.DataFrame:
+    """
+    Collapse rows into versions: natural key, attributes (as strings),
+    valid_from, valid_to, is_current and attr_hash, sorted by natural key and
+    valid_from. When one key has several rows at the same time, the last one
+    counts.
+    """
+    key_codes, key_text = _factorize_text(rows[natural_key])
+    key_rank = np.empty(len(key_text), dtype=np.int64)
+    key_rank[np.argsort(key_text, kind="stable")] = np.arange(len(key_text))
+    keys = key_rank[key_codes]
+    times = rows[time_column].to_numpy(dtype="datetime64[ns]")
+    order = np.lexsort((np.arange(len(rows)), times, keys))
+    keys, times = keys[order], times[order]
+
+    hashes = attribute_hash(rows, attributes)[order]
+    last_at_time = np.ones(len(order), dtype=bool)
+    last_at_time[:-1] = (keys[1:] != keys[:-1]) | (times[1:] != times[:-1])
+    order, keys, times, hashes = order[last_at_time], keys[last_at_time], times[last_at_time], hashes[last_at_time]
+
+    starts = np.ones(len(order), dtype=bool)
+    starts[1:] = (keys[1:] != keys[:-1]) | (hashes[1:] != hashes[:-1])
+    rows_at = order[starts]
+    versions = pd.DataFrame({natural_key: key_text[key_codes[rows_at]]})
+    for col in attributes:
+        codes, text = _factorize_text(rows[col])
+        versions[col] = text[codes[rows_at]]
+    versions["valid_from"] = times[starts]
+    versions["attr_hash"] = hashes[starts]
+    return close_versions(versions, natural_key)
+
+
+def close_versions(versions: pd.DataFrame, natural_key: str) -> pd.DataFrame:
+    """Set valid_to to the next version's valid_from of the same key; the last version is current."""
+    keys = versions[natural_key].to_numpy()
+    valid_from = versions["valid_from"].to_numpy(dtype="datetime64[ns]")
+    has_next = np.zeros(len(versions), dtype=bool)
+    has_next[:-1] = keys[1:] == keys[:-1]
+    valid_to = np.full(len(versions), np.datetime64("NaT"), dtype="datetime64[ns]")
+    valid_to[:-1][has_next[:-1]] = valid_from[1:][has_next[:-1]]
+    return versions.assign(valid_to=valid_to, is_current=~has_next)
+
+
+def hash_index(dim: pd.DataFrame, key: str, natural_key: str, attributes: list) -> pd.DataFrame:
+    """The hash index of a dimension: natural key, surrogate key and attr_hash of each current version."""
+    current = dim[dim["is_current"]]
+    return pd.DataFrame({
+        natural_key: current[natural_key].to_numpy(),
+        key: current[key].to_numpy(),
+        "attr_hash": attribute_hash(current, attributes),
+    })
+
+
+def apply_versions(
+    dim: pd.DataFrame, index: pd.DataFrame, batch: pd.DataFrame, key: str, natural_key: str, attributes: list
+):
+    """
+    Add a batch's versions (from build_versions) to a dimension. Only keys
+    whose first batch version differs from the hash index, or that are new,
+    get new versions after the current maximum surrogate key; the versions
+    they replace are closed. A changed first version starting at the same
+    time as the current one replaces its attributes in place instead, so no
+    zero-length version is written. Returns the updated dimension and hash
+    index.
+    """
+    batch = batch.reset_index(drop=True)
+    keys = batch[natural_key].to_numpy()
+    first = np.ones(len(batch), dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+
+    pos = pd.Index(index[natural_key]).get_indexer(keys)
+    known = first & (pos >= 0)
+    same_hash = np.zeros(len(batch), dtype=bool)
+    same_hash[known] = index["attr_hash"].to_numpy()[pos[known]] == batch["attr_hash"].to_numpy()[known]
+    unchanged = known & same_hash
+
+    # Changed keys whose first batch version starts when their current version does
+    current_pos = np.full(len(batch), -1)
+    current_pos[known] = pd.Index(dim[key]).get_indexer(index[key].to_numpy()[pos[known]])
+    same_start = np.zeros(len(batch), dtype=bool)
+    same_start[known] = (
+        dim["valid_from"].to_numpy(dtype="datetime64[ns]")[current_pos[known]]
+        == batch["valid_from"].to_numpy(dtype="datetime64[ns]")[known]
+    )
+    in_place = known & ~same_hash & same_start
+    if in_place.any():
+        dim = dim.copy()
+        rows = dim.index[current_pos[in_place]]
+        for col in attributes:
+            dim.loc[rows, col] = batch.loc[in_place, col].to_numpy()
+        index = index.copy()
+        index.loc[index.index[pos[in_place]], "attr_hash"] = batch.loc[in_place, "attr_hash"].to_numpy()
+        logging.info(f"{natural_key}: {int(in_place.sum()):,} current versions updated in place")
+
+    new_versions = batch[~(unchanged | in_place)].copy()
+    if new_versions.empty:
+        if not in_place.any():
+            logging.info(f"{natural_key}: no changed attributes in this batch")
+        return dim, index
+
+    next_key = int(dim[key].max()) + 1 if len(dim) else 1
+    new_versions.insert(0, key, np.arange(next_key, next_key + len(new_versions), dtype="int32"))
+
+    # Close the current versions of keys that changed
+    new_keys = new_versions.drop_duplicates(natural_key)
+    index_pos = pd.Index(index[natural_key]).get_indexer(new_keys[natural_key])
+    replaced = index_pos >= 0
+    replaced_keys = index[key].to_numpy()[index_pos[replaced]]
+    dim = dim.copy()
+    dim_pos = pd.Index(dim[key]).get_indexer(replaced_keys)
+    dim.loc[dim.index[dim_pos], "valid_to"] = new_keys["valid_from"].to_numpy()[replaced]
+    dim.loc[dim.index[dim_pos], "is_current"] = False
+
+    columns = list(dim.columns)
+    dim = pd.concat([dim, new_versions[columns]], ignore_index=True)
+    dim[key] = dim[key].astype("int32")
+
+    latest = new_versions.drop_duplicates(natural_key, keep="last")
+    index = pd.concat([
+        index[~index[natural_key].isin(latest[natural_key])],
+        latest[[natural_key, key, "attr_hash"]],
+    ], ignore_index=True)
+
+    logging.info(
+        f"{natural_key}: {len(new_versions):,} new versions, {int(replaced.sum()):,} keys changed, "
+        f"{int((~replaced).sum()):,} new keys"
+    )
+    return dim, index
+
+
+def version_keys(natural_keys: pd.Series, times, dim: pd.DataFrame, key: str, natural_key: str) -> np.ndarray:
+    """
+    Surrogate key of the version valid at each time (an as-of join on
+    valid_from by natural key). Times before a key's first version get
+    that first version.
+    """
+    key_index = pd.Index(dim[natural_key].astype(str).unique())
+    codes, text = _factorize_text(pd.Series(natural_keys))
+    key_ids = key_index.get_indexer(text)[codes]
+    if (key_ids < 0).any():
+        raise ValueError(f"Rows reference {natural_key} values missing from the dimension")
+
+    lookup = pd.DataFrame({
+        "key_id": key_ids,
+        "time": np.asarray(times, dtype="datetime64[ns]"),
+        "row": np.arange(len(key_ids)),
+    }).sort_values("time", kind="stable")
+    versions = pd.DataFrame({
+        "key_id": key_index.get_indexer(dim[natural_key].astype(str)),
+        "valid_from": dim["valid_from"].to_numpy(dtype="datetime64[ns]"),
+        key: dim[key].to_numpy(),
+    }).sort_values("valid_from", kind="stable")
+
+    matched = pd.merge_asof(
+        lookup, versions, left_on="time", right_on="valid_from", by="key_id", direction="backward"
+    )
+    missing = matched[key].isna().to_numpy()
+    if missing.any():
+        earliest = versions.drop_duplicates("key_id").set_index("key_id")[key]
+        matched.loc[missing, key] = matched.loc[missing, "key_id"].map(earliest).to_numpy()
+
+    result = np.empty(len(lookup), dtype="int32")
+    result[matched["row"].to_numpy()] = matched[key].to_numpy(dtype="int32")
+    return result
@@ -0,0 +1,112 @@
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+
+# --- Column types shared by every stage that reads pipeline CSV files ---
+# Warehouse column names from db/schema.sql are noted next to each column.
+# Low-cardinality text columns are categorical, free text is Arrow-backed.
+
+# Raw export as saved by extract.py (InvoiceDate is parsed during cleaning)
+RAW_DTYPES = {
+    "InvoiceNo": "string[pyarrow]",     # invoice_no VARCHAR(10)
+    "StockCode": "category",            # dim_products.stock_code
+    "Description": "string[pyarrow]",   # dim_products.description
+    "Quantity": "int32",                # quantity INT
+    "InvoiceDate": "string[pyarrow]",   # transaction_datetime TIMESTAMP
+    "UnitPrice": "float64",             # unit_price DECIMAL(10,2)
+    "CustomerID": "float32",            # dim_customers.customer_id (5 digits, exact in float32)
+    "Country": "category",              # dim_customers.country
+}
+
+# Transactions, cancellations and outliers as written by transform.py
+PROCESSED_DTYPES = {
+    **RAW_DTYPES,
+    "CustomerID": "string[pyarrow]",
+}
+PROCESSED_DATE_COLUMNS = ["InvoiceDate"]
+
+# InvoiceDate as written in the UCI export, e.g. "12/1/2010 8:26"
+RAW_DATE_FORMAT = "%m/%d/%Y %H:%M"
+# pandas' default na_values, so the streaming reader finds the same missing values as read_csv
+_NA_VALUES = [
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+]
+_ARROW_TYPES = {"string[pyarrow]": pa.string(), "int32": pa.int32(), "float32": pa.float32(), "float64": pa.float64()}
+
+
+def read_raw_csv(path: Path, chunksize: int = None, since=None):
+    """
+    Read the raw export with the shared schema. Uses the multithreaded pyarrow
+    parser, or the C parser when a chunked reader is requested. With since
+    (a timestamp), rows dated before it are dropped while the file is read.
+    """
+    if chunksize:
+        return pd.read_csv(path, dtype=RAW_DTYPES, chunksize=chunksize)
+    if since is not None:
+        return _read_raw_csv_since(path, pd.Timestamp(since))
+    return _read_csv_pyarrow(path, RAW_DTYPES)
+
+
+def read_processed_csv(path: Path) -> pd.DataFrame:
+    """Read a transform output CSV with the shared schema."""
+    dtypes = {col: dtype for col, dtype in PROCESSED_DTYPES.items() if col not in PROCESSED_DATE_COLUMNS}
+    return _read_csv_pyarrow(path, dtypes, parse_dates=PROCESSED_DATE_COLUMNS)
+
+
+def _read_csv_pyarrow(path: Path, dtypes: dict, **kwargs) -> pd.DataFrame:
+    """
+    Read with the pyarrow parser. Categorical columns are parsed as strings
+    first, otherwise pyarrow infers numeric categories for codes like StockCode.
+    """
+    categorical = [col for col, dtype in dtypes.items() if dtype == "category"]
+    parse_dtypes = {col: "string[pyarrow]" if col in categorical else dtype for col, dtype in dtypes.items()}
+    df = pd.read_csv(path, dtype=parse_dtypes, engine="pyarrow", **kwargs)
+    return df.astype({col: "category" for col in categorical if col in df.columns})
+
+
+def _read_raw_csv_since(path: Path, since: pd.Timestamp) -> pd.DataFrame:
+    """
+    Stream the raw CSV in Arrow record batches and keep only rows dated at or
+    after since, plus rows whose date is not in RAW_DATE_FORMAT (cleaning
+    decides on those). Only the kept rows are converted to pandas; the file
+    itself is still scanned, as a CSV has no index to seek by date.
+    """
+    categorical = [col for col, dtype in RAW_DTYPES.items() if dtype == "category"]
+    column_types = {col: _ARROW_TYPES.get(dtype, pa.string()) for col, dtype in RAW_DTYPES.items()}
+    reader = pacsv.open_csv(path, convert_options=pacsv.ConvertOptions(column_types=column_types, null_values=_NA_VALUES, strings_can_be_null=True))
+    since = pa.scalar(since.as_unit("ns").to_pydatetime(), pa.timestamp("ns"))
+
+    batches = []
+    for batch in reader:
+        dates = pc.strptime(batch.column("InvoiceDate"), format=RAW_DATE_FORMAT, unit="ns", error_is_null=True)
+        batches.append(batch.filter(pc.or_kleene(pc.is_null(dates), pc.greater_equal(dates, since))))
+    df = pa.Table.from_batches(batches, schema=reader.schema).to_pandas(
+        types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get
+    )
+    return df.astype({col: "category" for col in categorical if col in df.columns})
+
+
+def conform_raw(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast a raw frame from any source (Parquet, Excel, ...) to RAW_DTYPES.
+    Categorical and text columns go through strings so codes like StockCode
+    keep their text form. Dates become text in RAW_DATE_FORMAT, like the raw
+    CSV, so every source parses the same way during cleaning.
+    """
+    casts = {}
+    for col, dtype in RAW_DTYPES.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            casts[col] = df[col].dt.strftime(RAW_DATE_FORMAT).astype(dtype)
+        elif dtype in ("category", "string[pyarrow]"):
+            casts[col] = df[col].astype("string[pyarrow]")
+            if dtype == "category":
+                casts[col] = casts[col].astype("category")
+        else:
+            casts[col] = df[col].astype(dtype)
+    return df.assign(**casts)
@@ -0,0 +1,83 @@
+import glob
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pandas as pd
+from etl.schema import conform_raw, read_raw_csv
+
+
+# --- Readers for bulk local exports ---
+# Each reader returns one file as a DataFrame; add an entry to READERS to
+# support another format.
+
+def read_csv_file(path: Path) -> pd.DataFrame:
+    return read_raw_csv(path)
+
+
+def read_parquet_file(path: Path) -> pd.DataFrame:
+    return pd.read_parquet(path)
+
+
+def read_excel_file(path: Path) -> pd.DataFrame:
+    try:
+        return pd.read_excel(path, engine="openpyxl")
+    except ImportError as e:
+        raise ImportError("Reading .xlsx exports requires openpyxl (pip install openpyxl)") from e
+
+
+READERS = {
+    ".csv": read_csv_file,
+    ".parquet": read_parquet_file,
+    ".xlsx": read_excel_file,
+}
+
+
+def list_source_files(pattern) -> list:
+    """Files matching a directory (all supported files inside it) or a glob pattern, sorted by name."""
+    pattern = Path(pattern)
+    if pattern.is_dir():
+        files = [p for p in pattern.iterdir() if p.suffix.lower() in READERS]
+    else:
+        files = [Path(p) for p in glob.glob(str(pattern), recursive=True)]
+        unsupported = [p for p in files if p.suffix.lower() not in READERS]
+        if unsupported:
+            raise ValueError(f"Unsupported source file types: {[str(p) for p in unsupported]}")
+    if not files:
+        raise FileNotFoundError(f"No source files found for {pattern}")
+    return sorted(files)
+
+
+def read_source_file(path: Path) -> pd.DataFrame:
+    """Read one export with the reader for its extension and cast it to the raw schema."""
+    df = READERS[path.suffix.lower()](path)
+    df.columns = df.columns.str.strip()
+    return conform_raw(df)
+
+
+def iter_source_frames(pattern, max_workers: int = 8):
+    """
+    Yield the files matching pattern as DataFrames, in file name order.
+    Files are read on a thread pool, at most max_workers ahead of the
+    consumer, so memory stays bounded when the frames are streamed.
+    """
+    files = list_source_files(pattern)
+    logging.info(f"Reading {len(files):,} source files from {pattern} with {max_workers} workers")
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque()
+        for path in files:
+            pending.append((path, pool.submit(read_source_file, path)))
+            if len(pending) >= max_workers:
+                yield _result(*pending.popleft())
+        while pending:
+            yield _result(*pending.popleft())
+
+
+def _result(path: Path, future) -> pd.DataFrame:
+    try:
+        df = future.result()
+    except Exception as e:
+        logging.error(f"Failed to read source file {path}: {e}")
+        raise
+    logging.info(f"Read {len(df):,} rows from {path.name}")
+    return df
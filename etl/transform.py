@@ -1,51 +1,27 @@
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-import yaml
 from pathlib import Path
-
-
-# --- 1️⃣ Load config file ---
-def load_config(config_path: Path = Path(__file__).resolve().parents[1] / "config.yaml") -> dict:
-    """Load pipeline configuration from YAML file."""
-    try:
-        with open(config_path, "r") as file:
-            config = yaml.safe_load(file)
-        logging.info(f"Configuration loaded from {config_path}")
-        return config
-    except Exception as e:
-        logging.error(f"Failed to load config file: {e}")
-        raise
-
-
-# --- 2️⃣ Load and clean data ---
-def load_and_clean_data(path: Path) -> pd.DataFrame:
-    """Load raw dataset and perform initial cleaning."""
+from etl.schema import PROCESSED_DTYPES, read_raw_csv
+from etl.watermark import after_watermark, read_incremental_watermark
+from src.helpers.config import load_config
+from src.helpers.metrics import disable_metrics, instrumented, record_bytes_written
+
+
+# --- 1️⃣ Load and clean data ---
+@instrumented()
+def load_and_clean_data(path: Path, watermark: dict = None) -> pd.DataFrame:
+    """
+    Load raw dataset and perform initial cleaning. With a watermark, rows
+    dated before it are skipped while the file is read.
+    """
     try:
-        df = pd.read_csv(path, dtype={"InvoiceNo": str})
+        df = read_raw_csv(path, since=watermark["InvoiceDate"] if watermark else None)
         logging.info(f"Loaded raw dataset: {len(df):,} records")
 
-        df = df.drop_duplicates()
-        df.columns = df.columns.str.strip()
-
-        # Remove missing key fields
-        df = df[df["Description"].notna()]
-        df = df[df["CustomerID"].notna()]
-        df = df[df["Country"].notna()]
-        df = df[df["StockCode"].notna()]
-
-        # Convert and validate date field
-        df["InvoiceDate"] = pd.to_datetime(df["InvoiceDate"], errors="coerce")
-        df = df[df["InvoiceDate"].notna()]
-
-        # Convert CustomerID to string (after coercion)
-        df["CustomerID"] = df["CustomerID"].astype(int).astype(str)
-
-        # Keep only valid formats
-        df = df[df["InvoiceNo"].str.match(r"^C?\d{6}$", na=False)]
-        df = df[df["StockCode"].astype(str).str.match(r"^\d{5}$", na=False)]
-        df = df[df["Description"].str.contains(r"[a-zA-Z]", na=False)]
-        df = df[df["CustomerID"].astype(str).str.match(r"^\d{5}$", na=False)]
-
+        df = clean_data(df, watermark=watermark)
         logging.info(f"After cleaning: {len(df):,} records remaining")
         return df
 
@@ -54,7 +30,88 @@ def load_and_clean_data(path: Path) -> pd.DataFrame:
         raise
 
 
-# --- 3️⃣ Filter invalid UnitPrices ---
+def clean_data(df: pd.DataFrame, deduplicate: bool = True, watermark: dict = None) -> pd.DataFrame:
+    """
+    Drop duplicates, rows with missing key fields and rows with invalid formats.
+    When a watermark is given, rows already loaded into the warehouse are dropped
+    before the validity rules run.
+    """
+    if deduplicate:
+        df = df.drop_duplicates()
+    df.columns = df.columns.str.strip()
+
+    invoice_dates = pd.to_datetime(df["InvoiceDate"], errors="coerce")
+    if watermark:
+        new_rows = after_watermark(invoice_dates, df["InvoiceNo"], watermark)
+        logging.info(f"Skipping {int((~new_rows).sum()):,} rows at or before the watermark")
+        df, invoice_dates = df[new_rows], invoice_dates[new_rows]
+
+    customer_ids = np.trunc(pd.to_numeric(df["CustomerID"], errors="coerce"))
+
+    mask, rejections = build_validity_mask(df, invoice_dates, customer_ids)
+    rejected = ", ".join(f"{rule}={count:,}" for rule, count in rejections.items() if count)
+    logging.info(f"Rows rejected per rule: {rejected or 'none'}")
+
+    # Filter once, then convert CustomerID to string (after coercion)
+    return df[mask].assign(
+        InvoiceDate=invoice_dates[mask],
+        CustomerID=customer_ids[mask].astype("int32").astype(PROCESSED_DTYPES["CustomerID"]),
+    )
+
+
+def build_validity_mask(df: pd.DataFrame, invoice_dates: pd.Series, customer_ids: pd.Series):
+    """
+    Combine all row validity rules into a single boolean mask.
+    Returns the mask and the number of rows failing each rule (a row can fail several).
+    """
+    rules = {
+        "missing_description": df["Description"].notna(),
+        "missing_customer_id": df["CustomerID"].notna(),
+        "missing_country": df["Country"].notna(),
+        "missing_stock_code": df["StockCode"].notna(),
+        "invalid_invoice_date": invoice_dates.notna(),
+        "invalid_invoice_no": _check_distinct_values(df["InvoiceNo"], _is_invoice_no),
+        "invalid_stock_code": _check_distinct_values(df["StockCode"], _is_stock_code),
+        "description_without_letters": _check_distinct_values(df["Description"], _has_letter),
+        # 5-digit CustomerID, checked on the number instead of its string form
+        "invalid_customer_id": customer_ids.between(10000, 99999),
+    }
+
+    mask = np.ones(len(df), dtype=bool)
+    rejections = {}
+    for rule, valid in rules.items():
+        valid = np.asarray(valid, dtype=bool)
+        rejections[rule] = int(len(valid) - valid.sum())
+        mask &= valid
+    return mask, rejections
+
+
+def _check_distinct_values(series: pd.Series, check) -> np.ndarray:
+    """Evaluate a string check once per distinct value and broadcast the result to every row."""
+    codes, uniques = pd.factorize(series)
+    valid = np.asarray(check(pd.Series(uniques).astype(str)), dtype=bool)
+    # Missing values get code -1, which picks the trailing False
+    return np.append(valid, False)[codes]
+
+
+def _is_invoice_no(values: pd.Series) -> pd.Series:
+    """6 digits, optionally prefixed with C."""
+    digits = values.str.removeprefix("C")
+    return digits.str.len().eq(6) & digits.str.isdecimal()
+
+
+def _is_stock_code(values: pd.Series) -> pd.Series:
+    """Exactly 5 digits."""
+    return values.str.len().eq(5) & values.str.isdecimal()
+
+
+def _has_letter(values: pd.Series) -> pd.Series:
+    """Contains at least one ASCII letter."""
+    return values.str.contains(r"[a-zA-Z]")
+
+
+# --- 2️⃣ Filter invalid UnitPrices ---
+@instrumented()
 def filter_invalid_prices(df: pd.DataFrame) -> pd.DataFrame:
     """Remove rows where UnitPrice <= 0."""
     try:
@@ -68,7 +125,8 @@ def filter_invalid_prices(df: pd.DataFrame) -> pd.DataFrame:
         raise
 
 
-# --- 4️⃣ Split transactions vs cancellations ---
+# --- 3️⃣ Split transactions vs cancellations ---
+@instrumented()
 def split_transactions(df: pd.DataFrame):
     """Split dataset into transactions and cancellations."""
     try:
@@ -81,7 +139,8 @@ def split_transactions(df: pd.DataFrame):
         raise
 
 
-# --- 5️⃣ Filter invalid Quantities ---
+# --- 4️⃣ Filter invalid Quantities ---
+@instrumented()
 def filter_invalid_quantities(df: pd.DataFrame) -> pd.DataFrame:
     """Remove transactions with Quantity <= 0."""
     try:
@@ -95,30 +154,80 @@ def filter_invalid_quantities(df: pd.DataFrame) -> pd.DataFrame:
         raise
 
 
-# --- 6️⃣ Detect outliers ---
-def detect_outliers(df: pd.DataFrame, qty_threshold: int, price_threshold: float):
-    """Identify and separate outliers based on thresholds."""
-    try:
-        qty_outliers = df[df["Quantity"] > qty_threshold]
-        price_outliers = df[df["UnitPrice"] > price_threshold]
-        outliers = pd.concat([qty_outliers, price_outliers]).drop_duplicates()
+# --- 5️⃣ Detect outliers ---
+OUTLIER_METHODS = ("iqr", "mad", "zscore")
 
-        logging.info(f"Detected {len(outliers):,} outliers")
 
-        df_clean = df[~df.index.isin(outliers.index)].copy()
-        return df_clean, outliers
+@instrumented()
+def detect_outliers(df: pd.DataFrame, qty_threshold: int, price_threshold: float, rules: list = None):
+    """
+    Identify and separate outliers: rows above the global quantity/price
+    thresholds, plus rows flagged by any per-group rule (see rule_outlier_mask).
+    """
+    try:
+        mask = (df["Quantity"] > qty_threshold).to_numpy() | (df["UnitPrice"] > price_threshold).to_numpy()
+        logging.info(f"Rows above global thresholds: {int(mask.sum()):,}")
+
+        for rule in rules or []:
+            flagged = rule_outlier_mask(df, rule)
+            logging.info(
+                f"Rows flagged by {rule.get('method', 'iqr')} on {rule['column']} "
+                f"per {rule.get('group_by') or 'dataset'}: {int(flagged.sum()):,}"
+            )
+            mask |= flagged
+
+        outliers = df[mask]
+        logging.info(f"Detected {len(outliers):,} outliers")
+        return df[~mask], outliers
     except Exception as e:
         logging.error(f"Error detecting outliers: {e}")
         raise
 
 
-# --- 7️⃣ Save outputs ---
+def rule_outlier_mask(df: pd.DataFrame, rule: dict) -> np.ndarray:
+    """
+    Boolean mask of rows whose rule["column"] is far from its group's centre:
+      - iqr:    outside [Q1 - factor * IQR, Q3 + factor * IQR]
+      - mad:    |x - median| > factor * 1.4826 * MAD
+      - zscore: |x - mean| > factor * std
+    Groups are rule["group_by"] values (the whole frame if not set). Groups
+    smaller than min_group_size or with zero spread are never flagged.
+    """
+    method = rule.get("method", "iqr")
+    if method not in OUTLIER_METHODS:
+        raise ValueError(f"Unknown outlier method '{method}', expected one of {OUTLIER_METHODS}")
+    factor = rule.get("factor", 3.0)
+
+    values = df[rule["column"]].astype("float64")
+    keys = df[rule["group_by"]] if rule.get("group_by") else np.zeros(len(df), dtype="int8")
+    grouped = values.groupby(keys, observed=True, sort=False)
+
+    if method == "iqr":
+        q1, q3 = grouped.transform("quantile", 0.25), grouped.transform("quantile", 0.75)
+        spread = q3 - q1
+        flagged = (values < q1 - factor * spread) | (values > q3 + factor * spread)
+    elif method == "mad":
+        median = grouped.transform("median")
+        deviation = (values - median).abs()
+        spread = 1.4826 * deviation.groupby(keys, observed=True, sort=False).transform("median")
+        flagged = deviation > factor * spread
+    else:
+        spread = grouped.transform("std")
+        flagged = (values - grouped.transform("mean")).abs() > factor * spread
+
+    large_enough = grouped.transform("size") >= rule.get("min_group_size", 10)
+    return (flagged & (spread > 0) & large_enough).to_numpy()
+
+
+# --- 6️⃣ Save outputs ---
+@instrumented()
 def save_datasets(transactions, cancellations, outliers, paths):
     """Save transformed datasets to CSV files."""
     try:
         transactions.to_csv(paths["transactions"], index=False)
         cancellations.to_csv(paths["cancellations"], index=False)
         outliers.to_csv(paths["outliers"], index=False)
+        record_bytes_written(sum(Path(paths[name]).stat().st_size for name in ["transactions", "cancellations", "outliers"]))
 
         logging.info(f"Saved transactions → {paths['transactions']}")
         logging.info(f"Saved cancellations → {paths['cancellations']}")
@@ -128,25 +237,226 @@ def save_datasets(transactions, cancellations, outliers, paths):
         raise
 
 
-# --- 8️⃣ Orchestrate transform ---
-def main():
+def append_datasets(transactions, cancellations, outliers, paths, first_chunk: bool):
+    """Append one chunk of transformed data to the CSV files (truncating them on the first chunk)."""
     try:
-        config = load_config()
-        paths = config["paths"]
-        thresholds = config["outlier_thresholds"]
+        mode = "w" if first_chunk else "a"
+        names = ["transactions", "cancellations", "outliers"]
+        sizes_before = 0 if first_chunk else sum(Path(paths[name]).stat().st_size for name in names)
+        transactions.to_csv(paths["transactions"], mode=mode, header=first_chunk, index=False)
+        cancellations.to_csv(paths["cancellations"], mode=mode, header=first_chunk, index=False)
+        outliers.to_csv(paths["outliers"], mode=mode, header=first_chunk, index=False)
+        record_bytes_written(sum(Path(paths[name]).stat().st_size for name in names) - sizes_before)
+    except Exception as e:
+        logging.error(f"Error appending transformed datasets: {e}")
+        raise
+
+
+# --- 7️⃣ Transform steps shared by batch and streaming modes ---
+def transform_frame(df: pd.DataFrame, qty_threshold: int, price_threshold: float, outlier_rules: list = None):
+    """Apply price/quantity filters, the sales/cancellations split and outlier detection."""
+    df = filter_invalid_prices(df)
+    transactions, cancellations = split_transactions(df)
+    transactions = filter_invalid_quantities(transactions)
+    clean_transactions, outliers = detect_outliers(transactions, qty_threshold, price_threshold, outlier_rules)
+    return clean_transactions, cancellations, outliers
+
+
+def drop_seen_duplicates(df: pd.DataFrame, seen: np.ndarray):
+    """
+    Drop rows already seen in this chunk or in earlier chunks. seen is the
+    sorted array of 64-bit hashes of the rows kept so far, so memory grows
+    with the number of distinct rows rather than their size. Returns the
+    remaining rows and the updated array.
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    # Work in hash order (stable, so the first of equal rows is kept); sorted lookups are cache-friendly
+    order = np.argsort(hashes, kind="stable")
+    sorted_hashes = hashes[order]
+    keep_sorted = np.ones(len(hashes), dtype=bool)
+    keep_sorted[1:] = sorted_hashes[1:] != sorted_hashes[:-1]
+    positions = np.searchsorted(seen, sorted_hashes)
+    if len(seen):
+        keep_sorted &= seen[np.minimum(positions, len(seen) - 1)] != sorted_hashes
+
+    keep = np.empty(len(hashes), dtype=bool)
+    keep[order] = keep_sorted
+    return df[keep], np.insert(seen, positions[keep_sorted], sorted_hashes[keep_sorted])
+
+
+def split_frame(df: pd.DataFrame, chunksize: int):
+    """Yield consecutive slices of at most chunksize rows."""
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+
+@instrumented()
+def transform_in_chunks(
+    source, paths: dict, thresholds: dict, chunksize: int, watermark: dict = None, outlier_rules: list = None
+) -> dict:
+    """
+    Stream the raw data through the transform steps chunk by chunk and append
+    the results to the transactions, cancellations and outliers CSV files.
+    source is the raw CSV path or an iterable of raw DataFrames (one per source
+    file), which are split into chunks of chunksize rows.
+    Per-group outlier statistics are computed within each chunk.
+    Returns the number of rows written per dataset.
+    """
+    try:
+        seen = np.empty(0, dtype=np.uint64)
+        counts = {"raw": 0, "transactions": 0, "cancellations": 0, "outliers": 0}
+        if isinstance(source, (str, Path)):
+            reader = read_raw_csv(source, chunksize=chunksize)
+        else:
+            # Frames handed over in memory (e.g. one per source file) are re-split into chunksize rows
+            frames = [source] if isinstance(source, pd.DataFrame) else source
+            reader = (chunk for frame in frames for chunk in split_frame(frame, chunksize))
+
+        i = -1
+        for i, chunk in enumerate(reader):
+            counts["raw"] += len(chunk)
+            chunk, seen = drop_seen_duplicates(chunk, seen)
+            chunk = clean_data(chunk, deduplicate=False, watermark=watermark)
+
+            transactions, cancellations, outliers = transform_frame(
+                chunk, thresholds["quantity"], thresholds["unit_price"], outlier_rules
+            )
+            append_datasets(transactions, cancellations, outliers, paths, first_chunk=(i == 0))
+
+            counts["transactions"] += len(transactions)
+            counts["cancellations"] += len(cancellations)
+            counts["outliers"] += len(outliers)
+            logging.info(f"Processed chunk {i + 1}: {counts['raw']:,} raw records so far")
+
+        if i < 0:
+            # No input: replace the previous run's outputs with empty files
+            empty = pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in PROCESSED_DTYPES.items()})
+            append_datasets(empty, empty, empty, paths, first_chunk=True)
+
+        logging.info(
+            f"Streamed {counts['raw']:,} raw records into {counts['transactions']:,} transactions, "
+            f"{counts['cancellations']:,} cancellations and {counts['outliers']:,} outliers"
+        )
+        return counts
+    except Exception as e:
+        logging.error(f"Error during streaming transform: {e}")
+        raise
 
-        df = load_and_clean_data(Path(paths["raw_data"]))
-        df = filter_invalid_prices(df)
-        transactions, cancellations = split_transactions(df)
-        transactions = filter_invalid_quantities(transactions)
+
+def shard_frame(df: pd.DataFrame, n_shards: int) -> list:
+    """
+    Split rows into n_shards by a hash of their values, so identical rows land
+    in the same shard and deduplication stays correct within each shard.
+    Shards keep the row positions as their index.
+    """
+    df = df.reset_index(drop=True)
+    shard_ids = pd.util.hash_pandas_object(df, index=False).to_numpy() % n_shards
+    return [df[shard_ids == i] for i in range(n_shards)]
+
+
+def _clean_and_split_shard(df: pd.DataFrame, watermark: dict = None):
+    """Row-local steps for one shard: cleaning, price filter, split and quantity filter."""
+    df = filter_invalid_prices(clean_data(df, watermark=watermark))
+    transactions, cancellations = split_transactions(df)
+    return filter_invalid_quantities(transactions), cancellations
+
+
+@instrumented()
+def transform_in_parallel(
+    df: pd.DataFrame, thresholds: dict, workers: int, watermark: dict = None, outlier_rules: list = None
+):
+    """
+    Run the row-local transform steps on hash-partitioned shards in a process
+    pool, then merge the shards back into the original row order and detect
+    outliers once on the merged transactions (per-group rules need all rows
+    of a group). The outputs match transform_frame on the whole frame.
+    """
+    try:
+        shards = shard_frame(df, workers)
+        with ProcessPoolExecutor(max_workers=workers, initializer=disable_metrics) as pool:
+            results = list(pool.map(_clean_and_split_shard, shards, [watermark] * len(shards)))
+
+        for i, (shard, (transactions, cancellations)) in enumerate(zip(shards, results)):
+            logging.info(
+                f"Shard {i + 1}/{len(shards)}: {len(shard):,} raw rows → "
+                f"{len(transactions):,} transactions, {len(cancellations):,} cancellations"
+            )
+        transactions = pd.concat([r[0] for r in results]).sort_index()
+        cancellations = pd.concat([r[1] for r in results]).sort_index()
 
         clean_transactions, outliers = detect_outliers(
-            transactions, thresholds["quantity"], thresholds["unit_price"]
+            transactions, thresholds["quantity"], thresholds["unit_price"], outlier_rules
         )
+        return clean_transactions, cancellations, outliers
+    except Exception as e:
+        logging.error(f"Error during parallel transform: {e}")
+        raise
 
-        save_datasets(clean_transactions, cancellations, outliers, paths)
+
+# --- 8️⃣ Orchestrate transform ---
+def main(save_outputs: bool = True, raw=None, config: dict = None):
+    """
+    Run the transform stage and return the outputs as DataFrames keyed by
+    dataset name. CSV files are only written when save_outputs is True.
+    config.yaml is read unless config is given.
+
+    raw is the extract stage's output when it has one (a DataFrame, or an
+    iterator of DataFrames in streaming mode); otherwise the raw CSV is read.
+
+    In streaming mode the outputs are always appended to the CSV files
+    chunk by chunk and None is returned, so later stages read them from disk.
+    In parallel mode the frame is split into transform.workers shards that
+    are cleaned on separate processes.
+    """
+    try:
+        config = load_config() if config is None else config
+        paths = config["paths"]
+        thresholds = config["outlier_thresholds"]
+        transform_config = config.get("transform", {})
+        outlier_rules = config.get("outlier_detection", {}).get("rules", [])
+
+        # Incremental runs only transform rows after the last loaded watermark
+        watermark = None
+        if config.get("pipeline", {}).get("incremental", False):
+            watermark = read_incremental_watermark(paths)
+
+        if transform_config.get("mode", "batch") == "streaming":
+            transform_in_chunks(
+                Path(paths["raw_data"]) if raw is None else raw, paths, thresholds,
+                transform_config.get("chunksize", 250000), watermark=watermark, outlier_rules=outlier_rules,
+            )
+            logging.info("Transform stage completed successfully")
+            return None
+
+        if transform_config.get("mode", "batch") == "parallel":
+            if raw is None:
+                df = read_raw_csv(Path(paths["raw_data"]), since=watermark["InvoiceDate"] if watermark else None)
+            else:
+                df = raw
+            clean_transactions, cancellations, outliers = transform_in_parallel(
+                df, thresholds, transform_config.get("workers") or os.cpu_count(),
+                watermark=watermark, outlier_rules=outlier_rules,
+            )
+        else:
+            if raw is None:
+                df = load_and_clean_data(Path(paths["raw_data"]), watermark=watermark)
+            else:
+                df = clean_data(raw, watermark=watermark)
+                logging.info(f"After cleaning: {len(df):,} records remaining")
+            clean_transactions, cancellations, outliers = transform_frame(
+                df, thresholds["quantity"], thresholds["unit_price"], outlier_rules
+            )
+
+        if save_outputs:
+            save_datasets(clean_transactions, cancellations, outliers, paths)
         logging.info("Transform stage completed successfully")
 
+        return {
+            "transactions": clean_transactions,
+            "cancellations": cancellations,
+            "outliers": outliers,
+        }
+
     except Exception as e:
         logging.error(f"Transform stage failed: {e}")
         raise
@@ -1,36 +1,24 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable
 import pandas as pd
-import yaml
 import logging
+from etl.schema import read_processed_csv
+from src.helpers.config import load_config
+from src.helpers.metrics import instrumented
 
 
-def load_config(config_path: Path = Path(__file__).resolve().parents[1] / "config.yaml") -> dict:
-    """Load configuration file."""
-    try:
-        with open(config_path, "r") as file:
-            config = yaml.safe_load(file)
-        logging.info(f"Configuration loaded from {config_path}")
-        return config
-    except Exception as e:
-        logging.error(f"Failed to load configuration file: {e}")
-        raise
-
-
+@instrumented()
 def load_datasets(config: dict):
     """Load datasets from paths specified in the config file."""
     paths = config["paths"]
     datasets = {}
 
     try:
-        datasets["transactions"] = pd.read_csv(
-            paths["transactions"], dtype={"InvoiceNo": str, "CustomerID": str}
-        )
-        datasets["cancellations"] = pd.read_csv(
-            paths["cancellations"], dtype={"InvoiceNo": str, "CustomerID": str}
-        )
-        datasets["outliers"] = pd.read_csv(
-            paths["outliers"], dtype={"InvoiceNo": str, "CustomerID": str}
-        )
+        datasets["transactions"] = read_processed_csv(paths["transactions"])
+        datasets["cancellations"] = read_processed_csv(paths["cancellations"])
+        datasets["outliers"] = read_processed_csv(paths["outliers"])
         logging.info("Datasets loaded successfully.")
         return datasets
     except FileNotFoundError as e:
@@ -44,77 +32,175 @@ def load_datasets(config: dict):
         raise
 
 
-def validate_table(df: pd.DataFrame, table_name: str):
+# --- Validation rules, declared as data ---
+# Each check takes a column and returns a boolean Series marking valid rows.
+
+def is_not_null(col: pd.Series) -> pd.Series:
+    return col.notna()
+
+
+def is_positive(col: pd.Series) -> pd.Series:
+    return col > 0
+
+
+def is_customer_id(col: pd.Series) -> pd.Series:
+    """5-digit string."""
+    col = col.astype("string")
+    return (col.str.len() == 5) & col.str.isdecimal()
+
+
+def is_sale_invoice_no(col: pd.Series) -> pd.Series:
+    """6-digit string."""
+    col = col.astype("string")
+    return (col.str.len() == 6) & col.str.isdecimal()
+
+
+def is_cancel_invoice_no(col: pd.Series) -> pd.Series:
+    """C followed by 6 digits."""
+    col = col.astype("string")
+    return col.str.startswith("C") & is_sale_invoice_no(col.str.slice(1))
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    group: str
+    column: str
+    check: Callable[[pd.Series], pd.Series]
+    tables: tuple = ("transactions", "cancellations", "outliers")
+
+
+REQUIRED_COLUMNS = [
+    "InvoiceNo", "StockCode", "Description", "Quantity",
+    "InvoiceDate", "UnitPrice", "CustomerID", "Country"
+]
+
+RULES = [
+    *[Rule(f"{col}_not_null", "completeness", col, is_not_null) for col in REQUIRED_COLUMNS],
+    Rule("Quantity_positive", "business", "Quantity", is_positive, ("transactions", "outliers")),
+    Rule("UnitPrice_positive", "business", "UnitPrice", is_positive),
+    Rule("CustomerID_format", "format", "CustomerID", is_customer_id),
+    Rule("InvoiceNo_sale_format", "format", "InvoiceNo", is_sale_invoice_no, ("transactions", "outliers")),
+    Rule("InvoiceNo_cancel_format", "format", "InvoiceNo", is_cancel_invoice_no, ("cancellations",)),
+]
+
+
+def run_rules(df: pd.DataFrame, table_name: str, rules: list) -> list:
+    """Evaluate rules against one table and return one result per rule."""
+    results = []
+    for rule in rules:
+        result = {
+            "table": table_name,
+            "rule": rule.name,
+            "group": rule.group,
+            "column": rule.column,
+            "rows_checked": len(df),
+        }
+        if rule.column not in df.columns:
+            result.update(failed_rows=len(df), error="missing column")
+        else:
+            valid = rule.check(df[rule.column])
+            result.update(failed_rows=int((~valid.fillna(False).astype(bool)).sum()), error=None)
+        result["passed"] = result["failed_rows"] == 0 and result["error"] is None
+        results.append(result)
+    return results
+
+
+def rule_groups(table_name: str, rules: list = RULES) -> dict:
+    """Rules that apply to a table, grouped by rule group."""
+    groups = {}
+    for rule in rules:
+        if table_name in rule.tables:
+            groups.setdefault(rule.group, []).append(rule)
+    return groups
+
+
+@instrumented()
+def validate_table(df: pd.DataFrame, table_name: str) -> list:
     """Perform basic data quality checks on a single table."""
     logging.info(f"Validating {table_name} table...")
 
     try:
-        total_rows = len(df)
-        logging.info(f"{table_name}: {total_rows:,} rows loaded.")
-        issues = []
-
-        # Required columns
-        required_columns = [
-            "InvoiceNo", "StockCode", "Description", "Quantity",
-            "InvoiceDate", "UnitPrice", "CustomerID", "Country"
-        ]
-        for col in required_columns:
-            if col not in df.columns:
-                issues.append(f"Missing required column: {col}")
-                continue
-            null_count = df[col].isna().sum()
-            if null_count > 0:
-                issues.append(f"{col} has {null_count} nulls")
-
-        # Quantity and UnitPrice rules
-        if table_name in ["transactions", "outliers"]:
-            neg_qty = (df["Quantity"] <= 0).sum()
-            neg_price = (df["UnitPrice"] <= 0).sum()
-            if neg_qty > 0:
-                issues.append(f"{neg_qty} rows have non-positive Quantity")
-            if neg_price > 0:
-                issues.append(f"{neg_price} rows have non-positive UnitPrice")
-        elif table_name == "cancellations":
-            neg_price = (df["UnitPrice"] <= 0).sum()
-            if neg_price > 0:
-                issues.append(f"{neg_price} rows have non-positive UnitPrice (should not happen)")
-
-        # CustomerID format
-        invalid_custid = df[~df["CustomerID"].str.match(r"^\d{5}$")]
-        if len(invalid_custid) > 0:
-            issues.append(f"{len(invalid_custid)} rows have invalid CustomerID format")
-
-        # InvoiceNo format
-        if table_name in ["transactions", "outliers"]:
-            invalid_invoice = df[~df["InvoiceNo"].str.match(r"^\d{6}$")]
-        else:
-            invalid_invoice = df[~df["InvoiceNo"].str.match(r"^C\d{6}$")]
-        if len(invalid_invoice) > 0:
-            issues.append(f"{len(invalid_invoice)} rows have invalid InvoiceNo format")
-
-        # Summary
-        if issues:
-            logging.warning(f"Issues found in {table_name}:")
-            for issue in issues:
-                logging.warning(f" - {issue}")
-        else:
-            logging.info(f"No issues found in {table_name}.")
+        logging.info(f"{table_name}: {len(df):,} rows loaded.")
+        results = []
+        for rules in rule_groups(table_name).values():
+            results.extend(run_rules(df, table_name, rules))
+        log_results(results, [table_name])
+        return results
 
     except Exception as e:
         logging.error(f"Validation failed for {table_name}: {e}")
         raise
 
 
-def main():
-    """Run validation for all datasets."""
+@instrumented()
+def validate_datasets(datasets: dict, max_workers: int = None, executor: str = "thread") -> pd.DataFrame:
+    """
+    Validate all tables concurrently, one task per table and rule group, and
+    return a report with one row per table and rule. The thread pool suits
+    Arrow-backed columns, whose string kernels release the GIL; the process
+    pool copies each table into its workers.
+    """
     try:
-        config = load_config()
-        datasets = load_datasets(config)
+        pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        with pool_class(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(run_rules, df, table_name, rules)
+                for table_name, df in datasets.items()
+                for rules in rule_groups(table_name).values()
+            ]
+            results = [result for future in futures for result in future.result()]
+
+        log_results(results, list(datasets))
+        return pd.DataFrame(results)
+    except Exception as e:
+        logging.error(f"Validation engine failed: {e}")
+        raise
+
+
+def log_results(results: list, table_names: list):
+    """Log failed rules per table, in the same form as the original checks."""
+    for table_name in table_names:
+        failed = [r for r in results if r["table"] == table_name and not r["passed"]]
+        if failed:
+            logging.warning(f"Issues found in {table_name}:")
+            for r in failed:
+                reason = r["error"] or f"{r['failed_rows']:,} rows fail"
+                logging.warning(f" - {r['rule']}: {reason}")
+        else:
+            logging.info(f"No issues found in {table_name}.")
 
-        for name, df in datasets.items():
-            validate_table(df, name)
+
+def save_report(report: pd.DataFrame, path: Path):
+    """Save the validation report as JSON records."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    report.to_json(path, orient="records", indent=2)
+    logging.info(f"Validation report saved to {path}")
+
+
+def main(datasets: dict = None, config: dict = None) -> pd.DataFrame:
+    """
+    Run validation for all datasets. Uses the DataFrames handed over by the
+    transform stage when given, otherwise reads the CSV outputs from disk.
+    Returns the validation report. config.yaml is read unless config is given.
+    """
+    try:
+        config = load_config() if config is None else config
+        if datasets is None:
+            datasets = load_datasets(config)
+
+        validation_config = config.get("validation", {})
+        report = validate_datasets(
+            datasets,
+            max_workers=validation_config.get("max_workers"),
+            executor=validation_config.get("executor", "thread"),
+        )
+        if config["paths"].get("validation_report"):
+            save_report(report, config["paths"]["validation_report"])
 
         logging.info("Data validation completed successfully.")
+        return report
 
     except Exception as e:
         logging.error(f"Validation pipeline failed: {e}")
@@ -122,4 +208,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
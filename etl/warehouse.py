@@ -0,0 +1,155 @@
+from datetime import datetime, timezone
+from pathlib import Path
+import json
+import logging
+import os
+import shutil
+import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+PUBLISH_MARKER = "_published.json"
+# Tables an incremental load rewrites (dimensions, hash indexes, rollups) are
+# first written here with a manifest naming their batch watermark. They are
+# moved into place only once that watermark is stored, so a failed load never
+# leaves half a batch merged into them.
+PENDING_DIR = "_pending"
+PENDING_MANIFEST = "_batch.json"
+BATCH_PART_PREFIX = "part-batch-"
+
+
+def open_table(warehouse_dir: Path, filename: str) -> ds.Dataset:
+    """
+    Open a warehouse table as a pyarrow dataset. Tables written incrementally
+    or with partitioning live in a directory named after the file; otherwise
+    the single Parquet file is used. Hive partition columns (year, month,
+    transaction_type) become regular columns.
+    """
+    warehouse_dir = Path(warehouse_dir)
+    dataset_dir = warehouse_dir / Path(filename).stem
+    source = dataset_dir if dataset_dir.is_dir() else warehouse_dir / filename
+    return ds.dataset(source, format="parquet", partitioning="hive")
+
+
+def read_table(
+    warehouse_dir: Path, filename: str, filters=None, columns: list = None
+) -> pd.DataFrame:
+    """
+    Read a warehouse table, pruning partitions and pushing filters down to
+    Parquet row-group statistics. filters is either a pyarrow expression or
+    a pandas-style list of tuples, e.g. [("year", "=", 2011), ("month", "=", 5)].
+    """
+    try:
+        dataset = open_table(warehouse_dir, filename)
+        if filters is not None and not isinstance(filters, ds.Expression):
+            filters = pq.filters_to_expression(filters)
+        table = dataset.to_table(columns=columns, filter=filters)
+        logging.info(f"Read {table.num_rows:,} rows from {filename}")
+        return table.to_pandas()
+    except Exception as e:
+        logging.error(f"Failed to read {filename} from warehouse: {e}")
+        raise
+
+
+def read_fact_sales(warehouse_dir: Path, filename: str = "fact_sales.parquet", filters=None, columns: list = None):
+    """Read fact_sales, e.g. read_fact_sales(dir, filters=[("transaction_type", "=", "CANCEL")])."""
+    return read_table(warehouse_dir, filename, filters=filters, columns=columns)
+
+
+def has_versioned_dimensions(warehouse_dir: Path, paths: dict) -> bool:
+    """Whether the stored customer and product dimensions are Type-2 (True when none are stored yet)."""
+    for name in ["dim_customers", "dim_products"]:
+        path = Path(warehouse_dir) / paths[name]
+        if path.exists() and "is_current" not in pq.read_schema(path).names:
+            return False
+    return True
+
+
+def publish(warehouse_dir: Path, tables: list, watermark: dict = None) -> str:
+    """
+    Mark the warehouse as updated once load has written every table. Readers
+    that cache warehouse data compare the marker's version to invalidate.
+    Incremental loads record the watermark they published.
+    """
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    marker = {
+        "version": version, "published_at": datetime.now(timezone.utc).isoformat(),
+        "tables": tables, "watermark": watermark,
+    }
+    path = Path(warehouse_dir) / PUBLISH_MARKER
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as file:
+        json.dump(marker, file, indent=2)
+    os.replace(tmp_path, path)
+    logging.info(f"Warehouse version {version} published")
+    return version
+
+
+def read_publish_marker(warehouse_dir: Path):
+    """The last publish marker, or None if load has not published yet."""
+    path = Path(warehouse_dir) / PUBLISH_MARKER
+    if not path.exists():
+        return None
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def pending_dir(warehouse_dir: Path) -> Path:
+    return Path(warehouse_dir) / PENDING_DIR
+
+
+def write_pending_manifest(warehouse_dir: Path, watermark: dict, files: list):
+    """Record the staged files (paths relative to the warehouse) and the watermark that commits them."""
+    path = pending_dir(warehouse_dir) / PENDING_MANIFEST
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as file:
+        json.dump({"watermark": watermark, "files": [str(f) for f in files]}, file, indent=2)
+    os.replace(tmp_path, path)
+
+
+def apply_pending(warehouse_dir: Path, committed: dict) -> bool:
+    """
+    Finish or discard staged tables. If their batch watermark is the stored
+    (committed) one, move them into place; otherwise the batch never
+    committed and they are removed. Returns True if tables were moved.
+    """
+    staging = pending_dir(warehouse_dir)
+    manifest_path = staging / PENDING_MANIFEST
+    if not manifest_path.exists():
+        if staging.exists():
+            shutil.rmtree(staging)
+        return False
+    with open(manifest_path, "r") as file:
+        manifest = json.load(file)
+
+    if committed is None or manifest["watermark"] != committed:
+        logging.info("Discarding tables staged by an uncommitted load")
+        shutil.rmtree(staging)
+        return False
+    for name in manifest["files"]:
+        if (staging / name).exists():
+            (Path(warehouse_dir) / name).parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staging / name, Path(warehouse_dir) / name)
+    shutil.rmtree(staging)
+    logging.info(f"Moved {len(manifest['files'])} staged tables into place")
+    return True
+
+
+def remove_uncommitted_parts(dataset_dir: Path, committed_id: str = None) -> int:
+    """
+    Remove batch part files written after the committed watermark (all of
+    them without one), e.g. by a load that failed before storing its
+    watermark. Returns the number of files removed.
+    """
+    dataset_dir = Path(dataset_dir)
+    if not dataset_dir.is_dir():
+        return 0
+    removed = 0
+    for path in dataset_dir.rglob(f"{BATCH_PART_PREFIX}*.parquet"):
+        batch_id = path.name[len(BATCH_PART_PREFIX):len(BATCH_PART_PREFIX) + 25]
+        if committed_id is None or batch_id > committed_id:
+            path.unlink()
+            removed += 1
+    if removed:
+        logging.info(f"Removed {removed} uncommitted part files from {dataset_dir}")
+    return removed
@@ -0,0 +1,94 @@
+import json
+import logging
+import os
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from etl.warehouse import has_versioned_dimensions
+
+
+# --- High-water mark of loaded data, used by incremental runs ---
+# The mark is the latest (InvoiceDate, invoice number) pair loaded into the
+# warehouse. Invoice numbers are compared without their "C" prefix, so sales
+# and cancellations share one ordering.
+
+
+def read_watermark(state_path: Path):
+    """Return the stored watermark, or None if nothing has been loaded yet."""
+    state_path = Path(state_path)
+    if not state_path.exists():
+        return None
+    with open(state_path, "r") as file:
+        state = json.load(file)
+    watermark = state.get("watermark")
+    if watermark:
+        logging.info(f"Watermark: {watermark['InvoiceDate']} / {watermark['InvoiceNo']}")
+    return watermark
+
+
+def read_incremental_watermark(paths: dict):
+    """
+    The watermark an incremental run starts from: the stored one, or None
+    when the warehouse dimensions predate Type-2 versioning, so the run
+    reloads the full history and rebuilds them.
+    """
+    watermark = read_watermark(Path(paths["state"]))
+    if watermark and not has_versioned_dimensions(paths["warehouse"], paths):
+        logging.info("Warehouse dimensions have no version history; reloading the full history to rebuild them")
+        return None
+    return watermark
+
+
+def write_watermark(state_path: Path, watermark: dict):
+    """Persist the watermark atomically, so a failed write keeps the previous one."""
+    state_path = Path(state_path)
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path.with_suffix(state_path.suffix + ".tmp")
+    with open(tmp_path, "w") as file:
+        json.dump({"watermark": watermark}, file, indent=2)
+    os.replace(tmp_path, state_path)
+    logging.info(f"Watermark advanced to {watermark['InvoiceDate']} / {watermark['InvoiceNo']}")
+
+
+def compute_watermark(invoice_dates: pd.Series, invoice_nos: pd.Series, previous: dict = None):
+    """Return the latest (date, invoice) pair in the given rows, never moving back past previous."""
+    candidates = pd.DataFrame({
+        "date": pd.to_datetime(invoice_dates).to_numpy(),
+        "number": _invoice_numbers(invoice_nos),
+        "invoice": np.asarray(invoice_nos, dtype=object),
+    })
+    if previous:
+        candidates.loc[len(candidates)] = [
+            pd.Timestamp(previous["InvoiceDate"]),
+            _invoice_numbers(pd.Series([previous["InvoiceNo"]]))[0],
+            previous["InvoiceNo"],
+        ]
+    if candidates.empty:
+        return previous
+    latest = candidates.sort_values(["date", "number"]).iloc[-1]
+    return {"InvoiceDate": latest["date"].isoformat(), "InvoiceNo": str(latest["invoice"])}
+
+
+def after_watermark(invoice_dates: pd.Series, invoice_nos: pd.Series, watermark: dict) -> np.ndarray:
+    """Boolean mask of rows strictly after the watermark."""
+    if not watermark:
+        return np.ones(len(invoice_dates), dtype=bool)
+    mark_date = pd.Timestamp(watermark["InvoiceDate"])
+    mark_number = _invoice_numbers(pd.Series([watermark["InvoiceNo"]]))[0]
+    dates = pd.to_datetime(invoice_dates).to_numpy()
+    numbers = _invoice_numbers(invoice_nos)
+    later = dates > mark_date.to_datetime64()
+    same_date = dates == mark_date.to_datetime64()
+    return later | (same_date & (numbers > mark_number))
+
+
+def watermark_id(watermark: dict) -> str:
+    """Sortable text form of a watermark, e.g. 20111209T125000-000581587, used to name batch files."""
+    number = _invoice_numbers(pd.Series([watermark["InvoiceNo"]]))[0]
+    return f"{pd.Timestamp(watermark['InvoiceDate']):%Y%m%dT%H%M%S}-{number:09d}"
+
+
+def _invoice_numbers(invoice_nos: pd.Series) -> np.ndarray:
+    """Numeric part of invoice numbers (invalid numbers become -1)."""
+    digits = pd.Series(invoice_nos).astype(str).str.removeprefix("C")
+    return pd.to_numeric(digits, errors="coerce").fillna(-1).to_numpy(dtype="int64")
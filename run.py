@@ -1,30 +1,182 @@
+import argparse
 import logging
+import sys
+import time
 import traceback
+from pathlib import Path
+from src.helpers.config import DEFAULT_CONFIG_PATH, load_config
 from src.helpers.logger import setup_logging
-from etl import extract, transform, validate, load
 
-def main():
-    setup_logging()
-    logging.info("Starting ETL pipeline...")
+# etl modules (and pandas with them) are imported by the stages that run, so
+# the CLI starts quickly and e.g. a load-only retry never imports extract.
 
-    try:
-        logging.info("Step 1: Extracting raw dataset...")
-        extract.main()
+STAGES = ["extract", "transform", "validate", "load"]
+DATASETS = ["transactions", "cancellations", "outliers"]
+COMMANDS = ["run", "serve"]
+
+
+def build_stages(config: dict) -> list:
+    """The pipeline as a DAG: extract → transform → (validate, load)."""
+    from etl.pipeline import Stage
+
+    paths = config["paths"]
+    pipeline_config = config.get("pipeline", {})
+    write_intermediates = pipeline_config.get("write_intermediates", False)
+    streaming = config.get("transform", {}).get("mode", "batch") == "streaming"
+    source = config.get("source", {"type": "uci"})
+    files_source = source.get("type", "uci") == "files"
+    warehouse_dir = Path(paths["warehouse"])
+
+    def run_extract(inputs):
+        from etl import extract
+        return extract.main(save_raw=write_intermediates, stream=streaming, config=config)
+
+    def run_transform(inputs):
+        from etl import transform
+        return transform.main(save_outputs=write_intermediates, raw=inputs["extract"], config=config)
+
+    def run_validate(inputs):
+        from etl import validate
+        return validate.main(inputs["transform"], config=config)
+
+    def run_load(inputs):
+        from etl import load
+        return load.main(inputs["transform"], config=config)
+
+    def source_files():
+        # Local exports are fingerprinted before extract runs, so unchanged files skip it
+        from etl.pipeline import file_fingerprint
+        from etl.sources import list_source_files
+        return file_fingerprint(list_source_files(source["path"]))
+
+    def extract_outputs():
+        if files_source:
+            return [paths["profiling_report"]] + ([paths["raw_data"]] if write_intermediates else [])
+        return [paths["raw_data"]]
+
+    def transform_outputs():
+        # Streaming writes the CSV outputs; batch outputs live in the stage checkpoint
+        return [paths[name] for name in DATASETS] if streaming else []
+
+    def transform_inputs():
+        if pipeline_config.get("incremental", False):
+            from etl.watermark import read_incremental_watermark
+            return read_incremental_watermark(paths)
+        return None
+
+    def warehouse_tables():
+        tables = [warehouse_dir / paths[name] for name in ["dim_customers", "dim_products", "dim_time"]]
+        fact_dir = warehouse_dir / Path(paths["fact_sales"]).stem
+        return tables + [fact_dir if fact_dir.is_dir() else warehouse_dir / paths["fact_sales"]]
 
-        logging.info("Step 2: Transforming dataset...")
-        transform.main()
+    return [
+        Stage(
+            name="extract",
+            run=run_extract,
+            config_keys=("source", "profiling", "pipeline", "transform"),  # transform.mode decides streaming
+            code=("etl.extract", "etl.sources", "etl.schema", "etl.profiling"),
+            inputs=source_files if files_source else None,
+            outputs=extract_outputs,
+            cacheable=files_source,  # the UCI download has its own cache and always runs
+        ),
+        Stage(
+            name="transform",
+            run=run_transform,
+            deps=("extract",),
+            config_keys=(
+                "paths.raw_data", *(f"paths.{name}" for name in DATASETS), "paths.state",
+                "outlier_thresholds", "outlier_detection", "transform", "pipeline",
+            ),
+            code=("etl.transform", "etl.schema", "etl.warehouse", "etl.watermark"),
+            inputs=transform_inputs,
+            outputs=transform_outputs,
+        ),
+        Stage(
+            name="validate",
+            run=run_validate,
+            deps=("transform",),
+            config_keys=("paths", "validation"),
+            code=("etl.validate", "etl.schema"),
+            outputs=lambda: [paths["validation_report"]],
+        ),
+        Stage(
+            name="load",
+            run=run_load,
+            deps=("transform",),
+            config_keys=("paths", "parquet", "warehouse_db", "pipeline"),
+            code=("etl.load", "etl.aggregate", "etl.database", "etl.schema", "etl.scd", "etl.watermark", "etl.warehouse"),
+            outputs=warehouse_tables,
+        ),
+    ]
 
-        logging.info("Step 3: Validating cleaned datasets...")
-        validate.main()
 
-        logging.info("Step 4: Loading datasets into warehouse...")
-        load.main()
+def run_pipeline(config: dict, args) -> bool:
+    """Run the selected stages; returns False if the pipeline failed."""
+    from etl.pipeline import run_dag
+    from src.helpers.metrics import setup_metrics, summary_table
 
+    setup_metrics()
+    logging.info("Starting ETL pipeline...")
+    try:
+        status = run_dag(
+            build_stages(config), config, Path(config["paths"]["stage_cache"]),
+            force=args.force, resume=args.resume, start=args.start, stop=args.stop,
+        )
+        logging.info("Stages: " + ", ".join(f"{name} {s}" for name, s in status.items()))
         logging.info("ETL pipeline completed successfully!")
+        return True
 
     except Exception as e:
         logging.error(f"ETL pipeline failed: {e}")
         logging.error(traceback.format_exc())
+        return False
+
+    finally:
+        logging.info("Stage metrics (also in logs/metrics.jsonl):\n" + summary_table())
+
+
+def serve_queries(config: dict, args) -> bool:
+    from etl import query
+    query.main(config, host=args.host, port=args.port)
+    return True
+
+
+def parse_args(argv: list) -> argparse.Namespace:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", type=Path, default=DEFAULT_CONFIG_PATH, help="Pipeline configuration file")
+
+    parser = argparse.ArgumentParser(
+        description="Online Retail ETL pipeline.", epilog="Without a command, `run` is assumed."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", parents=[common], help="Run the pipeline stages (default)")
+    run.add_argument("--from", dest="start", choices=STAGES,
+                     help="First stage to run; the stages before it are read from their checkpoints")
+    run.add_argument("--to", dest="stop", choices=STAGES, help="Last stage to run")
+    run.add_argument("--force", action="store_true", help="Run every selected stage even if its inputs are unchanged")
+    run.add_argument("--resume", action="store_true",
+                     help="Continue the last run, reusing the stages it completed before failing")
+    run.set_defaults(handler=run_pipeline)
+
+    serve = commands.add_parser("serve", parents=[common], help="Serve warehouse queries over local HTTP")
+    serve.add_argument("--host", help="Defaults to query_service.host")
+    serve.add_argument("--port", type=int, help="Defaults to query_service.port")
+    serve.set_defaults(handler=serve_queries)
+
+    if not argv or argv[0] not in COMMANDS + ["-h", "--help"]:
+        argv = ["run"] + list(argv)
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None) -> int:
+    started = time.perf_counter()
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    setup_logging()
+    config = load_config(args.config)  # the only read of config.yaml; stages get this dict
+    logging.info(f"CLI ready in {(time.perf_counter() - started) * 1000:.0f} ms: {args.command}")
+    return 0 if args.handler(config, args) else 1
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
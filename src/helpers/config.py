@@ -0,0 +1,17 @@
+import logging
+from pathlib import Path
+import yaml
+
+DEFAULT_CONFIG_PATH = Path(__file__).resolve().parents[2] / "config.yaml"
+
+
+def load_config(config_path: Path = DEFAULT_CONFIG_PATH) -> dict:
+    """Load pipeline configuration from YAML file."""
+    try:
+        with open(config_path, "r") as file:
+            config = yaml.safe_load(file)
+        logging.info(f"Configuration loaded from {config_path}")
+        return config
+    except Exception as e:
+        logging.error(f"Failed to load config file: {e}")
+        raise
@@ -0,0 +1,224 @@
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+import pandas as pd
+import psutil
+
+
+# Steps of the current run, in completion order, and the steps still running.
+# The running steps are kept per context, so stages run on other threads
+# (with contextvars.copy_context) nest under the step that started them.
+_records = []
+_active = ContextVar("active_steps", default=())
+_metrics_path = None
+_ids = itertools.count(1)
+_write_lock = threading.Lock()
+# Running steps whose RSS peak a background thread samples every
+# _SAMPLE_INTERVAL seconds; the thread stops when no step is running.
+_SAMPLE_INTERVAL = 0.01
+_sampled = {}
+_sampler = None
+_sample_lock = threading.Lock()
+
+
+def setup_metrics(path: str = "logs/metrics.jsonl"):
+    """Start a new run: clear collected metrics and append JSON lines to path."""
+    global _metrics_path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    _metrics_path = path
+    _records.clear()
+
+
+def disable_metrics():
+    """Stop recording in this process, e.g. in pool workers forked while a step was running."""
+    global _metrics_path
+    _metrics_path = None
+    _active.set(())
+    with _sample_lock:
+        _sampled.clear()
+
+
+@contextmanager
+def track(name: str, rows_in: int = None):
+    """
+    Measure a pipeline step: wall time, CPU time, peak process RSS while the
+    step runs, rows in/out and bytes written. Set record["rows_out"] inside the block; bytes are added
+    with record_bytes_written() by the functions that write files.
+    """
+    active = _active.get()
+    parent = active[-1] if active else None
+    record = {
+        "id": next(_ids),
+        "parent_id": parent["id"] if parent else None,
+        "step": name,
+        "parent": parent["step"] if parent else None,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "rows_in": rows_in,
+        "rows_out": None,
+        "bytes_written": 0,
+    }
+    token = _active.set(active + (record,))
+    _start_sampling(record)
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    status = "ok"
+    try:
+        yield record
+    except Exception:
+        status = "error"
+        raise
+    finally:
+        _active.reset(token)
+        peak_rss = _stop_sampling(record)
+        record.update({
+            # A step can mark itself, e.g. "skipped"; errors always win
+            "status": status if status == "error" else record.get("status", status),
+            "wall_s": round(time.perf_counter() - wall_start, 4),
+            "cpu_s": round(time.process_time() - cpu_start, 4),
+            "peak_rss_mb": round(peak_rss / 2**20, 1),
+        })
+        with _write_lock:
+            _records.append(record)
+            if _metrics_path:
+                with open(_metrics_path, "a") as file:
+                    file.write(json.dumps(record) + "\n")
+
+
+def instrumented(name: str = None):
+    """Decorator version of track(); rows are counted from DataFrame arguments and results."""
+    def decorator(func):
+        step = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            frames = [a for a in list(args) + list(kwargs.values()) if isinstance(a, pd.DataFrame)]
+            with track(step, rows_in=len(frames[0]) if frames else None) as record:
+                result = func(*args, **kwargs)
+                record["rows_out"] = count_rows(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def record_bytes_written(num_bytes: int):
+    """Add written bytes to every running step, so stages include their sub-steps' output."""
+    for record in _active.get():
+        record["bytes_written"] += int(num_bytes)
+
+
+def count_rows(result):
+    """
+    Rows in a DataFrame, summed over a dict of named datasets, or in the first
+    DataFrame of a tuple/list (the step's main result; the others are side
+    outputs such as the rows it flagged); None otherwise.
+    """
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    if isinstance(result, dict):
+        frames = [r for r in result.values() if isinstance(r, pd.DataFrame)]
+        return sum(len(f) for f in frames) if frames else None
+    if isinstance(result, (tuple, list)):
+        frames = [r for r in result if isinstance(r, pd.DataFrame)]
+        return len(frames[0]) if frames else None
+    return None
+
+
+def get_records() -> list:
+    """Metrics collected since setup_metrics()."""
+    return list(_records)
+
+
+def summary_table(records: list = None) -> str:
+    """Plain-text table of collected metrics, sub-steps indented under their stage."""
+    records = _records if records is None else records
+    rows = [
+        ("step", "wall s", "cpu s", "peak MB", "rows in", "rows out", "MB written"),
+    ]
+    for r in _ordered(records):
+        depth = _depth(r, records)
+        status = "" if r.get("status", "ok") == "ok" else f" ({r['status']})"
+        rows.append((
+            "  " * depth + r["step"] + status,
+            f"{r['wall_s']:.3f}",
+            f"{r['cpu_s']:.3f}",
+            f"{r['peak_rss_mb']:.1f}",
+            "" if r["rows_in"] is None else f"{r['rows_in']:,}",
+            "" if r["rows_out"] is None else f"{r['rows_out']:,}",
+            f"{r['bytes_written'] / 2**20:.1f}" if r["bytes_written"] else "",
+        ))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = [
+        "  ".join(cell.ljust(w) if i == 0 else cell.rjust(w) for i, (cell, w) in enumerate(zip(row, widths)))
+        for row in rows
+    ]
+    lines.insert(1, "-" * len(lines[0]))
+    return "\n".join(lines)
+
+
+def _ordered(records: list) -> list:
+    """Steps in start order, each followed by its sub-steps (records complete child-first)."""
+    children = {}
+    for r in sorted(records, key=lambda r: r["id"]):
+        children.setdefault(r["parent_id"], []).append(r)
+    known = {r["id"] for r in records}
+
+    ordered = []
+
+    def visit(parent_id):
+        for r in children.get(parent_id, []):
+            ordered.append(r)
+            visit(r["id"])
+    for parent_id in children:
+        if parent_id is None or parent_id not in known:
+            visit(parent_id)
+    return ordered
+
+
+def _depth(record: dict, records: list) -> int:
+    by_id = {r["id"]: r for r in records}
+    depth, parent_id = 0, record["parent_id"]
+    while parent_id in by_id:
+        depth += 1
+        parent_id = by_id[parent_id]["parent_id"]
+    return depth
+
+
+def _rss_bytes() -> int:
+    return psutil.Process().memory_info().rss
+
+
+def _start_sampling(record: dict):
+    global _sampler
+    with _sample_lock:
+        _sampled[record["id"]] = _rss_bytes()
+        if _sampler is None or not _sampler.is_alive():
+            _sampler = threading.Thread(target=_sample_rss, name="metrics-rss", daemon=True)
+            _sampler.start()
+
+
+def _stop_sampling(record: dict) -> int:
+    """Stop sampling a step and return its peak RSS in bytes."""
+    rss = _rss_bytes()
+    with _sample_lock:
+        return max(_sampled.pop(record["id"], 0), rss)
+
+
+def _sample_rss():
+    """Raise the peak of every running step to the current RSS until no step runs."""
+    global _sampler
+    while True:
+        rss = _rss_bytes()
+        with _sample_lock:
+            if not _sampled:
+                _sampler = None
+                return
+            for step_id, peak in _sampled.items():
+                if rss > peak:
+                    _sampled[step_id] = rss
+        time.sleep(_SAMPLE_INTERVAL)
@@ -0,0 +1,38 @@
+import pytest
+import pandas as pd
+
+
+@pytest.fixture
+def transform_outputs():
+    """Small transactions/cancellations/outliers frames shaped like transform.py outputs."""
+    transactions = pd.DataFrame({
+        "InvoiceNo": ["100001", "100003", "100004"],
+        "StockCode": ["12345", "99999", "12345"],
+        "Description": ["Widget A", "Widget B", "Widget A v2"],
+        "Quantity": [10, 5, 2],
+        "InvoiceDate": pd.to_datetime(["2022-01-01 10:00", "2022-01-03 11:00", "2022-01-04 12:00"]),
+        "UnitPrice": [2.5, 4.0, 3.0],
+        "CustomerID": ["12345", "12346", "12345"],
+        "Country": ["UK", "France", "Germany"],
+    })
+    cancellations = pd.DataFrame({
+        "InvoiceNo": ["C100002"],
+        "StockCode": ["12345"],
+        "Description": ["Widget A"],
+        "Quantity": [-4],
+        "InvoiceDate": pd.to_datetime(["2022-01-02 09:30"]),
+        "UnitPrice": [2.5],
+        "CustomerID": ["12345"],
+        "Country": ["UK"],
+    })
+    outliers = pd.DataFrame({
+        "InvoiceNo": ["100005"],
+        "StockCode": ["54321"],
+        "Description": ["Widget C"],
+        "Quantity": [9000],
+        "InvoiceDate": pd.to_datetime(["2022-01-04 13:00"]),
+        "UnitPrice": [1.0],
+        "CustomerID": ["12347"],
+        "Country": ["UK"],
+    })
+    return transactions, cancellations, outliers
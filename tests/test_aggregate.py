@@ -0,0 +1,33 @@
+import pytest
+import pandas as pd
+from etl.aggregate import build_rollups, merge_rollups
+from etl.load import prepare_fact_table, build_dimensions, apply_dimension_keys
+
+
+@pytest.mark.describe("Aggregate tests")
+class TestAggregate:
+
+    @pytest.mark.it("should build signed rollups and merge batch rollups to the full-load result")
+    def test_rollups_are_additive(self, transform_outputs):
+        transactions, cancellations, _ = transform_outputs
+        fact = prepare_fact_table(transactions, cancellations)
+        dims = build_dimensions(fact)
+        keyed = apply_dimension_keys(fact, dims)
+
+        rollups = build_rollups(keyed, dims["dim_customers"])
+        daily = rollups["daily_sales"].set_index("date_key")
+        assert daily.loc[20220102, "revenue"] == -10.0  # 4 cancelled units at 2.50
+        assert daily.loc[20220102, "cancelled_invoices"] == 1
+        monthly = rollups["monthly_sales"]
+        assert monthly["revenue"].tolist() == [25.0 - 10.0 + 20.0 + 6.0]
+        assert monthly["invoices"].tolist() == [3]
+        # Countries come from the customer version of each sale (12345 moved from the UK to Germany)
+        assert rollups["country_sales"].set_index("country")["quantity"].to_dict() == {"France": 5, "Germany": 2, "UK": 6}
+
+        first = keyed["transaction_datetime"] < pd.Timestamp("2022-01-03")
+        merged = merge_rollups(
+            build_rollups(keyed[first], dims["dim_customers"]),
+            build_rollups(keyed[~first], dims["dim_customers"]),
+        )
+        for name, rollup in rollups.items():
+            pd.testing.assert_frame_equal(merged[name], rollup, check_dtype=False)
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+from etl.checkpoint import MANIFEST, read_checkpoint, read_manifest, write_checkpoint
+
+
+@pytest.mark.describe("Checkpoint tests")
+class TestCheckpoint:
+
+    @pytest.mark.it("should round-trip stage outputs with their dtypes and index, and ignore incomplete checkpoints")
+    def test_checkpoint_round_trip(self, tmp_path):
+        frame = pd.DataFrame(
+            {
+                "InvoiceNo": pd.array(["536365", None, "C536379"], dtype="string[pyarrow]"),
+                "StockCode": pd.Categorical(["85123A", "71053", "85123A"]),
+                "Quantity": pd.array([6, 6, -1], dtype="int32"),
+                "InvoiceDate": pd.to_datetime(["2010-12-01 08:26", "2010-12-01 08:26", "2010-12-01 09:41"]),
+                "Description": ["WHITE HANGING HEART", "WHITE METAL LANTERN", None],
+            },
+            index=[0, 4, 9],
+        )
+        output = {"transactions": frame.iloc[:2], "cancellations": frame.iloc[2:]}
+
+        write_checkpoint(tmp_path / "transform", output, {"run_id": "r1"})
+        restored = read_checkpoint(tmp_path / "transform")
+        assert list(restored) == ["transactions", "cancellations"]
+        for name, df in output.items():
+            pd.testing.assert_frame_equal(restored[name], df)
+        assert read_manifest(tmp_path / "transform")["run_id"] == "r1"
+
+        write_checkpoint(tmp_path / "extract", None)
+        assert read_checkpoint(tmp_path / "extract") is None
+
+        # Without a manifest the checkpoint is incomplete
+        (tmp_path / "transform" / MANIFEST).unlink()
+        assert read_manifest(tmp_path / "transform") is None
+        with pytest.raises(FileNotFoundError):
+            read_checkpoint(tmp_path / "transform")
@@ -0,0 +1,38 @@
+import pytest
+import sqlite3
+from etl.database import load_database
+from etl.load import prepare_fact_table, prepare_outliers_table, build_dimensions, apply_dimension_keys
+
+
+@pytest.mark.describe("SQLite warehouse tests")
+class TestDatabase:
+
+    @pytest.mark.it("should bulk-load the star schema with generated amounts and key indexes")
+    def test_load_database(self, tmp_path, transform_outputs):
+        transactions, cancellations, outliers = transform_outputs
+        fact = prepare_fact_table(transactions, cancellations)
+        quarantined = prepare_outliers_table(outliers)
+        dims = build_dimensions(fact, quarantined)
+        fact = apply_dimension_keys(fact, dims)
+        quarantined = apply_dimension_keys(quarantined, dims)
+
+        db_path = tmp_path / "warehouse.sqlite"
+        load_database(db_path, dims, fact, quarantined, batch_size=2)
+        load_database(db_path, dims, fact.iloc[:1], quarantined.iloc[:0], append=True)
+
+        conn = sqlite3.connect(db_path)
+        assert conn.execute("SELECT COUNT(*) FROM dim_time").fetchone() == (4,)
+        assert conn.execute("SELECT COUNT(*) FROM fact_sales").fetchone() == (len(fact) + 1,)
+        assert conn.execute(
+            "SELECT total_amount, net_quantity, is_orphan FROM fact_sales WHERE invoice_no = 'C100002'"
+        ).fetchone() == (-10.0, 0, 0)
+        assert conn.execute(
+            "SELECT country, valid_to, is_current FROM dim_customers WHERE customer_id = '12345' ORDER BY valid_from"
+        ).fetchall() == [("UK", "2022-01-04T12:00:00", 0), ("Germany", None, 1)]
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM fact_sales WHERE customer_key = 1").fetchall()
+        assert "idx_fact_sales_customer_key" in str(plan)
+
+        # A full load replaces the fact rows
+        load_database(db_path, dims, fact, quarantined)
+        assert conn.execute("SELECT COUNT(*) FROM fact_sales").fetchone() == (len(fact),)
+        conn.close()
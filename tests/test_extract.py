@@ -33,4 +33,99 @@ class TestExtract:
                             "Quantity", "InvoiceDate", "UnitPrice",
                             "CustomerID", "Country"]
         for col in expected_columns:
-            assert col in df.columns, f"Missing column {col}"
\ No newline at end of file
+            assert col in df.columns, f"Missing column {col}"
+
+
+@pytest.mark.describe("Extract cache tests")
+class TestExtractCache:
+
+    @pytest.mark.it("should extract from the cached snapshot in offline mode and skip unchanged rewrites")
+    def test_offline_mode_uses_cache(self, tmp_path):
+        import pandas as pd
+        import yaml
+
+        snapshot = pd.DataFrame({
+            "InvoiceNo": ["536365", "C536379"],
+            "StockCode": ["85123", "22423"],
+            "Description": ["WHITE HANGING HEART", "REGENCY CAKESTAND"],
+            "Quantity": [6, -1],
+            "InvoiceDate": ["12/1/2010 8:26", "12/1/2010 9:41"],
+            "UnitPrice": [2.55, 12.75],
+            "CustomerID": [17850.0, 14527.0],
+            "Country": ["United Kingdom", "United Kingdom"],
+        })
+        cache_dir = tmp_path / "cache"
+        extract.cache_snapshot(snapshot, cache_dir, dataset_id=352)
+
+        config_path = tmp_path / "config.yaml"
+        config_path.write_text(yaml.safe_dump({
+            "paths": {
+                "raw_data": str(tmp_path / "raw.csv"),
+                "profiling_report": str(tmp_path / "profile.csv"),
+            },
+            "extract": {"cache_dir": str(cache_dir), "offline": True},
+        }))
+
+        raw_path = extract.download_dataset(config_path=config_path)
+        assert pd.read_csv(raw_path)["InvoiceNo"].tolist() == ["536365", "C536379"]
+        assert (tmp_path / "profile.csv").exists()
+
+        # A second run with unchanged content leaves the CSV untouched
+        mtime = raw_path.stat().st_mtime_ns
+        extract.download_dataset(config_path=config_path)
+        assert raw_path.stat().st_mtime_ns == mtime
+
+    @pytest.mark.it("should read a directory of mixed CSV and Parquet exports in file order with the raw schema")
+    def test_local_file_sources(self, tmp_path):
+        import pandas as pd
+        from etl.sources import iter_source_frames
+
+        rows = pd.DataFrame({
+            "InvoiceNo": ["536365", "536366", "C536379"],
+            "StockCode": ["85123A", "71053", "22423"],
+            "Description": ["WHITE HANGING HEART", "WHITE METAL LANTERN", "REGENCY CAKESTAND"],
+            "Quantity": [6, 6, -1],
+            "InvoiceDate": ["12/1/2010 8:26", "12/1/2010 8:28", "12/1/2010 9:41"],
+            "UnitPrice": [2.55, 3.39, 12.75],
+            "CustomerID": [17850.0, None, 14527.0],
+            "Country": ["United Kingdom", "United Kingdom", "France"],
+        })
+        rows.iloc[:2].to_csv(tmp_path / "part_1.csv", index=False)
+        rows.iloc[2:].to_parquet(tmp_path / "part_2.parquet")
+        (tmp_path / "notes.txt").write_text("ignored")
+
+        frames = list(iter_source_frames(tmp_path, max_workers=2))
+        assert [len(f) for f in frames] == [2, 1]
+        for frame in frames:
+            assert frame["StockCode"].dtype == "category"
+            assert frame["Quantity"].dtype == "int32"
+        assert frames[1]["StockCode"].tolist() == ["22423"]
+
+        with pytest.raises(ValueError):
+            list(iter_source_frames(tmp_path / "*"))
+
+    @pytest.mark.it("should keep rows from CSV and Parquet exports whose dates are stored differently")
+    def test_mixed_source_dates(self, tmp_path):
+        import pandas as pd
+        from etl.extract import ingest_local_files
+        from etl.transform import clean_data
+
+        rows = pd.DataFrame({
+            "InvoiceNo": ["536365", "536366"],
+            "StockCode": ["85123", "71053"],
+            "Description": ["WHITE HANGING HEART", "WHITE METAL LANTERN"],
+            "Quantity": [6, 6],
+            "InvoiceDate": ["12/1/2010 8:26", "12/1/2010 8:28"],
+            "UnitPrice": [2.55, 3.39],
+            "CustomerID": [17850.0, 17850.0],
+            "Country": ["United Kingdom", "United Kingdom"],
+        })
+        rows.iloc[:1].to_csv(tmp_path / "part_1.csv", index=False)
+        # Parquet and Excel exports store real datetimes
+        rows.iloc[1:].assign(InvoiceDate=pd.to_datetime(["2010-12-01 08:28"])).to_parquet(tmp_path / "part_2.parquet")
+        config = {"source": {"path": str(tmp_path)}, "paths": {"profiling_report": str(tmp_path / "profile.csv")}}
+
+        raw = ingest_local_files(config, save_raw=False)
+        cleaned = clean_data(raw)
+        assert len(cleaned) == 2
+        assert cleaned["InvoiceDate"].tolist() == list(pd.to_datetime(["2010-12-01 08:26", "2010-12-01 08:28"]))
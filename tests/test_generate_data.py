@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+import pandas as pd
+from benchmarks.generate_data import generate_chunk, generate_raw_data
+
+
+@pytest.mark.describe("Synthetic data generator tests")
+class TestGenerateData:
+
+    @pytest.mark.it("should generate the requested rows with about 1% exact duplicates")
+    def test_generate_chunk_has_duplicates(self):
+        df = generate_chunk(np.random.default_rng(0), 10_000, 536365)
+
+        assert len(df) == 10_000
+        assert df.duplicated().sum() > 0
+        assert df.duplicated().sum() <= 100
+        invoices = df["InvoiceNo"].str.lstrip("C").astype(int)
+        assert invoices.is_monotonic_increasing, "Invoices should stay in file order"
+
+    @pytest.mark.it("should keep dates in invoice order across chunks")
+    def test_generate_raw_data_dates_continue(self, tmp_path):
+        path = generate_raw_data(3_000, tmp_path / "raw.csv", chunk_rows=1_000)
+        df = pd.read_csv(path, dtype={"InvoiceNo": str})
+
+        assert len(df) == 3_000
+        dates = pd.to_datetime(df["InvoiceDate"], format="%m/%d/%Y %H:%M")
+        assert dates.is_monotonic_increasing, "Later chunks should not restart the dates"
+        assert dates.iloc[0] == pd.Timestamp("2010-12-01 08:00")
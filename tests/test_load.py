@@ -0,0 +1,256 @@
+import sqlite3
+import pytest
+import pandas as pd
+import pyarrow.parquet as pq
+from etl import load
+from etl.aggregate import read_rollups
+from etl.load import (
+    prepare_fact_table,
+    prepare_outliers_table,
+    build_dimensions,
+    apply_dimension_keys,
+    upsert_dimensions,
+    save_fact_sales,
+)
+from etl.warehouse import read_fact_sales, read_publish_marker
+from etl.watermark import read_incremental_watermark, write_watermark
+
+
+@pytest.mark.describe("Load tests")
+class TestLoad:
+
+    @pytest.mark.it("should match cancellations to the sale they reverse and net the quantities")
+    def test_match_cancellations(self, transform_outputs):
+        transactions, cancellations, _ = transform_outputs
+        orphan = cancellations.assign(InvoiceNo="C100006", CustomerID="12346", Quantity=-1)
+        fact = prepare_fact_table(transactions, pd.concat([cancellations, orphan])).set_index("InvoiceNo")
+
+        # C100002 reverses 4 of the 10 units sold on 100001 the day before
+        assert fact.loc["C100002", "matched_invoice_no"] == "100001"
+        assert fact.loc["C100002", "net_quantity"] == 0
+        assert fact.loc["100001", "net_quantity"] == 6
+        # Customer 12346 never bought product 12345
+        assert fact.loc["C100006", "is_orphan"] and pd.isna(fact.loc["C100006", "matched_invoice_no"])
+        assert fact.loc["C100006", "net_quantity"] == -1
+        assert fact["net_quantity"].sum() == (fact["Quantity"] * fact["sign"]).sum()
+
+    @pytest.mark.it("should build dimensions and replace natural keys with int32 surrogate keys")
+    def test_dimensions_and_keys(self, transform_outputs):
+        transactions, cancellations, outliers = transform_outputs
+        fact = prepare_fact_table(transactions, cancellations)
+        quarantined = prepare_outliers_table(outliers)
+
+        dims = build_dimensions(fact, quarantined)
+        fact_keyed = apply_dimension_keys(fact, dims)
+        outliers_keyed = apply_dimension_keys(quarantined, dims)
+
+        dim_customers = dims["dim_customers"]
+        customers = dim_customers[dim_customers["is_current"]].set_index("customer_id")
+        products = dims["dim_products"][dims["dim_products"]["is_current"]].set_index("stock_code")
+
+        # Current versions carry the attributes of the most recent transaction
+        assert customers.loc["12345", "country"] == "Germany"
+        assert products.loc["12345", "description"] == "Widget A v2"
+        assert dims["dim_time"]["date_key"].tolist() == [20220101, 20220102, 20220103, 20220104]
+
+        # Customer 12345 moved from the UK to Germany: the UK version is closed when the German one starts
+        history = dim_customers[dim_customers["customer_id"] == "12345"]
+        assert history["country"].tolist() == ["UK", "Germany"]
+        assert history["valid_to"].iloc[0] == history["valid_from"].iloc[1] == pd.Timestamp("2022-01-04 12:00")
+        assert history["is_current"].tolist() == [False, True]
+        assert pd.isna(history["valid_to"].iloc[1])
+
+        # Facts join to the version valid at their transaction time
+        assert fact_keyed["customer_key"].dtype == "int32"
+        assert fact_keyed["product_key"].dtype == "int32"
+        versions = dict(zip(history["country"], history["customer_key"]))
+        by_invoice = fact_keyed.set_index("invoice_no")["customer_key"]
+        assert by_invoice[["100001", "C100002"]].tolist() == [versions["UK"], versions["UK"]]
+        assert by_invoice["100004"] == versions["Germany"]
+        assert outliers_keyed["product_key"].iloc[0] == products.loc["54321", "product_key"]
+
+        # Cancellations keep a positive quantity and a negative sign
+        cancel = fact_keyed[fact_keyed["transaction_type"] == "CANCEL"].iloc[0]
+        assert cancel["quantity"] == 4 and cancel["sign"] == -1
+
+    @pytest.mark.it("should add versions only for changed and new keys when upserting dimensions")
+    def test_upsert_dimensions(self, transform_outputs):
+        transactions, cancellations, outliers = transform_outputs
+        existing = build_dimensions(prepare_fact_table(transactions.iloc[:2], cancellations))
+
+        batch_rows = transactions.iloc[2:].assign(Country="Spain")
+        batch = build_dimensions(prepare_outliers_table(pd.concat([batch_rows, outliers])))
+        merged, indexes = upsert_dimensions(existing, batch)
+
+        customers = merged["dim_customers"]
+        old_key = existing["dim_customers"].set_index("customer_id").loc["12345", "customer_key"]
+        old_version = customers[customers["customer_key"] == old_key].iloc[0]
+        assert old_version["country"] == "UK" and not old_version["is_current"]
+        assert old_version["valid_to"] == pd.Timestamp("2022-01-04 12:00")
+
+        current = customers[customers["is_current"]].set_index("customer_id")
+        max_key = existing["dim_customers"]["customer_key"].max()
+        assert current.loc["12345", "country"] == "Spain"
+        assert current.loc[["12345", "12347"], "customer_key"].tolist() == [max_key + 1, max_key + 2]
+        assert current.loc["12346", "customer_key"] == existing["dim_customers"].set_index("customer_id").loc[
+            "12346", "customer_key"]
+        assert indexes["dim_customers"].set_index("customer_id")["customer_key"].to_dict() == \
+            current["customer_key"].to_dict()
+        assert merged["dim_time"]["date_key"].is_unique
+
+        # Unchanged attributes add no versions
+        again, _ = upsert_dimensions(merged, batch, indexes)
+        assert len(again["dim_customers"]) == len(customers)
+        assert len(again["dim_products"]) == len(merged["dim_products"])
+
+    @pytest.mark.it("should write a partitioned fact_sales dataset and read back a single month or type")
+    def test_partitioned_fact_sales(self, tmp_path, transform_outputs):
+        transactions, cancellations, _ = transform_outputs
+        fact = prepare_fact_table(transactions, cancellations)
+        fact.loc[0, "transaction_datetime"] = pd.Timestamp("2021-12-31 10:00")
+        fact_keyed = apply_dimension_keys(fact, build_dimensions(fact))
+
+        options = {"partition_fact_sales": True, "partition_by_transaction_type": True, "row_group_size": 2}
+        save_fact_sales(fact_keyed, tmp_path, "fact_sales.parquet", options)
+
+        assert (tmp_path / "fact_sales" / "year=2022" / "month=1" / "transaction_type=CANCEL").is_dir()
+        assert len(read_fact_sales(tmp_path)) == len(fact_keyed)
+
+        january = read_fact_sales(tmp_path, filters=[("year", "=", 2022), ("month", "=", 1)])
+        assert len(january) == 3
+        cancels = read_fact_sales(tmp_path, filters=[("transaction_type", "=", "CANCEL")], columns=["invoice_no"])
+        assert cancels["invoice_no"].tolist() == ["C100002"]
+
+    @pytest.mark.it("should repeat a failed incremental load without duplicating rows or rollups")
+    def test_incremental_load_is_repeatable(self, tmp_path, monkeypatch, transform_outputs):
+        transactions, cancellations, outliers = transform_outputs
+        config = {
+            "paths": {
+                "warehouse": str(tmp_path / "warehouse"),
+                "state": str(tmp_path / "warehouse" / "_state.json"),
+                "fact_sales": "fact_sales.parquet",
+                "outliers_parquet": "outliers.parquet",
+                "dim_customers": "dim_customers.parquet",
+                "dim_products": "dim_products.parquet",
+                "dim_time": "dim_time.parquet",
+            },
+            "pipeline": {"incremental": True},
+            "warehouse_db": {"enabled": True, "path": str(tmp_path / "warehouse.sqlite")},
+        }
+        first, second = [
+            {name: df[(df["InvoiceDate"] < "2022-01-03") == is_first] for name, df in
+             [("transactions", transactions), ("cancellations", cancellations), ("outliers", outliers)]}
+            for is_first in (True, False)
+        ]
+        load.main(first, config)
+
+        def fail(*args, **kwargs):
+            raise OSError("disk full")
+
+        # Fail after the fact part file is written, then after the watermark is stored, then resume
+        for step in ["write_pending_manifest", "publish"]:
+            with monkeypatch.context() as patched:
+                patched.setattr(load, step, fail)
+                with pytest.raises(OSError):
+                    load.main(second, config)
+        load.main(second, config)
+
+        warehouse_dir = tmp_path / "warehouse"
+        fact = read_fact_sales(warehouse_dir)
+        assert len(fact) == len(transactions) + len(cancellations)
+        assert fact["invoice_no"].is_unique
+        rollups = read_rollups(warehouse_dir / "rollups")
+        revenue = (fact["quantity"] * fact["unit_price"] * fact["sign"]).sum()
+        assert rollups["daily_sales"]["revenue"].sum() == pytest.approx(revenue)
+        assert rollups["monthly_sales"]["invoices"].sum() == len(transactions)
+        parts = sorted((warehouse_dir / "outliers").glob("*.parquet"))
+        assert sum(pq.read_metadata(part).num_rows for part in parts) == len(outliers)
+        assert not (warehouse_dir / "_pending").exists()
+        assert read_publish_marker(warehouse_dir)["watermark"]["InvoiceNo"] == "100005"
+
+        conn = sqlite3.connect(tmp_path / "warehouse.sqlite")
+        assert conn.execute("SELECT COUNT(*) FROM fact_sales").fetchone() == (len(fact),)
+        assert conn.execute("SELECT COUNT(*) FROM outliers").fetchone() == (len(outliers),)
+        conn.close()
+
+    @pytest.mark.it("should rebuild dimensions without version history from the full history on an incremental run")
+    def test_incremental_load_upgrades_unversioned_dimensions(self, tmp_path, transform_outputs):
+        transactions, cancellations, outliers = transform_outputs
+        warehouse_dir = tmp_path / "warehouse"
+        paths = {
+            "warehouse": str(warehouse_dir),
+            "state": str(warehouse_dir / "_state.json"),
+            "fact_sales": "fact_sales.parquet",
+            "outliers_parquet": "outliers.parquet",
+            "dim_customers": "dim_customers.parquet",
+            "dim_products": "dim_products.parquet",
+            "dim_time": "dim_time.parquet",
+        }
+        # A warehouse loaded before the dimensions were versioned
+        warehouse_dir.mkdir()
+        pd.DataFrame({"customer_key": [1], "customer_id": ["12345"], "country": ["UK"]}).to_parquet(
+            warehouse_dir / "dim_customers.parquet"
+        )
+        write_watermark(warehouse_dir / "_state.json", {"InvoiceDate": "2022-01-02T09:30:00", "InvoiceNo": "C100002"})
+        assert read_incremental_watermark(paths) is None
+
+        datasets = {"transactions": transactions, "cancellations": cancellations, "outliers": outliers}
+        load.main(datasets, {"paths": paths, "pipeline": {"incremental": True}})
+
+        customers = pd.read_parquet(warehouse_dir / "dim_customers.parquet")
+        assert customers["is_current"].sum() == customers["customer_id"].nunique()
+        assert len(read_fact_sales(warehouse_dir)) == len(transactions) + len(cancellations)
+        assert read_incremental_watermark(paths)["InvoiceNo"] == "100005"
+
+    @pytest.mark.it("should match cancellations to sales of earlier incremental batches and restate those sales")
+    @pytest.mark.parametrize("parquet", [{}, {"partition_fact_sales": True, "partition_by_transaction_type": True}])
+    def test_incremental_load_matches_earlier_sales(self, tmp_path, monkeypatch, transform_outputs, parquet):
+        transactions, cancellations, outliers = transform_outputs
+        warehouse_dir = tmp_path / "warehouse"
+        config = {
+            "paths": {
+                "warehouse": str(warehouse_dir),
+                "state": str(warehouse_dir / "_state.json"),
+                "fact_sales": "fact_sales.parquet",
+                "outliers_parquet": "outliers.parquet",
+                "dim_customers": "dim_customers.parquet",
+                "dim_products": "dim_products.parquet",
+                "dim_time": "dim_time.parquet",
+            },
+            "pipeline": {"incremental": True},
+            "parquet": parquet,
+            "warehouse_db": {"enabled": True, "path": str(tmp_path / "warehouse.sqlite")},
+        }
+        # Sale 100001 (10 units) in the first batch; two cancellations of it, 4 + 8 units, in the second
+        more = cancellations.assign(InvoiceNo="C100006", Quantity=-8, InvoiceDate=pd.Timestamp("2022-01-02 10:00"))
+        load.main({"transactions": transactions.iloc[:1], "cancellations": cancellations.iloc[:0],
+                   "outliers": outliers.iloc[:0]}, config)
+        second = {"transactions": transactions.iloc[1:], "cancellations": pd.concat([cancellations, more]),
+                  "outliers": outliers}
+
+        def fail(*args, **kwargs):
+            raise OSError("disk full")
+
+        # A failed attempt leaves the first batch's sale as it was, so the retry restates it once
+        with monkeypatch.context() as patched:
+            patched.setattr(load, "write_pending_manifest", fail)
+            with pytest.raises(OSError):
+                load.main(second, config)
+        load.main(second, config)
+
+        fact = read_fact_sales(warehouse_dir).set_index("invoice_no")
+        assert fact.loc["100001", "net_quantity"] == 0
+        assert fact.loc[["C100002", "C100006"], "matched_invoice_no"].tolist() == ["100001", "100001"]
+        assert fact.loc[["C100002", "C100006"], "net_quantity"].tolist() == [0, -2]  # only 6 units were left
+        assert not fact["is_orphan"].any()
+        assert fact["net_quantity"].sum() == (fact["quantity"] * fact["sign"]).sum()
+
+        conn = sqlite3.connect(tmp_path / "warehouse.sqlite")
+        net = dict(conn.execute("SELECT invoice_no, net_quantity FROM fact_sales").fetchall())
+        conn.close()
+        assert net == fact["net_quantity"].to_dict()
+
+        # The latest sale of each customer and product stays open for later batches
+        open_sales = pd.read_parquet(warehouse_dir / "open_sales.parquet").set_index(["customer_id", "stock_code"])
+        assert open_sales.loc[("12345", "12345"), ["invoice_no", "remaining"]].tolist() == ["100004", 2]
+        assert len(open_sales) == 2
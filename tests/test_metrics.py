@@ -0,0 +1,79 @@
+import json
+import pandas as pd
+import pytest
+from src.helpers import metrics
+
+
+@pytest.fixture
+def metrics_file(tmp_path):
+    path = tmp_path / "logs" / "metrics.jsonl"
+    metrics.setup_metrics(str(path))
+    yield path
+    metrics.disable_metrics()
+
+
+def read_lines(path) -> list:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.mark.describe("Metrics tests")
+class TestMetrics:
+
+    @pytest.mark.it("should write one JSON line per step with its parent, rows and bytes written")
+    def test_track(self, metrics_file):
+        with metrics.track("stage", rows_in=10) as stage:
+            with metrics.track("write") as step:
+                metrics.record_bytes_written(2048)
+                step["rows_out"] = 4
+            metrics.record_bytes_written(1024)
+            stage["rows_out"] = 8
+
+        step, stage = read_lines(metrics_file)
+        assert set(stage) == {
+            "id", "parent_id", "step", "parent", "started_at", "rows_in", "rows_out",
+            "bytes_written", "status", "wall_s", "cpu_s", "peak_rss_mb",
+        }
+        assert (step["step"], step["parent"], step["parent_id"]) == ("write", "stage", stage["id"])
+        assert (stage["rows_in"], stage["rows_out"], stage["bytes_written"]) == (10, 8, 3072)
+        assert (step["rows_in"], step["rows_out"], step["bytes_written"]) == (None, 4, 2048)
+        assert stage["status"] == step["status"] == "ok"
+        assert stage["peak_rss_mb"] > 0 and stage["wall_s"] >= step["wall_s"]
+
+        table = metrics.summary_table().splitlines()
+        assert table[2].split()[0] == "stage" and table[3].startswith("  write")
+
+    @pytest.mark.it("should record failed steps and re-raise their errors")
+    def test_track_error(self, metrics_file):
+        with pytest.raises(ValueError):
+            with metrics.track("broken") as record:
+                record["status"] = "skipped"
+                raise ValueError("boom")
+        assert read_lines(metrics_file)[0]["status"] == "error"
+
+    @pytest.mark.it("should count the rows of the main result of functions returning several frames")
+    def test_instrumented(self, metrics_file):
+        @metrics.instrumented()
+        def split(df):
+            return df[df["value"] > 1], df[df["value"] <= 1]
+
+        @metrics.instrumented("datasets")
+        def datasets(df):
+            return {"kept": df.head(2), "dropped": df.tail(1)}
+
+        df = pd.DataFrame({"value": [1, 2, 3, 4]})
+        split(df)
+        datasets(df)
+        first, second = read_lines(metrics_file)
+        assert (first["step"], first["rows_in"], first["rows_out"]) == ("split", 4, 3)
+        assert (second["step"], second["rows_in"], second["rows_out"]) == ("datasets", 4, 3)
+        assert metrics.count_rows("not a frame") is None and metrics.count_rows([]) is None
+
+    @pytest.mark.it("should stop the RSS sampler thread once no step is running")
+    def test_sampler_stops(self, metrics_file):
+        with metrics.track("outer"):
+            with metrics.track("inner"):
+                sampler = metrics._sampler
+                assert sampler is not None and sampler.is_alive()
+        sampler.join(timeout=1)
+        assert not sampler.is_alive()
+        assert metrics._sampler is None and not metrics._sampled
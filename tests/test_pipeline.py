@@ -0,0 +1,119 @@
+import pandas as pd
+import pytest
+from etl.checkpoint import open_checkpoint_table, read_checkpoint, read_manifest
+from etl.pipeline import Stage, run_dag
+
+
+def make_stages(calls: list, output_dir, fail: set = frozenset()):
+    """extract → transform → (validate, load), recording which stages ran."""
+    def stage(name, result):
+        def run(inputs):
+            calls.append(name)
+            if name in fail:
+                raise RuntimeError(f"{name} failed")
+            output = pd.DataFrame({"value": [result(inputs)]})
+            (output_dir / f"{name}.out").write_text(str(output["value"].iloc[0]))
+            return output
+        return run
+
+    def value(inputs, name):
+        return int(inputs[name]["value"].iloc[0])
+
+    return [
+        Stage("extract", stage("extract", lambda i: 10), outputs=lambda: [output_dir / "source.csv"], cacheable=False),
+        Stage("transform", stage("transform", lambda i: value(i, "extract") * 2), deps=("extract",),
+              config_keys=("outlier_thresholds",)),
+        Stage("validate", stage("validate", lambda i: value(i, "transform") + 1), deps=("transform",),
+              config_keys=("validation",), outputs=lambda: [output_dir / "validate.out"]),
+        Stage("load", stage("load", lambda i: value(i, "transform") + 2), deps=("transform",),
+              config_keys=("parquet",), outputs=lambda: [output_dir / "load.out"]),
+    ]
+
+
+@pytest.mark.describe("Pipeline DAG tests")
+class TestPipeline:
+
+    @pytest.mark.it("should skip unchanged stages and rerun only the stages downstream of a change")
+    def test_skip_unchanged_stages(self, tmp_path):
+        (tmp_path / "source.csv").write_text("raw")
+        cache_dir = tmp_path / "stages"
+        config = {"outlier_thresholds": {"quantity": 5000}, "validation": {}, "parquet": {}}
+
+        calls = []
+        run_dag(make_stages(calls, tmp_path), config, cache_dir)
+        assert sorted(calls) == ["extract", "load", "transform", "validate"]
+
+        calls.clear()
+        status = run_dag(make_stages(calls, tmp_path), config, cache_dir)
+        assert calls == ["extract"]
+        assert status == {"extract": "ran", "transform": "skipped", "validate": "skipped", "load": "skipped"}
+
+        # A load-only config change reruns load from the checkpointed transform output
+        calls.clear()
+        run_dag(make_stages(calls, tmp_path), {**config, "parquet": {"compression": "zstd"}}, cache_dir)
+        assert calls == ["extract", "load"]
+        assert (tmp_path / "load.out").read_text() == "22"
+
+        # A threshold change reruns transform and everything after it
+        calls.clear()
+        config = {**config, "parquet": {"compression": "zstd"}, "outlier_thresholds": {"quantity": 4000}}
+        run_dag(make_stages(calls, tmp_path), config, cache_dir)
+        assert sorted(calls) == ["extract", "load", "transform", "validate"]
+
+        # Changed source data changes the extract fingerprint
+        calls.clear()
+        (tmp_path / "source.csv").write_text("new raw data")
+        run_dag(make_stages(calls, tmp_path), config, cache_dir)
+        assert len(calls) == 4
+
+    @pytest.mark.it("should resume a failed run after the stages it completed, from their checkpoints")
+    def test_resume_failed_run(self, tmp_path):
+        (tmp_path / "source.csv").write_text("raw")
+        cache_dir = tmp_path / "stages"
+        config = {"outlier_thresholds": {}, "validation": {}, "parquet": {}}
+
+        calls = []
+        with pytest.raises(RuntimeError, match="load failed"):
+            run_dag(make_stages(calls, tmp_path, fail={"load"}), config, cache_dir)
+        manifest = read_manifest(cache_dir / "transform")
+        assert manifest["datasets"] == {"output": {"file": "output.arrow", "rows": 1}}
+        assert open_checkpoint_table(cache_dir / "transform", "output").column("value").to_pylist() == [20]
+        assert read_manifest(cache_dir / "load") is None
+
+        # Resuming reuses extract and transform as they are, even though the source changed
+        calls.clear()
+        (tmp_path / "source.csv").write_text("changed after the failure")
+        status = run_dag(make_stages(calls, tmp_path), config, cache_dir, resume=True)
+        assert calls == ["load"]
+        assert status == {"extract": "resumed", "transform": "resumed", "validate": "resumed", "load": "ran"}
+        assert (tmp_path / "load.out").read_text() == "22"
+        pd.testing.assert_frame_equal(read_checkpoint(cache_dir / "load"), pd.DataFrame({"value": [22]}))
+
+        # A new run checks fingerprints again
+        calls.clear()
+        run_dag(make_stages(calls, tmp_path), config, cache_dir)
+        assert len(calls) == 4
+
+    @pytest.mark.it("should run a range of stages from the checkpoints of the stages before it")
+    def test_stage_range(self, tmp_path):
+        (tmp_path / "source.csv").write_text("raw")
+        cache_dir = tmp_path / "stages"
+        config = {"outlier_thresholds": {}, "validation": {}, "parquet": {}}
+
+        calls = []
+        with pytest.raises(FileNotFoundError, match="transform has no checkpoint"):
+            run_dag(make_stages(calls, tmp_path), config, cache_dir, start="load")
+        assert calls == []
+
+        status = run_dag(make_stages(calls, tmp_path), config, cache_dir, stop="transform")
+        assert calls == ["extract", "transform"]
+        assert status == {"extract": "ran", "transform": "ran"}
+
+        calls.clear()
+        status = run_dag(make_stages(calls, tmp_path), config, cache_dir, start="load", force=True)
+        assert calls == ["load"]
+        assert status == {"transform": "reused", "load": "ran"}
+        assert (tmp_path / "load.out").read_text() == "22"
+
+        with pytest.raises(ValueError, match="Unknown stage"):
+            run_dag(make_stages(calls, tmp_path), config, cache_dir, start="report")
@@ -0,0 +1,39 @@
+import pytest
+import numpy as np
+import pandas as pd
+from etl.profiling import ColumnProfile, profile_frames, profile_report
+
+
+@pytest.mark.describe("Profiling tests")
+class TestProfiling:
+
+    @pytest.mark.it("should profile in chunks and merge partial profiles to the single-pass result")
+    def test_chunked_and_merged_profiles(self):
+        df = pd.DataFrame({
+            "StockCode": pd.Series(["85123A", "71053", None, "85123A", "22423", "71053"], dtype="category"),
+            "Quantity": np.array([6, 8, 2, 6, -1, 32], dtype="int32"),
+        })
+        chunks = [df.iloc[:4], df.iloc[4:]]
+        report = profile_report(profile_frames(chunks)).set_index("column")
+
+        assert report.loc["StockCode", "num_missing"] == 1
+        assert report.loc["StockCode", "num_unique"] == 3
+        assert report.loc["StockCode", "sample_values"] == ["85123A", "71053", "22423"]
+        assert report.loc["Quantity", "min"] == -1 and report.loc["Quantity", "max"] == 32
+        assert report.loc["Quantity", "p50"] == df["Quantity"].median()
+
+        left = ColumnProfile(seed=1).update(df["Quantity"].iloc[:3])
+        right = ColumnProfile(seed=2).update(df["Quantity"].iloc[3:])
+        merged = left.merge(right)
+        assert merged.num_unique() == df["Quantity"].nunique()
+        assert merged.quantiles() == df["Quantity"].quantile([0.25, 0.5, 0.75]).tolist()
+
+    @pytest.mark.it("should estimate distinct counts approximately in fixed memory")
+    def test_approximate_distinct_count(self):
+        values = pd.Series(np.arange(200_000).astype(str))
+        profile = ColumnProfile(approximate=True, sample_size=100)
+        for start in range(0, len(values), 50_000):
+            profile.update(values.iloc[start:start + 50_000])
+
+        assert profile.num_unique() == pytest.approx(200_000, rel=0.03)
+        assert len(profile.hashes) == 0
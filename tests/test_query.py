@@ -0,0 +1,78 @@
+import json
+import threading
+import urllib.request
+import pytest
+from etl.aggregate import build_rollups
+from etl.load import prepare_fact_table, build_dimensions, apply_dimension_keys, save_parquet
+from etl.query import WarehouseQueries, serve
+from etl.warehouse import publish
+
+PATHS = {
+    "dim_customers": "dim_customers.parquet",
+    "dim_products": "dim_products.parquet",
+    "fact_sales": "fact_sales.parquet",
+    "rollups": "rollups",
+}
+
+
+def write_warehouse(warehouse_dir, transactions, cancellations):
+    fact = prepare_fact_table(transactions, cancellations)
+    dims = build_dimensions(fact)
+    fact = apply_dimension_keys(fact, dims)
+    for name, dim in dims.items():
+        save_parquet(dim, warehouse_dir, f"{name}.parquet")
+    for name, rollup in build_rollups(fact, dims["dim_customers"]).items():
+        save_parquet(rollup, warehouse_dir / "rollups", f"{name}.parquet")
+    publish(warehouse_dir, list(dims))
+
+
+@pytest.mark.describe("Query service tests")
+class TestQuery:
+
+    @pytest.mark.it("should answer from cached rollups until load publishes a new warehouse version")
+    def test_cached_queries(self, tmp_path, transform_outputs):
+        transactions, cancellations, _ = transform_outputs
+        write_warehouse(tmp_path, transactions, cancellations)
+        queries = WarehouseQueries(tmp_path, PATHS, ttl=60)
+
+        daily = queries.revenue_by_period("day", start="2022-01-02", end="2022-01-03")
+        assert daily["date_key"].tolist() == [20220102, 20220103]
+        assert daily["revenue"].tolist() == [-10.0, 20.0]
+        top = queries.top_customers(1)
+        assert top[["customer_id", "country", "revenue"]].values.tolist() == [["12345", "Germany", 21.0]]
+        rate = queries.cancellation_rate()
+        assert rate["cancellation_rate"].tolist() == [0.25]  # 1 of 4 invoices
+        assert queries.revenue_by_product()["stock_code"].tolist() == ["12345", "99999"]
+
+        # Repeated queries are served from the cache, and results are copies
+        top["revenue"] = 0
+        assert queries.top_customers(1)["revenue"].tolist() == [21.0]
+        assert queries.cache.hits == 1
+
+        # A new publish invalidates the loaded tables and the cache
+        write_warehouse(tmp_path, transactions.iloc[:1], cancellations.iloc[:0])
+        assert queries.cancellation_rate()["cancellation_rate"].tolist() == [0.0]
+        assert queries.revenue_by_country()["revenue"].tolist() == [25.0]
+
+        with pytest.raises(ValueError):
+            queries.revenue_by_period("week")
+
+    @pytest.mark.it("should serve queries as JSON over a local HTTP endpoint")
+    def test_http_endpoint(self, tmp_path, transform_outputs):
+        transactions, cancellations, _ = transform_outputs
+        write_warehouse(tmp_path, transactions, cancellations)
+        server = serve(WarehouseQueries(tmp_path, PATHS), port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_port}"
+        try:
+            with urllib.request.urlopen(f"{base}/revenue?period=month") as response:
+                assert json.load(response) == [
+                    {"year": 2022, "month": 1, "revenue": 41.0, "quantity": 13, "invoices": 3, "cancelled_invoices": 1}
+                ]
+            with urllib.request.urlopen(f"{base}/cancellation-rate?by=country") as response:
+                assert [row["country"] for row in json.load(response)] == ["France", "Germany", "UK"]
+            with pytest.raises(urllib.error.HTTPError, match="400"):
+                urllib.request.urlopen(f"{base}/revenue?period=week")
+        finally:
+            server.shutdown()
+            server.server_close()
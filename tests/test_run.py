@@ -0,0 +1,72 @@
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+import run
+
+
+@pytest.mark.describe("Command-line tests")
+class TestRun:
+
+    @pytest.mark.it("should parse subcommands and stage ranges without importing the etl stack")
+    def test_cli_arguments(self):
+        args = run.parse_args(["--from", "transform", "--to", "load", "--force"])
+        assert (args.command, args.start, args.stop, args.force, args.resume) == ("run", "transform", "load", True, False)
+        assert run.parse_args(["serve", "--port", "9000"]).port == 9000
+        with pytest.raises(SystemExit):
+            run.parse_args(["run", "--from", "report"])
+
+        # Importing the CLI and parsing arguments must not pull in pandas
+        code = "import sys, run; run.parse_args(['--from', 'load']); print('pandas' in sys.modules)"
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=Path(run.__file__).parent, capture_output=True, text=True, check=True
+        )
+        assert result.stdout.strip() == "False"
+
+    @pytest.mark.it("should skip extract while the local source files are unchanged")
+    def test_extract_skipped_for_unchanged_files(self, tmp_path):
+        from etl.pipeline import run_dag
+
+        incoming = tmp_path / "incoming"
+        incoming.mkdir()
+        export = incoming / "2011-12.csv"
+        export.write_text(
+            "InvoiceNo,StockCode,Description,Quantity,InvoiceDate,UnitPrice,CustomerID,Country\n"
+            "536365,85123,WHITE HEART,6,12/1/2010 8:26,2.55,17850,United Kingdom\n"
+        )
+        config = {
+            "paths": {
+                "raw_data": str(tmp_path / "raw.csv"),
+                "profiling_report": str(tmp_path / "profile.csv"),
+                "stage_cache": str(tmp_path / "cache"),
+                "warehouse": str(tmp_path / "warehouse"),
+            },
+            "source": {"type": "files", "path": str(incoming), "max_workers": 1},
+        }
+
+        def run_extract():
+            return run_dag(run.build_stages(config), config, tmp_path / "cache", stop="extract")["extract"]
+
+        assert run_extract() == "ran"
+        assert run_extract() == "skipped"
+        export.write_text(export.read_text() + "536366,22633,HAND WARMER,6,12/1/2010 8:28,1.85,17850,United Kingdom\n")
+        assert run_extract() == "ran"
+
+    @pytest.mark.it("should fingerprint only the config entries a stage reads")
+    def test_stage_config_keys(self, tmp_path):
+        from etl.pipeline import stage_fingerprint
+
+        def fingerprints(config):
+            stages = {stage.name: stage for stage in run.build_stages(config)}
+            return {name: stage_fingerprint(stage, config, {"extract": "x", "transform": "y"}) for name, stage in stages.items()}
+
+        paths = {name: str(tmp_path / name) for name in ["raw_data", "state", "warehouse", *run.DATASETS]}
+        config = {"paths": paths, "transform": {"mode": "batch"}, "source": {"type": "files", "path": str(tmp_path)}}
+        before = fingerprints(config)
+
+        moved = fingerprints({**config, "paths": {**paths, "warehouse": str(tmp_path / "elsewhere")}})
+        assert moved["transform"] == before["transform"]
+        assert moved["load"] != before["load"]
+
+        streaming = fingerprints({**config, "transform": {"mode": "streaming"}})
+        assert streaming["extract"] != before["extract"]
@@ -0,0 +1,60 @@
+import json
+import pytest
+from benchmarks import run_benchmarks
+from benchmarks.run_benchmarks import compare_with_baseline
+
+
+def result(stage, wall_s, peak_rss_mb, size="100k"):
+    return {"size": size, "stage": stage, "wall_s": wall_s, "peak_rss_mb": peak_rss_mb}
+
+
+@pytest.mark.describe("Benchmark runner tests")
+class TestRunBenchmarks:
+
+    @pytest.mark.it("should report stages slower or bigger than the baseline beyond the tolerance")
+    def test_compare_with_baseline(self):
+        baseline = [
+            result("transform", 1.0, 100.0),
+            result("load", 1.0, 100.0),
+            result("validate", 1.0, 100.0),
+            result("query", 0.01, 50.0),
+        ]
+        results = [
+            result("transform", 1.19, 119.0),  # within 20%
+            result("load", 1.3, 100.0),        # slower
+            result("validate", 1.0, 130.0),    # bigger
+            result("query", 0.05, 50.0),       # 5x slower, but below min_seconds
+            result("new_stage", 9.0, 900.0),   # not in the baseline
+            result("load", 9.0, 100.0, size="1M"),
+        ]
+        regressions = compare_with_baseline(results, baseline, tolerance=0.2, min_seconds=0.05)
+
+        assert [(r["size"], r["stage"]) for r in regressions] == [("100k", "load"), ("100k", "validate")]
+        assert regressions[0]["wall_s"] == [1.0, 1.3]
+        assert regressions[1]["peak_rss_mb"] == [100.0, 130.0]
+        assert compare_with_baseline(results, baseline, tolerance=0.5, min_seconds=0.05) == []
+
+    @pytest.mark.it("should exit non-zero only when a stage regresses against the baseline")
+    def test_main_exit_status(self, tmp_path, monkeypatch):
+        wall = {"value": 1.0}
+
+        def run_size(size, n_rows, data_dir, thresholds, results):
+            results.append(result("transform", wall["value"], 100.0, size=size))
+
+        monkeypatch.setattr(run_benchmarks, "run_size", run_size)
+        baseline = tmp_path / "baseline.json"
+        args = ["run_benchmarks.py", "--sizes", "100k", "--output", str(tmp_path / "results.json"),
+                "--baseline", str(baseline)]
+
+        monkeypatch.setattr("sys.argv", args)
+        assert run_benchmarks.main() == 0  # no baseline yet
+        monkeypatch.setattr("sys.argv", args + ["--save-baseline"])
+        assert run_benchmarks.main() == 0
+        assert json.loads(baseline.read_text())["results"] == [result("transform", 1.0, 100.0)]
+
+        monkeypatch.setattr("sys.argv", args)
+        assert run_benchmarks.main() == 0
+        wall["value"] = 1.5
+        assert run_benchmarks.main() == 1
+        monkeypatch.setattr("sys.argv", args + ["--tolerance", "0.6"])
+        assert run_benchmarks.main() == 0
@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+from etl.scd import apply_versions, attribute_hash, build_versions, hash_index, version_keys
+
+
+def make_rows(rows):
+    return pd.DataFrame(rows, columns=["stock_code", "description", "transaction_datetime"]).assign(
+        transaction_datetime=lambda df: pd.to_datetime(df["transaction_datetime"])
+    )
+
+
+@pytest.mark.describe("Slowly-changing dimension tests")
+class TestScd:
+
+    @pytest.mark.it("should version attribute changes, extend unchanged keys and join facts as of their time")
+    def test_versions(self):
+        rows = make_rows([
+            ["A", "Mug", "2022-01-01"],
+            ["A", "Mug", "2022-01-02"],
+            ["A", "Red mug", "2022-01-03"],
+            ["A", "Mug", "2022-01-05"],
+            ["B", "Lamp", "2022-01-02"],
+            ["B", "Old lamp", "2022-01-04"],
+            ["B", "Lamp", "2022-01-04"],  # same time: the last row counts
+        ])
+        versions = build_versions(rows, "stock_code", ["description"], "transaction_datetime")
+        assert versions[["stock_code", "description"]].values.tolist() == [
+            ["A", "Mug"], ["A", "Red mug"], ["A", "Mug"], ["B", "Lamp"]
+        ]
+        assert versions["valid_to"].tolist()[:2] == [pd.Timestamp("2022-01-03"), pd.Timestamp("2022-01-05")]
+        assert versions["is_current"].tolist() == [False, False, True, True]
+
+        dim = versions.drop(columns="attr_hash")
+        dim.insert(0, "product_key", pd.array(range(1, len(dim) + 1), dtype="int32"))
+        index = hash_index(dim, "product_key", "stock_code", ["description"])
+        assert index["attr_hash"].tolist() == attribute_hash(dim[dim["is_current"]], ["description"]).tolist()
+
+        # B is unchanged at first and then changes; C is new
+        batch = build_versions(make_rows([
+            ["B", "Lamp", "2022-02-01"],
+            ["B", "Desk lamp", "2022-02-03"],
+            ["C", "Vase", "2022-02-02"],
+        ]), "stock_code", ["description"], "transaction_datetime")
+        dim, index = apply_versions(dim, index, batch, "product_key", "stock_code", ["description"])
+        assert dim["product_key"].tolist() == [1, 2, 3, 4, 5, 6]
+        assert dim.loc[3, "valid_to"] == pd.Timestamp("2022-02-03") and not dim.loc[3, "is_current"]
+        assert dim.loc[4:, ["stock_code", "description"]].values.tolist() == [["B", "Desk lamp"], ["C", "Vase"]]
+        assert index.set_index("stock_code")["product_key"].to_dict() == {"A": 3, "B": 5, "C": 6}
+
+        keys = version_keys(
+            ["A", "A", "B", "B", "A"],
+            pd.to_datetime(["2022-01-04", "2022-01-01", "2022-02-02", "2022-02-03", "2021-12-01"]),
+            dim, "product_key", "stock_code",
+        )
+        assert keys.tolist() == [2, 1, 4, 5, 1]  # before its first version a key maps to that version
+        with pytest.raises(ValueError):
+            version_keys(["Z"], pd.to_datetime(["2022-01-01"]), dim, "product_key", "stock_code")
+
+    @pytest.mark.it("should update the current version in place when a change starts at the same time")
+    def test_same_time_change(self):
+        dim = build_versions(make_rows([
+            ["A", "Mug", "2022-01-01"],
+            ["B", "Lamp", "2022-01-02"],
+        ]), "stock_code", ["description"], "transaction_datetime").drop(columns="attr_hash")
+        dim.insert(0, "product_key", pd.array([1, 2], dtype="int32"))
+        index = hash_index(dim, "product_key", "stock_code", ["description"])
+
+        # A changes at its current version's start; B too, and then again later
+        batch = build_versions(make_rows([
+            ["A", "Red mug", "2022-01-01"],
+            ["B", "Desk lamp", "2022-01-02"],
+            ["B", "Floor lamp", "2022-01-05"],
+        ]), "stock_code", ["description"], "transaction_datetime")
+        dim, index = apply_versions(dim, index, batch, "product_key", "stock_code", ["description"])
+
+        assert dim[["product_key", "stock_code", "description"]].values.tolist() == [
+            [1, "A", "Red mug"], [2, "B", "Desk lamp"], [3, "B", "Floor lamp"]
+        ]
+        assert not dim.duplicated(["stock_code", "valid_from"]).any()
+        assert dim.loc[1, "valid_to"] == pd.Timestamp("2022-01-05") and not dim.loc[1, "is_current"]
+        assert dim["is_current"].tolist() == [True, False, True]
+        assert index.set_index("stock_code")["product_key"].to_dict() == {"A": 1, "B": 3}
+        current = dim[dim["is_current"]]
+        assert sorted(index["attr_hash"].tolist()) == sorted(attribute_hash(current, ["description"]).tolist())
@@ -1,11 +1,18 @@
 import pytest
 import pandas as pd
+from etl.schema import read_raw_csv
 from etl.transform import (
     load_and_clean_data,
+    clean_data,
+    build_validity_mask,
     filter_invalid_prices,
     split_transactions,
     filter_invalid_quantities,
     detect_outliers,
+    rule_outlier_mask,
+    transform_frame,
+    transform_in_chunks,
+    transform_in_parallel,
 )
 
 @pytest.mark.describe("Transform tests")
@@ -48,3 +55,152 @@ class TestTransform:
             "CustomerID", "Country"
         }
         assert expected_cols.issubset(clean_tx.columns), "Missing expected columns in transformed data"
+
+    @pytest.mark.it("should produce the same outputs when streaming the raw file in chunks")
+    def test_transform_in_chunks_matches_batch(self, tmp_path):
+        # --- 1️⃣ Raw file with a duplicate row split across chunks ---
+        raw = pd.DataFrame({
+            "InvoiceNo": ["100001", "C100002", "100003", "100004", "100001"],
+            "StockCode": ["12345", "12345", "99999", "54321", "12345"],
+            "Description": ["Widget A", "Widget A", "Widget B", "Widget C", "Widget A"],
+            "Quantity": [10, -5, 500, 2, 10],
+            "InvoiceDate": ["2022-01-01", "2022-01-02", "2022-01-03", "2022-01-04", "2022-01-01"],
+            "UnitPrice": [2.5, 2.5, 1000.0, 3.0, 2.5],
+            "CustomerID": [12345.0, 12345.0, 12346.0, 12347.0, 12345.0],
+            "Country": ["UK", "UK", "UK", "UK", "UK"],
+        })
+        raw_path = tmp_path / "raw.csv"
+        raw.to_csv(raw_path, index=False)
+        paths = {name: tmp_path / f"{name}.csv" for name in ["transactions", "cancellations", "outliers"]}
+        thresholds = {"quantity": 100, "unit_price": 500.0}
+
+        # --- 2️⃣ Stream in chunks of two rows ---
+        counts = transform_in_chunks(raw_path, paths, thresholds, chunksize=2)
+
+        # --- 3️⃣ Compare against the in-memory transform ---
+        expected = transform_frame(load_and_clean_data(raw_path), 100, 500.0)
+        for name, frame in zip(["transactions", "cancellations", "outliers"], expected):
+            streamed = pd.read_csv(paths[name], dtype={"InvoiceNo": str})
+            assert counts[name] == len(frame), f"Row count mismatch for {name}"
+            assert streamed["InvoiceNo"].tolist() == frame["InvoiceNo"].tolist()
+
+    @pytest.mark.it("should split in-memory frames into chunks and replace old outputs when there is no input")
+    def test_transform_in_chunks_from_frames(self, tmp_path, monkeypatch):
+        import etl.transform as transform
+
+        raw = pd.DataFrame({
+            "InvoiceNo": ["100001", "C100002", "100003", "100004", "100001"],
+            "StockCode": ["12345", "12345", "99999", "54321", "12345"],
+            "Description": ["Widget A", "Widget A", "Widget B", "Widget C", "Widget A"],
+            "Quantity": [10, -5, 500, 2, 10],
+            "InvoiceDate": ["2022-01-01", "2022-01-02", "2022-01-03", "2022-01-04", "2022-01-01"],
+            "UnitPrice": [2.5, 2.5, 1000.0, 3.0, 2.5],
+            "CustomerID": [12345.0, 12345.0, 12346.0, 12347.0, 12345.0],
+            "Country": ["UK", "UK", "UK", "UK", "UK"],
+        })
+        paths = {name: tmp_path / f"{name}.csv" for name in ["transactions", "cancellations", "outliers"]}
+        thresholds = {"quantity": 100, "unit_price": 500.0}
+        chunk_sizes = []
+
+        def counting_transform_frame(df, *args):
+            chunk_sizes.append(len(df))
+            return transform_frame(df, *args)
+
+        monkeypatch.setattr(transform, "transform_frame", counting_transform_frame)
+
+        # Two "files", the second repeating a row of the first
+        counts = transform_in_chunks(iter([raw.iloc[:4], raw.iloc[4:]]), paths, thresholds, chunksize=2)
+        assert counts == {"raw": 5, "transactions": 2, "cancellations": 1, "outliers": 1}
+        assert chunk_sizes == [2, 2, 0]
+
+        counts = transform_in_chunks(iter([]), paths, thresholds, chunksize=2)
+        assert counts["raw"] == 0
+        for path in paths.values():
+            assert pd.read_csv(path).empty, "Outputs of the previous run should be replaced"
+
+    @pytest.mark.it("should filter invalid rows in one pass and count rejections per rule")
+    def test_clean_data_rejection_counts(self):
+        df = pd.DataFrame({
+            "InvoiceNo": ["100001", "C100002", "10003", "X100004", "100005"],
+            "StockCode": ["12345", "1234", "99999", "54321", "85123A"],
+            "Description": ["Widget A", "Widget A", "???", "Widget C", "Widget D"],
+            "Quantity": [10, -5, 500, 2, 1],
+            "InvoiceDate": ["2022-01-01", "2022-01-02", "2022-01-03", "not a date", "2022-01-05"],
+            "UnitPrice": [2.5, 2.5, 1000.0, 3.0, 1.0],
+            "CustomerID": [12345.0, 12345.0, None, 123456.0, 12347.0],
+            "Country": ["UK", "UK", "UK", "UK", "UK"],
+        })
+        dates = pd.to_datetime(df["InvoiceDate"], errors="coerce")
+        mask, rejections = build_validity_mask(df, dates, df["CustomerID"])
+        cleaned = clean_data(df)
+
+        assert mask.tolist() == [True, False, False, False, False]
+        assert rejections["invalid_invoice_no"] == 2
+        assert rejections["invalid_stock_code"] == 2
+        assert rejections["description_without_letters"] == 1
+        assert rejections["invalid_invoice_date"] == 1
+        assert rejections["invalid_customer_id"] == 2
+        assert cleaned["CustomerID"].tolist() == ["12345"]
+
+    @pytest.mark.it("should flag per-product price outliers that global thresholds miss")
+    def test_per_group_outlier_rules(self):
+        # Product 11111 is usually priced ~2.00 and 22222 always 10.00
+        df = pd.DataFrame({
+            "StockCode": ["11111"] * 6 + ["22222"] * 6,
+            "Quantity": [1] * 12,
+            "UnitPrice": [2.0, 2.1, 1.9, 2.0, 2.05, 40.0] + [10.0] * 6,
+        })
+        rules = [{"column": "UnitPrice", "group_by": "StockCode", "method": "iqr", "factor": 3.0, "min_group_size": 5}]
+
+        clean, outliers = detect_outliers(df, qty_threshold=5000, price_threshold=250.0, rules=rules)
+        assert outliers["UnitPrice"].tolist() == [40.0]
+        assert len(clean) == 11
+
+        # MAD flags the same row; zero-spread and too-small groups are never flagged
+        mad = {**rules[0], "method": "mad"}
+        assert rule_outlier_mask(df, mad).tolist() == [False] * 5 + [True] + [False] * 6
+        assert not rule_outlier_mask(df, {**mad, "min_group_size": 7}).any()
+
+    @pytest.mark.it("should produce the batch outputs when transforming hash-partitioned shards in parallel")
+    def test_transform_in_parallel_matches_batch(self):
+        raw = pd.DataFrame({
+            "InvoiceNo": ["100001", "C100002", "100003", "100004", "100001", "100005"],
+            "StockCode": ["12345", "12345", "99999", "54321", "12345", "54321"],
+            "Description": ["Widget A", "Widget A", "Widget B", "Widget C", "Widget A", "Widget C"],
+            "Quantity": [10, -5, 500, 2, 10, 0],
+            "InvoiceDate": ["2022-01-01", "2022-01-02", "2022-01-03", "2022-01-04", "2022-01-01", "2022-01-05"],
+            "UnitPrice": [2.5, 2.5, 1000.0, 3.0, 2.5, 3.0],
+            "CustomerID": [12345.0, 12345.0, 12346.0, 12347.0, 12345.0, 12347.0],
+            "Country": ["UK", "UK", "UK", "UK", "UK", "UK"],
+        })
+        thresholds = {"quantity": 100, "unit_price": 500.0}
+
+        expected = transform_frame(clean_data(raw.copy()), 100, 500.0)
+        result = transform_in_parallel(raw, thresholds, workers=3)
+        for frame, expected_frame in zip(result, expected):
+            pd.testing.assert_frame_equal(frame, expected_frame)
+
+    @pytest.mark.it("should skip rows before the watermark while reading the raw file")
+    def test_load_and_clean_data_skips_rows_before_watermark(self, tmp_path):
+        raw = pd.DataFrame({
+            "InvoiceNo": ["100001", "100002", "100003", "C100004", "100005"],
+            "StockCode": ["12345", "12345", "99999", "54321", "12345"],
+            "Description": ["Widget A", "Widget A", "Widget B", "Widget C", "Widget A"],
+            "Quantity": [10, 3, 5, -2, 1],
+            "InvoiceDate": ["12/1/2010 8:26", "12/2/2010 9:00", "12/2/2010 9:00", "12/3/2010 10:15", "not a date"],
+            "UnitPrice": [2.5, 2.5, 1.0, 3.0, 2.5],
+            "CustomerID": [12345.0, 12345.0, 12346.0, 12347.0, 12345.0],
+            "Country": ["UK", "UK", "UK", "UK", "UK"],
+        })
+        raw_path = tmp_path / "raw.csv"
+        raw.to_csv(raw_path, index=False)
+        watermark = {"InvoiceDate": "2010-12-02T09:00:00", "InvoiceNo": "100002"}
+
+        read = read_raw_csv(raw_path, since=watermark["InvoiceDate"])
+        cleaned = load_and_clean_data(raw_path, watermark=watermark)
+
+        # Rows at the watermark time and unparsed dates are kept for cleaning to decide
+        assert read["InvoiceNo"].tolist() == ["100002", "100003", "C100004", "100005"]
+        assert cleaned["InvoiceNo"].tolist() == ["100003", "C100004"]
+        expected = clean_data(read_raw_csv(raw_path), watermark=watermark)
+        assert cleaned["InvoiceNo"].tolist() == expected["InvoiceNo"].tolist()
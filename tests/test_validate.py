@@ -0,0 +1,35 @@
+import pytest
+import pandas as pd
+from etl.validate import validate_datasets
+
+
+@pytest.mark.describe("Validate tests")
+class TestValidate:
+
+    @pytest.mark.it("should report failed rows per table and rule")
+    def test_validate_datasets_report(self):
+        transactions = pd.DataFrame({
+            "InvoiceNo": ["100001", "10002"],
+            "StockCode": ["12345", "12345"],
+            "Description": ["Widget A", None],
+            "Quantity": [10, 0],
+            "InvoiceDate": pd.to_datetime(["2022-01-01", "2022-01-02"]),
+            "UnitPrice": [2.5, 2.5],
+            "CustomerID": ["12345", "1234"],
+            "Country": ["UK", "UK"],
+        })
+        cancellations = transactions.iloc[:1].assign(InvoiceNo="C100003", Quantity=-1)
+
+        report = validate_datasets(
+            {"transactions": transactions, "cancellations": cancellations}, max_workers=2
+        ).set_index(["table", "rule"])
+
+        failed = report[~report["passed"]]
+        assert set(failed.index) == {
+            ("transactions", "Description_not_null"),
+            ("transactions", "Quantity_positive"),
+            ("transactions", "CustomerID_format"),
+            ("transactions", "InvoiceNo_sale_format"),
+        }
+        assert (failed["failed_rows"] == 1).all()
+        assert report.loc[("cancellations", "InvoiceNo_cancel_format"), "passed"]